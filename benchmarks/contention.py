@@ -0,0 +1,121 @@
+"""
+Measures method call throughput on one JCoreAPIConnection as the number of
+threads making calls grows, compared with a connection that registers, sends
+and dispatches every call under one RLock (which is how JCoreAPIConnection
+locked before).  Uses an in-process socket that answers every method call
+immediately, so the numbers reflect client-side overhead only.
+
+usage: python benchmarks/contention.py [calls per thread]
+"""
+from __future__ import print_function
+
+import json
+import sys
+import threading
+import time
+
+import six
+
+if six.PY3:
+    from queue import Queue, Empty
+else:
+    from Queue import Queue, Empty
+
+sys.path.insert(0, '.')
+
+from jcore_api import JCoreAPIConnection
+from jcore_api._connection import _result
+from jcore_api._protocol import RESULT
+from jcore_api.exceptions import JCoreAPITimeoutException
+
+THREAD_COUNTS = [1, 2, 4, 8, 16, 32]
+
+class EchoSock:
+    def __init__(self):
+        self._recv_queue = Queue()
+
+    def gettimeout(self):
+        return 10
+
+    def close(self):
+        pass
+
+    def send(self, message):
+        parsed = json.loads(message)
+        self._recv_queue.put_nowait(json.dumps({'msg': RESULT, 'id': parsed['id'], 'result': None}))
+
+    def recv(self):
+        try:
+            return self._recv_queue.get(timeout=1)
+        except Empty as e:
+            raise JCoreAPITimeoutException("recv timed out", e)
+
+class RLockConnection(JCoreAPIConnection):
+    """
+    serializes registering and sending calls, dispatching results and removing
+    finished calls on one RLock, like the old JCoreAPIConnection
+    """
+    def __init__(self, sock, **kwargs):
+        JCoreAPIConnection.__init__(self, sock, **kwargs)
+        self._call_lock = threading.RLock()
+
+    def _call(self, method, params):
+        timeout = self._gettimeout()
+        _id, future = self._call_async(method, params)
+        try:
+            return _result(future, timeout)
+        finally:
+            self._call_lock.acquire()
+            try:
+                self._method_calls.pop(_id, None)
+            finally:
+                self._call_lock.release()
+
+    def _gettimeout(self):
+        self._call_lock.acquire()
+        try:
+            return JCoreAPIConnection._gettimeout(self)
+        finally:
+            self._call_lock.release()
+
+    def _call_many_async(self, requests, streams=None):
+        self._call_lock.acquire()
+        try:
+            return JCoreAPIConnection._call_many_async(self, requests, streams)
+        finally:
+            self._call_lock.release()
+
+    def _dispatch_message(self, message, msg):
+        self._call_lock.acquire()
+        try:
+            JCoreAPIConnection._dispatch_message(self, message, msg)
+        finally:
+            self._call_lock.release()
+
+def run(connection_class, num_threads, calls_per_thread):
+    conn = connection_class(EchoSock(), auth_required=False)
+
+    def worker():
+        for _ in range(calls_per_thread):
+            conn.get_metadata()
+
+    threads = [threading.Thread(target=worker) for _ in range(num_threads)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    conn.close()
+    return num_threads * calls_per_thread / elapsed
+
+def main():
+    calls_per_thread = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print('%8s %14s %14s %10s' % ('threads', 'one RLock', 'current', 'speedup'))
+    for num_threads in THREAD_COUNTS:
+        before = run(RLockConnection, num_threads, calls_per_thread)
+        after = run(JCoreAPIConnection, num_threads, calls_per_thread)
+        print('%8d %9.0f/sec %9.0f/sec %9.2fx' % (num_threads, before, after, after / before))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares MessageDecoder's whole-buffer frame scan with decoding a piece at a
+time through its state machine (which is how every chunk was decoded before),
+for bursts of small messages and for large messages split across reads.
+
+usage: python benchmarks/message_decoder.py [repeat]
+"""
+from __future__ import print_function
+
+import json
+import sys
+import time
+
+sys.path.insert(0, '.')
+
+from jcore_api._unix_sockets._message_codec import encode_message, MessageDecoder
+
+CHUNK_SIZE = 65536
+TRIALS = 5
+
+def state_machine_decode(decoder, chunk):
+    decoder._decode_states(memoryview(chunk), 0)
+
+def scan_decode(decoder, chunk):
+    decoder.decode(chunk)
+
+def make_chunks(messages):
+    data = b''.join(encode_message(message) for message in messages)
+    return [data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)]
+
+def run(decode, chunks, repeat, chunk_mode):
+    count = [0]
+    def on_message(message):
+        count[0] += 1
+    def on_chunk(chunk, final):
+        if final:
+            count[0] += 1
+    decoder = MessageDecoder(on_chunk=on_chunk) if chunk_mode else MessageDecoder(on_message)
+
+    # the best of several trials, since these runs are short enough to be noisy
+    best = None
+    for _ in range(TRIALS):
+        count[0] = 0
+        start = time.time()
+        for _ in range(repeat):
+            for chunk in chunks:
+                decode(decoder, chunk)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return count[0] / best
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    small = [json.dumps({'msg': 'result', 'id': str(i), 'result': None}) for i in range(20000)]
+    large = [json.dumps({'data': list(range(200000))})] * 5
+    cases = [('small messages', make_chunks(small)), ('large messages', make_chunks(large))]
+
+    print('%-16s %-8s %16s %16s %8s' % ('', 'mode', 'state machine', 'frame scan', 'speedup'))
+    for name, chunks in cases:
+        for chunk_mode in [False, True]:
+            before = run(state_machine_decode, chunks, repeat, chunk_mode)
+            after = run(scan_decode, chunks, repeat, chunk_mode)
+            print('%-16s %-8s %12.0f m/s %12.0f m/s %7.2fx' % (
+                name, 'chunk' if chunk_mode else 'message', before, after, after / before))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Measures the round trip time of small method calls over a unix socket pair,
+with JCoreUnixSocket dispatching received messages on its own thread versus
+queueing them for the connection's receive thread (which is how every
+message was received before start_receiving).
+
+usage: python benchmarks/unix_socket_latency.py [calls]
+"""
+from __future__ import print_function
+
+import json
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, '.')
+
+from jcore_api import JCoreAPIConnection
+from jcore_api._unix_sockets._jcore_unix_socket import JCoreUnixSocket
+from jcore_api._unix_sockets._message_codec import encode_message, MessageDecoder
+
+class QueuedUnixSocket:
+    """
+    hides start_receiving, so that the connection receives through recv_chunk()
+    """
+    def __init__(self, sock):
+        self._sock = sock
+        self.send = sock.send
+        self.send_many = sock.send_many
+        self.recv = sock.recv
+        self.recv_chunk = sock.recv_chunk
+        self.close = sock.close
+        self.gettimeout = sock.gettimeout
+
+def serve(sock):
+    def on_message(message):
+        message = json.loads(message)
+        sock.sendall(encode_message(json.dumps({'msg': 'result', 'id': message['id'], 'result': None})))
+    decoder = MessageDecoder(on_message)
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            return
+        decoder.decode(data)
+
+def run(wrap, calls):
+    client, server = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    thread = threading.Thread(target=serve, args=(server,))
+    thread.daemon = True
+    thread.start()
+    client.settimeout(5)
+    connection = JCoreAPIConnection(wrap(JCoreUnixSocket(client)), auth_required=False)
+    try:
+        connection.get_real_time_data()
+        start = time.time()
+        for _ in range(calls):
+            connection.get_real_time_data()
+        return (time.time() - start) / calls
+    finally:
+        connection.close()
+        server.close()
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    before = run(QueuedUnixSocket, calls)
+    after = run(lambda sock: sock, calls)
+    print('%-14s %10s' % ('', 'round trip'))
+    print('%-14s %7.1f us' % ('queued', before * 1e6))
+    print('%-14s %7.1f us' % ('socket thread', after * 1e6))
+    print('%-14s %9.2fx' % ('speedup', before / after))
+
+if __name__ == '__main__':
+    main()
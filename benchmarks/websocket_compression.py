@@ -0,0 +1,68 @@
+"""
+Measures how much permessage-deflate shrinks historical data responses sent
+over WebSocket, and how fast the vendored websocket client decompresses
+them, with and without context takeover.
+
+usage: python benchmarks/websocket_compression.py [repeat]
+"""
+from __future__ import print_function
+
+import json
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, 'jcore_api/_websocket_client')
+
+from websocket._compression import permessage_deflate
+
+POINT_COUNTS = [100, 10000, 100000]
+
+def historical_response(count, id):
+    # a channel sampled once a second, with a slowly drifting value
+    t = [1500000000000 + 1000 * i for i in range(count)]
+    value = 20.0
+    v = []
+    for _ in range(count):
+        value += random.choice([-0.1, 0, 0, 0.1])
+        v.append(round(value, 1))
+    return json.dumps({'msg': 'result', 'id': str(id),
+                       'result': {'temp': {'t': t, 'v': v}}}).encode('utf-8')
+
+def compressed_size(messages, server_no_context_takeover):
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    size = 0
+    compressed = []
+    for message in messages:
+        data = compressor.compress(message) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        compressed.append(data[:-4])
+        size += len(data) - 4
+        if server_no_context_takeover:
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return size, compressed
+
+def decompress_rate(compressed, total, server_no_context_takeover, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        compression = permessage_deflate(server_no_context_takeover=server_no_context_takeover)
+        for data in compressed:
+            compression.decompress(data, True)
+    return total * repeat / (time.time() - start)
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    random.seed(0)
+    print('%8s %-14s %12s %12s %8s %18s' % ('points', 'context', 'raw', 'compressed', 'ratio', 'decompression'))
+    for count in POINT_COUNTS:
+        messages = [historical_response(count, id) for id in range(5)]
+        total = sum(len(message) for message in messages)
+        for server_no_context_takeover in [False, True]:
+            size, compressed = compressed_size(messages, server_no_context_takeover)
+            rate = decompress_rate(compressed, total, server_no_context_takeover, repeat)
+            print('%8d %-14s %12d %12d %7.1fx %13.1f MB/s' % (
+                count, 'reset' if server_no_context_takeover else 'takeover',
+                total, size, float(total) / size, rate / 1e6))
+
+if __name__ == '__main__':
+    main()
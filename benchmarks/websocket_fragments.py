@@ -0,0 +1,68 @@
+"""
+Compares reassembling messages fragmented into many frames with the vendored
+websocket client's continuous_frame, which joins the fragments once, with
+appending each fragment to the bytes received so far (which is how
+fragments were reassembled before).
+
+usage: python benchmarks/websocket_fragments.py [repeat]
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+sys.path.insert(0, 'jcore_api/_websocket_client')
+
+from websocket._abnf import ABNF, continuous_frame
+
+FRAGMENT_SIZE = 4096
+PAYLOAD = b'x' * FRAGMENT_SIZE
+FRAGMENT_COUNTS = [4, 64, 1024, 4096]
+
+class AppendingContinuousFrame(continuous_frame):
+    def add(self, frame):
+        if self.cont_data:
+            self.cont_data[1] += frame.data
+        else:
+            if frame.opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
+                self.recving_frames = frame.opcode
+            self.cont_data = [frame.opcode, frame.data]
+
+        if frame.fin:
+            self.recving_frames = None
+
+    def extract(self, frame):
+        data = self.cont_data
+        self.cont_data = None
+        frame.data = data[1]
+        return [data[0], frame]
+
+def fragments(count):
+    return [ABNF(int(i == count - 1), 0, 0, 0, ABNF.OPCODE_BINARY if i == 0 else ABNF.OPCODE_CONT, 0, PAYLOAD)
+            for i in range(count)]
+
+def run(cont_frame, frames, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        for frame in frames:
+            cont_frame.validate(frame)
+            cont_frame.add(frame)
+            if cont_frame.is_fire(frame):
+                cont_frame.extract(frame)
+                # extract replaces the last frame's payload with the whole message
+                frame.data = PAYLOAD
+    return len(frames) * FRAGMENT_SIZE * repeat / (time.time() - start)
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print('%10s %16s %16s %10s' % ('fragments', 'append', 'join once', 'speedup'))
+    for count in FRAGMENT_COUNTS:
+        frames = fragments(count)
+        # messages with fewer fragments are reassembled more times, so that each count takes a while
+        times = repeat * max(1, 1024 // count)
+        before = run(AppendingContinuousFrame(False, True), frames, times)
+        after = run(continuous_frame(False, True), frames, times)
+        print('%10d %11.1f MB/s %11.1f MB/s %9.1fx' % (count, before / 1e6, after / 1e6, after / before))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Compares receiving large binary frames with the vendored websocket client's
+frame_buffer, which receives payloads straight into a reused buffer that
+fits the frame, with the list of received pieces that was joined and
+re-sliced on every recv_strict call before.  Frames are sent over a unix
+socket pair by another thread.
+
+usage: python benchmarks/websocket_frame_buffer.py [repeat]
+"""
+from __future__ import print_function
+
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, 'jcore_api/_websocket_client')
+
+from websocket._abnf import frame_buffer
+
+SIZES = [1024, 65536, 1 << 20, 8 << 20]
+
+class JoiningFrameBuffer(frame_buffer):
+    def __init__(self, recv_fn, skip_utf8_validation):
+        frame_buffer.__init__(self, recv_fn, skip_utf8_validation)
+        self.recv_buffer = []
+
+    def recv_strict(self, bufsize):
+        shortage = bufsize - sum(len(x) for x in self.recv_buffer)
+        while shortage > 0:
+            bytes_ = self.recv(min(16384, shortage))
+            self.recv_buffer.append(bytes_)
+            shortage -= len(bytes_)
+
+        unified = b"".join(self.recv_buffer)
+
+        if shortage == 0:
+            self.recv_buffer = []
+            return unified
+        else:
+            self.recv_buffer = [unified[bufsize:]]
+            return unified[:bufsize]
+
+def binary_frame(size):
+    return struct.pack('!BBQ', 0x82, 127, size) + b'x' * size
+
+def run(create, frame, repeat):
+    client, server = socket.socketpair()
+    def send():
+        for _ in range(repeat):
+            server.sendall(frame)
+    thread = threading.Thread(target=send)
+    thread.daemon = True
+    buffer = create(client)
+    try:
+        start = time.time()
+        thread.start()
+        for _ in range(repeat):
+            buffer.recv_frame()
+        return len(frame) * repeat / (time.time() - start)
+    finally:
+        client.close()
+        server.close()
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print('%10s %16s %16s %10s' % ('bytes', 'join', 'recv_into', 'speedup'))
+    for size in SIZES:
+        frame = binary_frame(size)
+        # smaller frames are received more times, so that each size takes a while
+        times = repeat * max(1, (1 << 24) // size)
+        before = run(lambda sock: JoiningFrameBuffer(sock.recv, True), frame, times)
+        after = run(lambda sock: frame_buffer(sock.recv, True, sock.recv_into), frame, times)
+        print('%10d %11.1f MB/s %11.1f MB/s %9.1fx' % (size, before / 1e6, after / 1e6, after / before))
+
+if __name__ == '__main__':
+    main()
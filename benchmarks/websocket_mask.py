@@ -0,0 +1,47 @@
+"""
+Compares the vendored websocket client's pure-Python masking (xoring the
+payload as one big integer) with xoring one byte at a time (which is how
+every frame was masked before, when wsaccel isn't installed).
+
+usage: python benchmarks/websocket_mask.py [repeat]
+"""
+from __future__ import print_function
+
+import array
+import os
+import sys
+import time
+
+sys.path.insert(0, 'jcore_api/_websocket_client')
+
+from websocket._abnf import ABNF
+
+SIZES = [16, 256, 4096, 65536, 1 << 20]
+
+def byte_loop_mask(mask_key, data):
+    _m = array.array("B", mask_key)
+    _d = array.array("B", data)
+    for i in range(len(_d)):
+        _d[i] ^= _m[i % 4]
+    return _d.tobytes()
+
+def run(mask, data, repeat):
+    mask_key = os.urandom(4)
+    start = time.time()
+    for _ in range(repeat):
+        mask(mask_key, data)
+    return len(data) * repeat / (time.time() - start)
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print('%10s %16s %16s %10s' % ('bytes', 'byte loop', 'big integer', 'speedup'))
+    for size in SIZES:
+        data = os.urandom(size)
+        # smaller payloads are masked more times, so that each size takes a while
+        times = repeat * max(1, (1 << 16) // size)
+        before = run(byte_loop_mask, data, times)
+        after = run(ABNF.mask, data, times)
+        print('%10d %11.1f MB/s %11.1f MB/s %9.1fx' % (size, before / 1e6, after / 1e6, after / before))
+
+if __name__ == '__main__':
+    main()
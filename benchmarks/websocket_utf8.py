@@ -0,0 +1,86 @@
+"""
+Compares receiving text frames with the vendored websocket client, validating
+UTF-8 by decoding once, with validating through the pure-Python DFA and then
+decoding again in recv (which is how every text frame was received before,
+when wsaccel isn't installed).
+
+usage: python benchmarks/websocket_utf8.py [repeat]
+"""
+from __future__ import print_function
+
+import json
+import struct
+import sys
+import time
+
+sys.path.insert(0, 'jcore_api/_websocket_client')
+
+from websocket import _utils
+from websocket._core import WebSocket
+
+SIZES = [64, 1024, 16384, 262144, 1 << 20]
+
+def dfa_validate_utf8(utfbytes):
+    state = _utils._UTF8_ACCEPT
+    codep = 0
+    for i in utfbytes:
+        state, codep = _utils._decode(state, codep, i)
+        if state == _utils._UTF8_REJECT:
+            return False
+    return True
+
+class FrameSock:
+    def __init__(self, frame):
+        self.frame = frame
+        self.pos = 0
+
+    def recv(self, bufsize):
+        if self.pos >= len(self.frame):
+            self.pos = 0
+        data = self.frame[self.pos:self.pos + bufsize]
+        self.pos += len(data)
+        return data
+
+def text_frame(size):
+    # a historical data response with some non-ascii text, like a message from connect()
+    text = json.dumps({'result': {'témp': list(range(size // 7))}}, ensure_ascii=False)
+    payload = text.encode('utf-8')[:size].decode('utf-8', 'ignore').encode('utf-8')
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x81, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x81, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x81, 127, length)
+    return header + payload
+
+def dfa_recv(sock):
+    opcode, frame = sock.recv_data_frame()
+    if not dfa_validate_utf8(frame.data):
+        raise ValueError("invalid utf-8")
+    return frame.data.decode("utf-8")
+
+def decode_once_recv(sock):
+    return sock.recv()
+
+def run(recv, frame, repeat, skip_utf8_validation):
+    sock = WebSocket(skip_utf8_validation=skip_utf8_validation)
+    sock.sock = FrameSock(frame)
+    start = time.time()
+    for _ in range(repeat):
+        recv(sock)
+    return len(frame) * repeat / (time.time() - start)
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print('%10s %16s %16s %10s' % ('bytes', 'dfa + decode', 'decode once', 'speedup'))
+    for size in SIZES:
+        frame = text_frame(size)
+        # smaller frames are received more times, so that each size takes a while
+        times = repeat * max(1, (1 << 16) // size)
+        before = run(dfa_recv, frame, times, True)
+        after = run(decode_once_recv, frame, times, False)
+        print('%10d %11.1f MB/s %11.1f MB/s %9.1fx' % (size, before / 1e6, after / 1e6, after / before))
+
+if __name__ == '__main__':
+    main()
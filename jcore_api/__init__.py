@@ -1 +1,12 @@
-from ._api import connect, connect_local, JCoreAPIConnection
+import sys
+
+from ._api import connect, connect_local, connect_pool, connect_local_pool, JCoreAPIConnection, \
+    JCoreAPIConnectionPool
+from ._historical_cache import HistoricalDataCache
+from ._historical_store import HistoricalDataStore
+from ._real_time_mirror import RealTimeDataMirror
+from ._real_time_writer import RealTimeDataWriter
+from ._reconnecting import ReconnectingJCoreAPIConnection
+
+if sys.version_info >= (3, 5):
+    from ._aio import connect_async, connect_local_async, AsyncJCoreAPIConnection
@@ -0,0 +1,6 @@
+"""
+asyncio versions of the connection and sockets (requires Python 3.5+)
+"""
+
+from ._api import connect_async, connect_local_async
+from ._connection import AsyncJCoreAPIConnection
@@ -0,0 +1,57 @@
+import asyncio
+
+from .._api import _parse_api_token
+from .._api_common import LOCAL_SOCKET_PATH
+from .._websocket_client.websocket._url import parse_url
+from ._connection import AsyncJCoreAPIConnection
+from ._unix_socket import AsyncJCoreUnixSocket
+from ._web_socket import AsyncJCoreWebSocket, handshake
+
+async def _default_create_web_socket(url):
+    hostname, port, _, is_secure = parse_url(url)
+    return await asyncio.open_connection(hostname, port, ssl=is_secure or None)
+
+async def connect_async(api_token, create_socket=_default_create_web_socket, **kwargs):
+    """
+    Connects to a jcore.io server and authenticates.
+
+    api_token: an API token from the jcore.io server you wish to connect to.
+    create_socket: a coroutine function that is passed the server url and returns
+                   a (reader, writer) pair of asyncio streams connected to it.
+
+    returns: an authenticated AsyncJCoreAPIConnection instance.
+    """
+    url, token = _parse_api_token(api_token)
+
+    hostname, port, resource, _ = parse_url(url)
+    reader, writer = await create_socket(url)
+    try:
+        await handshake(reader, writer, hostname, port, resource)
+    except:
+        writer.close()
+        raise
+
+    connection = AsyncJCoreAPIConnection(AsyncJCoreWebSocket(reader, writer), **kwargs)
+    try:
+        await connection.authenticate(token)
+    except:
+        connection.close()
+        raise
+    return connection
+
+async def _default_create_unix_socket(path):
+    return await asyncio.open_unix_connection(path)
+
+async def connect_local_async(create_socket=_default_create_unix_socket, **kwargs):
+    """
+    Connects to a jcore.io server on the local machine via a
+    unix socket.
+
+    create_socket: a coroutine function that is passed the unix socket path and
+                   returns a (reader, writer) pair of asyncio streams connected to it.
+
+    returns: an AsyncJCoreAPIConnection instance.
+    """
+    reader, writer = await create_socket(LOCAL_SOCKET_PATH)
+    return AsyncJCoreAPIConnection(AsyncJCoreUnixSocket(reader, writer),
+                                   auth_required=False, **kwargs)
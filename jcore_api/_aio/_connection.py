@@ -0,0 +1,250 @@
+import asyncio
+import json
+import sys
+import traceback
+
+from .._protocol import CONNECT, CONNECTED, FAILED, METHOD, RESULT
+from .._connection import _default_on_unexpected_exception, _from_protocol_error, \
+    _parse_message, _get_result_id, _get_result_error, _to_error_result, \
+    _get_real_time_data_request, _set_real_time_data_request, _get_metadata_request, \
+    _set_metadata_request, _get_historical_data_request
+from ..exceptions import JCoreAPITimeoutException, JCoreAPIAuthException, \
+    JCoreAPIConnectionClosedException, JCoreAPIUnexpectedMessageException
+
+# get_event_loop is deprecated for this on newer Pythons, but get_running_loop
+# requires 3.7.  Only called from coroutines, where both return the running loop
+_get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+class AsyncJCoreAPIConnection:
+    """
+    An asyncio connection to a jcore.io server.  Messages are received by a task on the
+    event loop instead of a thread, so one loop can hold many connections.
+
+    sock: the socket to communicate with.    It must have these methods
+        send(message):    coroutine that sends a message
+        recv():           coroutine that receives a message
+        close():          closes the socket
+    auth_required: whether authentication is required.
+                   If so, methods will throw an error if the client is not authenticated.
+                   default is True
+    timeout: how many seconds to wait for responses, or None to wait forever.
+             default is None
+    """
+    def __init__(self, sock, auth_required=True, timeout=None,
+                 on_unexpected_exception=_default_on_unexpected_exception):
+        self._sock = sock
+        self._auth_required = auth_required
+        self._timeout = timeout
+        self._on_unexpected_exception = on_unexpected_exception
+        self._closed = False
+        self._authenticating = False
+        self._authenticated = False
+        self._auth_future = None
+
+        self._cur_method_id = 0
+        self._method_calls = {}
+
+        self._recv_task = None
+
+    async def _run_recv_task(self):
+        sock = self._sock
+
+        while not self._closed:
+            try:
+                event = await sock.recv()
+            except JCoreAPIConnectionClosedException as error:
+                self.close(error, sock_is_closed=True)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.close(JCoreAPIConnectionClosedException("connection broken", e))
+                return
+
+            try:
+                self._handle_message(event)
+            except Exception:
+                try:
+                    self._on_unexpected_exception(sys.exc_info())
+                except Exception:
+                    traceback.print_exc()
+
+    async def authenticate(self, token):
+        """
+        authenticate the client.
+
+        token: the token field from the decoded base64 api token.
+        """
+        assert isinstance(token, str) and len(
+            token) > 0, "token must be a non-empty unicode string"
+
+        if self._authenticated:
+            raise JCoreAPIAuthException("already authenticated")
+        if self._authenticating:
+            raise JCoreAPIAuthException(
+                "authentication already in progress")
+
+        self._authenticating = True
+        self._auth_future = _get_running_loop().create_future()
+        try:
+            await self._send(CONNECT, {'token': token})
+            await self._wait(self._auth_future)
+        finally:
+            self._authenticating = False
+            self._auth_future = None
+
+    def _require_auth(self):
+        if self._closed:
+            raise JCoreAPIConnectionClosedException(
+                "connection is already closed")
+        if self._authenticating:
+            raise JCoreAPIAuthException(
+                "authentication has not finished yet")
+        if self._auth_required and not self._authenticated:
+            raise JCoreAPIAuthException("not authenticated")
+
+    def close(self, error=JCoreAPIConnectionClosedException('connection closed'), sock_is_closed=False):
+        """
+        Close this connection.
+
+        error: the error to raise from all outstanding requests.
+        sock_is_closed: if True, will not redundantly call close() on the socket.
+        """
+        if self._closed:
+            return
+
+        if self._auth_future and not self._auth_future.done():
+            self._auth_future.set_exception(error)
+
+        for future in self._method_calls.values():
+            if not future.done():
+                future.set_exception(error)
+        self._method_calls.clear()
+
+        self._authenticating = False
+        self._authenticated = False
+        self._closed = True
+
+        if self._recv_task and not sock_is_closed:
+            self._recv_task.cancel()
+        if not sock_is_closed:
+            self._sock.close()
+        self._sock = None
+
+    async def get_real_time_data(self, channelids=None):
+        """
+        Gets real-time data from the server.  See JCoreAPIConnection.get_real_time_data.
+        """
+        return await self._call(*_get_real_time_data_request(channelids))
+
+    async def set_real_time_data(self, data):
+        """
+        Sets real-time data on the server.  See JCoreAPIConnection.set_real_time_data.
+        """
+        await self._call(*_set_real_time_data_request(data))
+
+    async def get_metadata(self, channelids=None):
+        """
+        Gets metadata from the server.  See JCoreAPIConnection.get_metadata.
+        """
+        return await self._call(*_get_metadata_request(channelids))
+
+    async def set_metadata(self, metadata):
+        """
+        Sets metadata on the server.  See JCoreAPIConnection.set_metadata.
+        """
+        await self._call(*_set_metadata_request(metadata))
+
+    async def get_historical_data(self, channelids, begintime, endtime):
+        """
+        Gets historical data from the server.  See JCoreAPIConnection.get_historical_data.
+        """
+        return await self._call(*_get_historical_data_request(channelids, begintime, endtime))
+
+    async def _call(self, method, params):
+        assert isinstance(method, str) and len(
+            method) > 0, "method must be a non-empty str"
+
+        self._require_auth()
+        _id = str(self._cur_method_id)
+        self._cur_method_id += 1
+        future = _get_running_loop().create_future()
+        self._method_calls[_id] = future
+        try:
+            await self._send(METHOD, {
+                'id': _id,
+                'method': method,
+                'params': params
+            })
+            return await self._wait(future)
+        finally:
+            self._method_calls.pop(_id, None)
+
+    async def _wait(self, future):
+        try:
+            return await asyncio.wait_for(future, self._timeout)
+        except asyncio.TimeoutError:
+            raise JCoreAPITimeoutException('operation timed out')
+
+    async def _send(self, message_name, message):
+        if not self._sock or self._closed:
+            raise JCoreAPIConnectionClosedException("connection closed")
+        if not self._recv_task:
+            self._recv_task = asyncio.ensure_future(self._run_recv_task())
+
+        message['msg'] = message_name
+        await self._sock.send(json.dumps(message))
+
+    def _handle_message(self, event):
+        message, msg = _parse_message(event)
+
+        if self._closed:
+            return
+
+        if msg == CONNECTED:
+            self._handle_connected_message(message)
+        elif msg == FAILED:
+            self._handle_failed_message(message)
+        elif msg == RESULT:
+            self._handle_result_message(message)
+        else:
+            self._handle_unknown_message(message)
+
+    def _handle_connected_message(self, message):
+        if not self._authenticating:
+            raise JCoreAPIUnexpectedMessageException(
+                "unexpected connected message", message)
+        self._authenticating = False
+        self._authenticated = True
+        self._auth_future.set_result(None)
+
+    def _handle_failed_message(self, message):
+        if not self._authenticating:
+            raise JCoreAPIUnexpectedMessageException(
+                "unexpected auth failed message", message)
+        protocol_error = _from_protocol_error(message['error']) if 'error' in message else None
+        self._authenticating = False
+        self._authenticated = False
+        self._auth_future.set_exception(JCoreAPIAuthException(
+            "authentication failed" + (": " + protocol_error if protocol_error else ""), message))
+
+    def _handle_result_message(self, message):
+        _id = _get_result_id(message)
+
+        future = self._method_calls.pop(_id, None)
+        if not future:
+            raise JCoreAPIUnexpectedMessageException(
+                "method call not found: " + _id, message)
+        if future.done():
+            # the caller timed out
+            return
+
+        error = _get_result_error(message)
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(message.get('result'))
+
+    def _handle_unknown_message(self, message):
+        _to_error_result(message)
+        self._handle_result_message(message)
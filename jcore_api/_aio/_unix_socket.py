@@ -0,0 +1,42 @@
+"""
+An asyncio interface to a unix socket with the message framing from
+.._unix_sockets._message_codec
+"""
+
+from collections import deque
+
+from ..exceptions import JCoreAPIConnectionClosedException
+from .._unix_sockets._message_codec import encode_message, MessageDecoder
+
+READ_SIZE = 65536
+
+class AsyncJCoreUnixSocket:
+    """
+    reader, writer: the asyncio streams for the unix socket
+    """
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._messages = deque()
+        self._decoder = MessageDecoder(on_message=self._messages.append)
+
+    def close(self):
+        self._writer.close()
+
+    async def recv(self):
+        while not self._messages:
+            try:
+                data = await self._reader.read(READ_SIZE)
+            except ConnectionError as e:
+                raise JCoreAPIConnectionClosedException("connection closed", e)
+            if not len(data):
+                raise JCoreAPIConnectionClosedException("socket connection broken")
+            self._decoder.decode(data)
+        return self._messages.popleft()
+
+    async def send(self, message):
+        self._writer.write(encode_message(message))
+        try:
+            await self._writer.drain()
+        except ConnectionError as e:
+            raise JCoreAPIConnectionClosedException("connection closed", e)
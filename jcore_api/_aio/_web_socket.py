@@ -0,0 +1,107 @@
+"""
+A minimal asyncio WebSocket client built on the framing and handshake code
+of the vendored websocket-client
+"""
+
+import asyncio
+import struct
+
+from ..exceptions import JCoreAPIConnectionClosedException
+from .._websocket_client.websocket._abnf import ABNF, continuous_frame, STATUS_NORMAL
+from .._websocket_client.websocket._exceptions import WebSocketException, \
+    WebSocketBadStatusException
+from .._websocket_client.websocket._handshake import _get_handshake_headers, _validate
+
+async def handshake(reader, writer, hostname, port, resource, **options):
+    """
+    Performs the WebSocket opening handshake on the given streams.
+    """
+    headers, key = _get_handshake_headers(resource, hostname, port, options)
+    writer.write("\r\n".join(headers).encode('utf-8'))
+    await writer.drain()
+
+    status, resp_headers = await _read_headers(reader)
+    if status != 101:
+        raise WebSocketBadStatusException("Handshake status %d", status)
+    success, _ = _validate(resp_headers, key, options.get("subprotocols"))
+    if not success:
+        raise WebSocketException("Invalid WebSocket Header")
+
+async def _read_headers(reader):
+    lines = (await reader.readuntil(b"\r\n\r\n")).decode('utf-8').split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        kv = line.split(":", 1)
+        if len(kv) != 2:
+            raise WebSocketException("Invalid header")
+        headers[kv[0].lower()] = kv[1].strip().lower()
+    return status, headers
+
+class AsyncJCoreWebSocket:
+    """
+    reader, writer: the asyncio streams for a connection that has completed
+                    the WebSocket handshake
+    """
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self._cont_frame = continuous_frame(False, False)
+
+    def close(self):
+        try:
+            self._write_frame(struct.pack('!H', STATUS_NORMAL), ABNF.OPCODE_CLOSE)
+        finally:
+            self._writer.close()
+
+    async def recv(self):
+        try:
+            while True:
+                frame = await self._recv_frame()
+                if frame.opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY, ABNF.OPCODE_CONT):
+                    self._cont_frame.validate(frame)
+                    self._cont_frame.add(frame)
+                    if self._cont_frame.is_fire(frame):
+                        opcode, frame = self._cont_frame.extract(frame)
+                        # extract has already decoded text frames while validating them
+                        return frame.text if frame.text is not None else frame.data.decode('utf-8')
+                elif frame.opcode == ABNF.OPCODE_CLOSE:
+                    self.close()
+                    raise JCoreAPIConnectionClosedException("connection closed")
+                elif frame.opcode == ABNF.OPCODE_PING:
+                    self._write_frame(frame.data, ABNF.OPCODE_PONG)
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            raise JCoreAPIConnectionClosedException("connection closed", e)
+
+    async def send(self, message):
+        self._write_frame(message, ABNF.OPCODE_TEXT)
+        try:
+            await self._writer.drain()
+        except ConnectionError as e:
+            raise JCoreAPIConnectionClosedException("connection closed", e)
+
+    def _write_frame(self, data, opcode):
+        self._writer.write(ABNF.create_frame(data, opcode).format())
+
+    async def _recv_frame(self):
+        read = self._reader.readexactly
+        b1, b2 = await read(2)
+
+        length = b2 & 0x7f
+        if length == 0x7e:
+            length = struct.unpack("!H", await read(2))[0]
+        elif length == 0x7f:
+            length = struct.unpack("!Q", await read(8))[0]
+
+        has_mask = b2 >> 7 & 1
+        mask = await read(4) if has_mask else None
+        payload = await read(length)
+        if has_mask:
+            payload = ABNF.mask(mask, payload)
+
+        frame = ABNF(b1 >> 7 & 1, b1 >> 6 & 1, b1 >> 5 & 1, b1 >> 4 & 1,
+                     b1 & 0xf, has_mask, payload)
+        frame.validate()
+        return frame
@@ -9,20 +9,20 @@ from ._websocket_client.websocket._core import WebSocket
 from ._api_common import LOCAL_SOCKET_PATH
 from ._connection import JCoreAPIConnection
 from ._jcore_web_socket import JCoreWebSocket
-from ._unix_sockets._jcore_unix_socket import JCoreUnixSocket
+from ._pool import JCoreAPIConnectionPool
+from ._unix_sockets._jcore_unix_socket import JCoreUnixSocket, CHUNK_SIZE, MAX_CHUNK_SIZE
 
 def _default_create_web_socket(url):
     sock = WebSocket()
-    sock.connect(url)
+    # historical data compresses well, and the server may decline
+    sock.connect(url, compression=True)
     return sock
 
-def connect(api_token, create_socket=_default_create_web_socket, **kwargs):
+def _parse_api_token(api_token):
     """
-    Connects to a jcore.io server and authenticates.
-
-    api_token: an API token from the jcore.io server you wish to connect to.
+    Decodes an API token.
 
-    returns: an authenticated JCoreAPIConnection instance.
+    returns: a tuple of the server url and the token to authenticate with.
     """
     assert isinstance(api_token, six.string_types) and len(api_token) > 0, \
         'api_token must be a nonempty string'
@@ -35,23 +35,69 @@ def connect(api_token, create_socket=_default_create_web_socket, **kwargs):
         url) > 0, 'decoded url must be a nonempty string'
     assert isinstance(token, six.string_types) and len(
         token) > 0, 'decoded token must be a nonempty string'
+    return url, token
+
+def connect(api_token, create_socket=_default_create_web_socket, **kwargs):
+    """
+    Connects to a jcore.io server and authenticates.
+
+    api_token: an API token from the jcore.io server you wish to connect to.
+
+    returns: an authenticated JCoreAPIConnection instance.
+    """
+    url, token = _parse_api_token(api_token)
+    return _connect(url, token, create_socket, **kwargs)
 
+def _connect(url, token, create_socket, **kwargs):
     sock = JCoreWebSocket(create_socket(url))
     connection = JCoreAPIConnection(sock, **kwargs)
-    connection.authenticate(token)
+    try:
+        connection.authenticate(token)
+    except:
+        connection.close()
+        raise
     return connection
 
+def connect_pool(api_token, size=4, create_socket=_default_create_web_socket, **kwargs):
+    """
+    Opens a pool of connections to a jcore.io server, each authenticated with the
+    same API token.
+
+    api_token: an API token from the jcore.io server you wish to connect to.
+    size: the number of connections.  default is 4
+
+    returns: a JCoreAPIConnectionPool instance.
+    """
+    url, token = _parse_api_token(api_token)
+    return JCoreAPIConnectionPool(lambda: _connect(url, token, create_socket, **kwargs), size)
+
 def _default_create_unix_socket(path):
     sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     sock.connect(path)
     return sock
 
-def connect_local(create_socket=_default_create_unix_socket, **kwargs):
+def connect_local(create_socket=_default_create_unix_socket, min_chunk_size=CHUNK_SIZE,
+                  max_chunk_size=MAX_CHUNK_SIZE, **kwargs):
     """
     Connects to a jcore.io server on the local machine via a
     unix socket.
 
+    min_chunk_size, max_chunk_size: the limits on the number of bytes to read from
+        the socket at once.  Within them, reads are sized to fit the rest of the
+        message being received.
+
     returns: an JCoreAPIConnection instance.
     """
-    sock = JCoreUnixSocket(create_socket(LOCAL_SOCKET_PATH))
+    sock = JCoreUnixSocket(create_socket(LOCAL_SOCKET_PATH), min_chunk_size, max_chunk_size)
     return JCoreAPIConnection(sock, auth_required=False, **kwargs)
+
+def connect_local_pool(size=4, create_socket=_default_create_unix_socket, **kwargs):
+    """
+    Opens a pool of connections to a jcore.io server on the local machine via
+    unix sockets.
+
+    size: the number of connections.  default is 4
+
+    returns: a JCoreAPIConnectionPool instance.
+    """
+    return JCoreAPIConnectionPool(lambda: connect_local(create_socket, **kwargs), size)
@@ -0,0 +1,68 @@
+"""
+conversion of historical data to NumPy arrays (requires numpy)
+"""
+
+import json
+import re
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .exceptions import JCoreAPIInvalidMessageException
+
+# matches {"t": [...], "v": [...]} (in either order) where the arrays don't contain
+# strings or nested values, so that they can be parsed straight into arrays
+_CHANNEL = re.compile(
+    r'\s*\{\s*"([tv])"\s*:\s*\[([^\]\["{]*)\]\s*,\s*"([tv])"\s*:\s*\[([^\]\["{]*)\]\s*\}\s*$')
+_INTEGERS = re.compile(r'[-0-9,\s]*$')
+_NUMBERS = re.compile(r'[-+0-9.eE,\snul]*$')
+
+def require_numpy():
+    if numpy is None:
+        raise ImportError("numpy is required for as_arrays=True")
+
+def to_arrays(t, v):
+    """
+    converts the times and values of a channel to arrays.
+
+    returns: a tuple of an int64 array of times and a float64 array of values,
+        where null values are NaN
+    """
+    return numpy.asarray(t if t is not None else [], dtype=numpy.int64), \
+        numpy.asarray(v if v is not None else [], dtype=numpy.float64)
+
+def _from_text(text, dtype):
+    if not text.strip():
+        return numpy.empty(0, dtype=dtype)
+    try:
+        array = numpy.fromstring(text, dtype=dtype, sep=',')
+    except ValueError:
+        # numpy 2 raises on an item it can't parse, so let json.loads report the error
+        return None
+    if len(array) != text.count(',') + 1:
+        # older versions of numpy stop at the first item they can't parse
+        return None
+    return array
+
+def parse_channel(text):
+    """
+    parses the JSON text of a channel's historical data into arrays, without
+    creating a Python object for each time and value when possible.
+
+    returns: a tuple like to_arrays
+    """
+    match = _CHANNEL.match(text)
+    if match and match.group(1) != match.group(3):
+        arrays = {match.group(1): match.group(2), match.group(3): match.group(4)}
+        if _INTEGERS.match(arrays['t']) and _NUMBERS.match(arrays['v']):
+            t = _from_text(arrays['t'], numpy.int64)
+            v = _from_text(arrays['v'].replace('null', 'nan'), numpy.float64)
+            if t is not None and v is not None:
+                return t, v
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise JCoreAPIInvalidMessageException("invalid JSON in message", e)
+    return to_arrays(data.get('t'), data.get('v'))
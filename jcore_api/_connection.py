@@ -1,4 +1,6 @@
 from __future__ import print_function
+import collections
+import itertools
 import json
 import threading
 import time
@@ -7,8 +9,19 @@ import sys
 
 import six
 
-from ._protocol import CONNECT, CONNECTED, FAILED, METHOD, RESULT, GET_HISTORICAL_DATA, \
-    GET_METADATA, SET_METADATA, GET_REAL_TIME_DATA, SET_REAL_TIME_DATA
+if six.PY3:
+    from queue import Queue, Empty
+else:
+    from Queue import Queue, Empty
+
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, wait
+
+from . import _arrays, _historical
+from ._protocol import CONNECT, CONNECTED, FAILED, METHOD, RESULT, REAL_TIME_DATA, \
+    GET_HISTORICAL_DATA, GET_METADATA, SET_METADATA, GET_REAL_TIME_DATA, SET_REAL_TIME_DATA, \
+    SUBSCRIBE_REAL_TIME_DATA, UNSUBSCRIBE_REAL_TIME_DATA
+from ._metadata_cache import MetadataCache
+from ._result_stream import ResultStreamParser
 from .exceptions import JCoreAPIException, JCoreAPITimeoutException, JCoreAPIAuthException, \
     JCoreAPIConnectionClosedException, JCoreAPIUnexpectedMessageException, \
     JCoreAPIErrorResponseException, JCoreAPIInvalidMessageException
@@ -17,6 +30,10 @@ def _default_on_unexpected_exception(exc_info):
     print(*traceback.format_exception(*exc_info), file=sys.stderr)
 
 
+def _default_on_async_error(error):
+    print(*traceback.format_exception_only(type(error), error), file=sys.stderr)
+
+
 def _wait(cv, timeout):
     startTime = time.time()
     cv.wait(timeout)
@@ -24,6 +41,13 @@ def _wait(cv, timeout):
         raise JCoreAPITimeoutException('operation timed out')
 
 
+def _result(future, timeout):
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        raise JCoreAPITimeoutException('operation timed out')
+
+
 def _from_protocol_error(error):
     if error:
         if isinstance(error, six.text_type):
@@ -31,6 +55,67 @@ def _from_protocol_error(error):
         if isinstance(error, dict):
             return error[six.u('error')] if six.u('error') in error else error
 
+def _parse_message(event):
+    """
+    Parses and validates a message received from the server.
+
+    returns: a tuple of the parsed message and its msg field
+    """
+    return _validate_message(json.loads(event))
+
+def _validate_message(message):
+    if six.u('msg') not in message:
+        raise JCoreAPIInvalidMessageException(
+            "msg field is missing", message)
+
+    msg = message[six.u('msg')]
+    if not (isinstance(msg, six.text_type) and len(msg) > 0):
+        raise JCoreAPIInvalidMessageException(
+            "msg must be a non-empty unicode string", message)
+    return message, msg
+
+def _get_result_id(message):
+    _id = message[six.u('id')]
+    if not (isinstance(_id, six.text_type) and len(_id) > 0):
+        raise JCoreAPIInvalidMessageException(
+            "id must be a non-empty unicode string", message)
+    return _id
+
+def _get_result_error(message):
+    """
+    Gets the exception to raise for a result message, if it has an error
+    """
+    if six.u('error') in message:
+        error = message[six.u('error')]
+        if isinstance(error, JCoreAPIException):
+            return error
+        return JCoreAPIErrorResponseException(_from_protocol_error(error), message)
+
+def _to_error_result(message):
+    """
+    Turns a message of an unknown type into an error result for its id,
+    so that the error gets raised on the caller.
+    """
+    msg = message[six.u('msg')]
+    if six.u('id') not in message:
+        if msg != RESULT:
+            raise JCoreAPIInvalidMessageException(
+                'invalid message type: ' + msg, message)
+        else:
+            raise JCoreAPIInvalidMessageException(
+                "id field is missing", message)
+
+    if six.u('error') not in message:
+        message[six.u('error')] = JCoreAPIInvalidMessageException(
+            'invalid message type: ' + msg, message)
+
+def _parse_channel(text):
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise JCoreAPIInvalidMessageException("invalid JSON in message", e)
+    return data.get(six.u('t')), data.get(six.u('v'))
+
 def _get_list(type_, items, name="items"):
     """
     Normalizes maybe item or list of items to maybe list
@@ -46,6 +131,31 @@ def _get_list(type_, items, name="items"):
 def _get_channelids(channelids=None):
     return _get_list(six.string_types, channelids, name="channelids")
 
+def _get_real_time_data_request(channelids=None):
+    return GET_REAL_TIME_DATA, [{'channelIds': _get_channelids(channelids)}] if channelids else []
+
+def _set_real_time_data_request(data):
+    assert isinstance(data, dict), "data must be a dict"
+    return SET_REAL_TIME_DATA, [data]
+
+def _get_metadata_request(channelids=None):
+    return GET_METADATA, [{'channelIds': _get_channelids(channelids)}] if channelids else []
+
+def _set_metadata_request(metadata):
+    assert isinstance(metadata, dict), "metadata must be a dict"
+    return SET_METADATA, [metadata]
+
+def _subscription_request(method, channelids):
+    return method, [{'channelIds': channelids}] if channelids else []
+
+def _get_historical_data_request(channelids, begintime, endtime):
+    channelids = _get_channelids(channelids)
+    assert isinstance(begintime, int) or isinstance(begintime, six.string_types), \
+            "begintime must be a string or number"
+    assert isinstance(endtime, int) or isinstance(endtime, six.string_types), \
+            "endtime must be a string or number"
+    return GET_HISTORICAL_DATA, [{'channelIds': channelids, 'beginTime': begintime, 'endTime': endtime}]
+
 class JCoreAPIConnection:
     """
     A connection a to jcore.io server.
@@ -54,24 +164,56 @@ class JCoreAPIConnection:
         send(message):    sends a message
         recv():                 receives a message
         close():                closes the socket
+        and optionally
+        start_receiving(on_chunk, on_close): receives on the socket's own thread,
+                                calling on_chunk(text, final) with each piece of a message
+                                and on_close(error) when the socket closes, instead of
+                                recv() being called from a receive thread
     auth_required: whether authentication is required.
                                 If so, methods will throw an error if the client is not authenticated.
                                 default is True
+    on_async_error: called with the exception when a set sent with wait=False, or the
+                    unsubscribe sent when a subscription is closed, fails.
+                    default prints it to stderr
+    metadata_cache: whether to cache metadata, so that get_metadata only fetches channels
+                    that haven't been fetched before.  default is False
+    metadata_ttl: how many seconds cached metadata stays valid, or None to keep it until
+                  invalidate_metadata is called.  default is None
     """
-    def __init__(self, sock, auth_required=True, on_unexpected_exception=_default_on_unexpected_exception):
-        self._lock = threading.RLock()
+    def __init__(self, sock, auth_required=True, on_unexpected_exception=_default_on_unexpected_exception,
+                 on_async_error=_default_on_async_error, metadata_cache=False, metadata_ttl=None):
+        # guards authentication and closing.  Method calls don't acquire it; they rely on
+        # atomic dict operations on _method_calls and per-call futures instead.
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
         self._sock = sock
         self._auth_required = auth_required
         self._on_unexpected_exception = on_unexpected_exception
+        self._on_async_error = on_async_error
+        self._metadata_cache = MetadataCache(metadata_ttl) if metadata_cache else None
         self._started = False
         self._closed = False
+        self._close_error = None
         self._authenticating = False
         self._authenticated = False
         self._autherror = None
         self._authcv = threading.Condition(self._lock)
 
-        self._cur_method_id = 0
+        self._method_ids = itertools.count()
         self._method_calls = {}
+        # stream callbacks for method calls, by id
+        self._streams = {}
+
+        # real-time data subscriptions.  Replaced rather than modified (under _lock), so
+        # that the receive thread can iterate over it without locking
+        self._subscriptions = ()
+        # number of subscriptions for each channel id (None for all channels)
+        self._subscription_counts = {}
+
+        # pieces or parser of the message being received, if it hasn't been received
+        # all at once
+        self._message_chunks = None
+        self._message_parser = None
 
         self._recv_thread = threading.Thread(
             target=self._run_recv_thread, name="jcore.io receiver")
@@ -84,19 +226,37 @@ class JCoreAPIConnection:
         if not sock:
             return
 
+        recv_chunk = getattr(sock, 'recv_chunk', None)
+
         while not self._closed:
             try:
-                self._handle_message(sock.recv())
+                if recv_chunk:
+                    self._handle_chunk(*recv_chunk())
+                else:
+                    self._handle_message(sock.recv())
             except JCoreAPITimeoutException:
                 continue
             except JCoreAPIConnectionClosedException as error:
-                self.close(error, sock_is_closed=True)
+                self._on_sock_closed(error)
                 return
-            except Exception as e:
-                try:
-                    self._on_unexpected_exception(sys.exc_info())
-                except Exception as e:
-                    traceback.print_exc()
+            except Exception:
+                self._report_unexpected_exception()
+
+    def _on_sock_chunk(self, chunk, final):
+        # called on the socket's own thread, for sockets that have start_receiving
+        try:
+            self._handle_chunk(chunk, final)
+        except Exception:
+            self._report_unexpected_exception()
+
+    def _on_sock_closed(self, error):
+        self.close(error, sock_is_closed=True)
+
+    def _report_unexpected_exception(self):
+        try:
+            self._on_unexpected_exception(sys.exc_info())
+        except Exception:
+            traceback.print_exc()
 
     def authenticate(self, token):
         """
@@ -117,11 +277,16 @@ class JCoreAPIConnection:
 
             self._authenticating = True
             self._autherror = None
+            timeout = self._gettimeout()
 
-            self._send(CONNECT, {six.u('token'): token})
+            self._lock.release()
+            try:
+                self._send(CONNECT, {six.u('token'): token})
+            finally:
+                self._lock.acquire()
 
             while self._authenticating:
-                _wait(self._authcv, self._sock.gettimeout())
+                _wait(self._authcv, timeout)
 
             if self._autherror:
                 raise self._autherror
@@ -130,18 +295,14 @@ class JCoreAPIConnection:
             self._lock.release()
         
     def _require_auth(self):
-        self._lock.acquire()
-        try:
-            if self._closed:
-                raise JCoreAPIConnectionClosedException(
-                    "connection is already closed")
-            if self._authenticating:
-                raise JCoreAPIAuthException(
-                    "authentication has not finished yet")
-            if self._auth_required and not self._authenticated:
-                raise JCoreAPIAuthException("not authenticated")
-        finally:
-            self._lock.release()
+        if self._closed:
+            raise JCoreAPIConnectionClosedException(
+                "connection is already closed")
+        if self._authenticating:
+            raise JCoreAPIAuthException(
+                "authentication has not finished yet")
+        if self._auth_required and not self._authenticated:
+            raise JCoreAPIAuthException("not authenticated")
 
     def close(self, error=JCoreAPIConnectionClosedException('connection closed'), sock_is_closed=False):
         """
@@ -155,28 +316,37 @@ class JCoreAPIConnection:
             if self._closed:
                 return
 
+            # method calls registered after this point will see _closed and
+            # fail themselves (see _call_many_async)
+            self._close_error = error
+            self._closed = True
+
             if self._authenticating:
                 self._autherror = error
                 self._authcv.notify_all()
 
-            for method_call in six.itervalues(self._method_calls):
-                method_call['error'] = error
-                method_call['done'] = True
-                method_call['cv'].notify()
-
-            self._method_calls.clear()
-
             self._authenticating = False
             self._authenticated = False
-            self._closed = True
 
-            if not sock_is_closed:
-                self._sock.close()
+            sock = self._sock
             self._sock = None
-
         finally:
             self._lock.release()
 
+        if not sock_is_closed:
+            sock.close()
+        self._fail_method_calls(error)
+        for subscription in self._subscriptions:
+            subscription._end(error)
+
+    def _fail_method_calls(self, error):
+        while True:
+            try:
+                _id, future = self._method_calls.popitem()
+            except KeyError:
+                return
+            future.set_exception(error)
+
     def get_real_time_data(self, channelids=None):
         """
         Gets real-time data from the server.
@@ -186,16 +356,125 @@ class JCoreAPIConnection:
         returns: a JSON Real-Time Data object 
             (https://jcoreio.gitbooks.io/jcore-api-py/content/docs/api/schema/realTimeData.md)
         """
-        return self._call(GET_REAL_TIME_DATA, [{'channelIds': _get_channelids(channelids)}] if channelids else [])
+        return self._call(*_get_real_time_data_request(channelids))
 
-    def set_real_time_data(self, data):
+    def get_real_time_data_async(self, channelids=None):
+        """
+        Like get_real_time_data, but returns a Future instead of waiting for the result.
+        """
+        return self.call_async(*_get_real_time_data_request(channelids))
+
+    def set_real_time_data(self, data, wait=True):
         """
         Sets real-time data on the server.
 
         data: a dict mapping from channel id to value
+        wait: if False, returns as soon as the data is sent instead of waiting for the
+              server's response.  If the server responds with an error, it is passed to
+              the connection's on_async_error callback instead of being raised.
+        """
+        self._set(_set_real_time_data_request(data), wait)
+
+    def set_real_time_data_async(self, data):
+        """
+        Like set_real_time_data, but returns a Future instead of waiting for the result.
+        """
+        return self.call_async(*_set_real_time_data_request(data))
+
+    def subscribe_real_time_data(self, channelids=None, callback=None):
+        """
+        Subscribes to real-time data, so that the server sends new values as they
+        change instead of having to poll get_real_time_data.
+
+        channelids: a string or list of strings specifying the channel id(s) to get data for,
+                    or None for all channels
+        callback: if given, called on the receive thread with a JSON Real-Time Data object
+                  for each update.  It must not wait for method calls.  Otherwise, iterate
+                  over the returned subscription to get the updates.
+
+        returns: a RealTimeDataSubscription
         """
-        assert isinstance(data, dict), "data must be a dict"
-        self._call(SET_REAL_TIME_DATA, [data])
+        channelids = _get_channelids(channelids)
+        subscription = RealTimeDataSubscription(self, channelids, callback)
+        keys = channelids or [None]
+
+        self._lock.acquire()
+        try:
+            counts = self._subscription_counts
+            if None in keys:
+                request = _subscription_request(SUBSCRIBE_REAL_TIME_DATA, None) \
+                    if not counts.get(None) else None
+            else:
+                # an all-channels subscription already covers these
+                new_channelids = [key for key in keys if not counts.get(key)]
+                request = _subscription_request(SUBSCRIBE_REAL_TIME_DATA, new_channelids) \
+                    if new_channelids and not counts.get(None) else None
+            for key in keys:
+                counts[key] = counts.get(key, 0) + 1
+            self._subscriptions += (subscription,)
+        finally:
+            self._lock.release()
+
+        try:
+            if request:
+                self._call(*request)
+        except:
+            self._remove_subscription(subscription)
+            raise
+        return subscription
+
+    def _remove_subscription(self, subscription):
+        """
+        returns: the (method, params) requests that update the server's subscriptions
+            for the channels that no subscription needs anymore
+        """
+        self._lock.acquire()
+        try:
+            if subscription not in self._subscriptions:
+                return []
+            self._subscriptions = tuple(s for s in self._subscriptions if s is not subscription)
+            counts = self._subscription_counts
+            unused = []
+            for key in subscription.channelids or [None]:
+                counts[key] -= 1
+                if not counts[key]:
+                    del counts[key]
+                    unused.append(key)
+
+            if None in unused:
+                # unsubscribing without channel ids ends all of them, so resubscribe to
+                # the ones other subscriptions still need
+                requests = [_subscription_request(UNSUBSCRIBE_REAL_TIME_DATA, None)]
+                remaining = [key for key in counts if key is not None]
+                if remaining:
+                    requests.append(_subscription_request(SUBSCRIBE_REAL_TIME_DATA, remaining))
+                return requests
+            if unused and not counts.get(None):
+                return [_subscription_request(UNSUBSCRIBE_REAL_TIME_DATA, unused)]
+            return []
+        finally:
+            self._lock.release()
+
+    def _unsubscribe(self, subscription):
+        # doesn't wait for the results, so that a subscription can be closed on the
+        # receive thread (for instance, from its own callback)
+        requests = self._remove_subscription(subscription)
+        if not requests or self._closed:
+            return
+        try:
+            calls = self._call_many_async(requests)
+        except JCoreAPIConnectionClosedException:
+            return
+        except Exception as error:
+            self._report_async_error(error)
+            return
+
+        def on_done(future):
+            error = future.exception()
+            if error is not None and not isinstance(error, JCoreAPIConnectionClosedException):
+                self._report_async_error(error)
+        for _id, future in calls:
+            future.add_done_callback(on_done)
 
     def get_metadata(self, channelids=None):
         """
@@ -206,18 +485,57 @@ class JCoreAPIConnection:
         returns: a dict mapping from channel id to JSON Metadata object
             (https://jcoreio.gitbooks.io/jcore-api-py/content/docs/api/schema/metadata.md)
         """
-        return self._call(GET_METADATA, [{'channelIds': _get_channelids(channelids)}] if channelids else [])
+        cache = self._metadata_cache
+        if cache is None:
+            return self._call(*_get_metadata_request(channelids))
+
+        cached, missing = cache.get(_get_channelids(channelids) or None)
+        if missing is None:
+            metadata = self._call(*_get_metadata_request())
+            cache.put(metadata, complete=True)
+            return metadata
+        if missing:
+            metadata = self._call(*_get_metadata_request(missing))
+            cache.put(metadata)
+            cached.update(metadata or {})
+        return cached
+
+    def get_metadata_async(self, channelids=None):
+        """
+        Like get_metadata, but returns a Future instead of waiting for the result.
+        """
+        return self.call_async(*_get_metadata_request(channelids))
 
-    def set_metadata(self, metadata):
+    def set_metadata(self, metadata, wait=True):
         """
         Sets metadata on the server.
 
         metadata: a dict mapping from channel id to JSON Metadata object
+        wait: if False, returns as soon as the metadata is sent.  See set_real_time_data.
         """
-        assert isinstance(metadata, dict), "metadata must be a dict"
-        self._call(SET_METADATA, [metadata])
+        cache = self._metadata_cache
+        self._set(_set_metadata_request(metadata), wait,
+                  on_success=(lambda: cache.update(metadata)) if cache else None)
 
-    def get_historical_data(self, channelids, begintime, endtime):
+    def invalidate_metadata(self, channelids=None):
+        """
+        Removes channels from the metadata cache, so that the next get_metadata fetches
+        them from the server.  Does nothing if the connection doesn't cache metadata.
+
+        channelids: a string or list of strings specifying the channel id(s) to remove,
+                    or None to remove all channels
+        """
+        if self._metadata_cache is not None:
+            self._metadata_cache.invalidate(_get_channelids(channelids))
+
+    def set_metadata_async(self, metadata):
+        """
+        Like set_metadata, but returns a Future instead of waiting for the result.
+        """
+        return self.call_async(*_set_metadata_request(metadata))
+
+    def get_historical_data(self, channelids, begintime, endtime, as_arrays=False,
+                            chunk_duration=None, channels_per_request=None, max_in_flight=4):
         """
         Gets historical data from the server.
 
@@ -226,102 +544,314 @@ class JCoreAPIConnection:
                      string or a numeric timestamp (milliseconds since the epoch)
         endtime: the end of the time range to fetch; either an ISO Date
                    string or a numeric timestamp (milliseconds since the epoch)
+        as_arrays: if True, the t and v of each channel will be NumPy arrays (int64 and
+                   float64, with NaN for null values) instead of lists.  They are parsed
+                   directly from the response as each channel is received.  Requires numpy.
+        chunk_duration: if given, the time range is fetched in pieces of at most this many
+                        milliseconds, and the results are merged.  begintime and endtime
+                        must be numeric.
+        channels_per_request: if given, the channels are fetched in groups of at most this
+                              many channels, and the results are merged.
+        max_in_flight: the maximum number of pieces to request at once when chunk_duration
+                       or channels_per_request is given.  default is 4
 
         returns: a JSON Historical Data object
             (https://jcoreio.gitbooks.io/jcore-api-py/content/docs/api/schema/historicalData.md)
         """
-        channelids = _get_channelids(channelids)
-        assert isinstance(begintime, int) or isinstance(begintime, six.string_types), \
-                "begintime must be a string or number"
-        assert isinstance(endtime, int) or isinstance(endtime, six.string_types), \
-                "endtime must be a string or number"
-        return self._call(GET_HISTORICAL_DATA, [{'channelIds': channelids, 'beginTime': begintime, 'endTime': endtime}])
+        if chunk_duration or channels_per_request:
+            return self._get_historical_data_chunked(
+                channelids, begintime, endtime, as_arrays,
+                chunk_duration, channels_per_request, max_in_flight)
+        if not as_arrays:
+            return self._call(*_get_historical_data_request(channelids, begintime, endtime))
+
+        future, stream = self._get_historical_data_stream(channelids, begintime, endtime, as_arrays)
+        data = {}
+        for channelid, t, v in stream:
+            data[channelid] = {six.u('t'): t, six.u('v'): v}
+        result = dict(future.result() or {})
+        result[six.u('data')] = data
+        return result
+
+    def _get_historical_data_chunked(self, channelids, begintime, endtime, as_arrays,
+                                     chunk_duration, channels_per_request, max_in_flight):
+        assert max_in_flight > 0, "max_in_flight must be positive"
+        if as_arrays:
+            _arrays.require_numpy()
+        requests = _historical.split_request(
+            _get_channelids(channelids), begintime, endtime, chunk_duration, channels_per_request)
+        merger = _historical.HistoricalDataMerger(begintime, endtime, as_arrays)
+        timeout = self._gettimeout()
+
+        # results are merged in order, so wait for the oldest piece before requesting
+        # another once max_in_flight are outstanding
+        pending = collections.deque()
+        try:
+            for request in requests:
+                if len(pending) >= max_in_flight:
+                    merger.add(_result(pending[0][1], timeout))
+                    pending.popleft()
+                pending.append(self._call_async(*_get_historical_data_request(*request)))
+            while pending:
+                merger.add(_result(pending[0][1], timeout))
+                pending.popleft()
+        finally:
+            for _id, future in pending:
+                self._method_calls.pop(_id, None)
+        return merger.result()
 
-    def _call(self, method, params):
-        assert isinstance(method, str) and len(
-            method) > 0, "method must be a non-empty str"
+    def get_historical_data_async(self, channelids, begintime, endtime):
+        """
+        Like get_historical_data, but returns a Future instead of waiting for the result.
+        """
+        return self.call_async(*_get_historical_data_request(channelids, begintime, endtime))
 
-        method_call = None
-        _id = None
+    def get_historical_data_stream(self, channelids, begintime, endtime, as_arrays=False):
+        """
+        Like get_historical_data, but yields the data for each channel as soon as it has been
+        received.  If the socket supports it, the response is parsed incrementally as it
+        arrives.  Parsed channels are queued until they are yielded, so peak memory depends on
+        how fast the iterator is consumed.
 
-        self._lock.acquire()
-        try:
-            self._require_auth()
-            _id = str(self._cur_method_id)
-            self._cur_method_id += 1
-            method_call = {
-                'done': False,
-                'error': None,
-                'result': None,
-                'cv': threading.Condition(self._lock) 
-            }
-            self._method_calls[_id] = method_call
-
-            self._send(METHOD, {
-                'id': _id,
-                'method': method,
-                'params': params
-            })
+        returns: an iterator of (channelid, t, v) tuples, where t and v are the lists
+            (or arrays, if as_arrays is True) of times and values for the channel
+        """
+        return self._get_historical_data_stream(channelids, begintime, endtime, as_arrays)[1]
+
+    def _get_historical_data_stream(self, channelids, begintime, endtime, as_arrays):
+        if as_arrays:
+            _arrays.require_numpy()
+        parse_channel = _arrays.parse_channel if as_arrays else _parse_channel
+        # unbounded, so that a slow consumer never stalls the receive thread and other calls
+        channels = Queue()
+
+        def on_channel(channelid, text):
+            # errors are raised from the iterator rather than on the receive thread
+            try:
+                channels.put_nowait((channelid,) + parse_channel(text))
+            except Exception as e:
+                channels.put_nowait(e)
 
-            while not method_call['done']:
-                _wait(method_call['cv'], self._sock.gettimeout())
+        _id, future = self._call_async(
+            *_get_historical_data_request(channelids, begintime, endtime), stream=on_channel)
+        future.add_done_callback(lambda future: channels.put_nowait(None))
+        return future, self._iter_stream(_id, future, channels, as_arrays, self._gettimeout())
 
-            if method_call['error']:
-                raise method_call['error']
-            return method_call['result']
+    def _iter_stream(self, _id, future, channels, as_arrays, timeout):
+        try:
+            while True:
+                try:
+                    item = channels.get(timeout=timeout)
+                except Empty:
+                    raise JCoreAPITimeoutException('operation timed out')
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+
+            # the result has the data for any channels that weren't streamed
+            result = future.result()
+            for channelid, data in six.iteritems(result.get(six.u('data')) or {}):
+                t, v = data.get(six.u('t')), data.get(six.u('v'))
+                yield (channelid,) + (_arrays.to_arrays(t, v) if as_arrays else (t, v))
         finally:
-            if _id in self._method_calls:
-                del self._method_calls[_id]
-            self._lock.release()
+            self._method_calls.pop(_id, None)
+            self._streams.pop(_id, None)
 
-    def _send(self, message_name, message):
-        sock = None
+    def call_async(self, method, params):
+        """
+        Sends a method call to the server without waiting for the result, so that
+        many calls can be in flight at once on this connection.
 
-        self._lock.acquire()
+        method: the name of the method to call
+        params: the list of params for the method
+
+        returns: a concurrent.futures.Future that will be resolved with the result,
+            or failed with a JCoreAPIException.  Callbacks added to the Future are
+            called on the receive thread, so they must not wait for other calls.
+        """
+        return self._call_async(method, params)[1]
+
+    def _set(self, request, wait, on_success=None):
+        if wait:
+            self._call(*request)
+            if on_success:
+                on_success()
+            return
+
+        def on_done(future):
+            if future.exception() is None:
+                if on_success:
+                    on_success()
+            else:
+                self._report_async_error(future.exception())
+        self._call_async(*request)[1].add_done_callback(on_done)
+
+    def _report_async_error(self, error):
         try:
-            if not self._started:
-                self._started = True
-                self._recv_thread.start()
+            self._on_async_error(error)
+        except Exception:
+            traceback.print_exc()
 
-            sock = self._sock
-            if not sock or self._closed:
-                raise JCoreAPIConnectionClosedException("connection closed")
+    def _call(self, method, params):
+        timeout = self._gettimeout()
+        _id, future = self._call_async(method, params)
+        try:
+            return _result(future, timeout)
         finally:
-            self._lock.release()
+            self._method_calls.pop(_id, None)
 
-        message['msg'] = message_name
-        sock.send(json.dumps(message))
+    def _gettimeout(self):
+        sock = self._sock
+        return sock.gettimeout() if sock else None
 
-    def _handle_message(self, event):
-        message = json.loads(event)
-        if six.u('msg') not in message:
-            raise JCoreAPIInvalidMessageException(
-                "msg field is missing", message)
+    def batch(self):
+        """
+        Creates a batch for sending several method calls to the server at once.
 
-        msg = message[six.u('msg')]
-        if not (isinstance(msg, six.text_type) and len(msg) > 0):
-            raise JCoreAPIInvalidMessageException(
-                "msg must be a non-empty unicode string", message)
+        returns: a JCoreAPIBatch
+        """
+        return JCoreAPIBatch(self)
+
+    def _call_async(self, method, params, stream=None):
+        return self._call_many_async([(method, params)], [stream])[0]
+
+    def _call_many_async(self, requests, streams=None):
+        """
+        Sends method calls to the server together.
+
+        requests: a list of (method, params) tuples
+        streams: an optional list of callbacks for the calls, which will be called with
+                 the channel id and JSON text of each entry in result.data as soon as it is
+                 received.  Those entries are left out of the result.
+
+        returns: a list of (id, future) tuples for the calls
+        """
+        calls = []
+        messages = []
+        for method, params in requests:
+            assert isinstance(method, str) and len(
+                method) > 0, "method must be a non-empty str"
+
+            future = Future()
+            # the request is sent immediately, so it can't be cancelled
+            future.set_running_or_notify_cancel()
+            calls.append((None, future))
+            messages.append({
+                'method': method,
+                'params': params
+            })
+
+        self._require_auth()
+        for i, message in enumerate(messages):
+            _id = str(next(self._method_ids))
+            message['id'] = _id
+            calls[i] = (_id, calls[i][1])
+            if streams and streams[i]:
+                self._streams[_id] = streams[i]
+                calls[i][1].add_done_callback(
+                    lambda future, _id=_id: self._streams.pop(_id, None))
+            self._method_calls[_id] = calls[i][1]
 
-        # Synchronize all message handling to ensure we'll ignore messages
-        # after the connection has closed
-        self._lock.acquire()
         try:
-            if self._closed:
-                # don't raise an exception here, it has already been
-                # handled in _run_recv_thread
-                return
+            self._send_many(METHOD, messages)
+        except:
+            for _id, future in calls:
+                self._method_calls.pop(_id, None)
+                self._streams.pop(_id, None)
+            raise
+
+        if self._closed:
+            # close() may have finished failing method calls before these were registered
+            self._fail_method_calls(self._close_error)
 
-            if msg == CONNECTED:
-                self._handle_connected_message(message)
-            elif msg == FAILED:
-                self._handle_failed_message(message)
-            elif msg == RESULT:
-                self._handle_result_message(message)
+        return calls
+
+    def _send(self, message_name, message):
+        self._send_many(message_name, [message])
+
+    def _send_many(self, message_name, messages):
+        if not self._started:
+            self._lock.acquire()
+            try:
+                if not self._started:
+                    self._started = True
+                    start_receiving = getattr(self._sock, 'start_receiving', None)
+                    if start_receiving:
+                        # the socket dispatches received messages itself, so no
+                        # receive thread of our own is needed
+                        start_receiving(self._on_sock_chunk, self._on_sock_closed)
+                    else:
+                        self._recv_thread.start()
+            finally:
+                self._lock.release()
+
+        sock = self._sock
+        if not sock or self._closed:
+            raise JCoreAPIConnectionClosedException("connection closed")
+
+        encoded = []
+        for message in messages:
+            message['msg'] = message_name
+            encoded.append(json.dumps(message))
+
+        self._send_lock.acquire()
+        try:
+            if len(encoded) > 1 and hasattr(sock, 'send_many'):
+                sock.send_many(encoded)
             else:
-                self._handle_unknown_message(message)                 
+                for message in encoded:
+                    sock.send(message)
         finally:
-            self._lock.release()
+            self._send_lock.release()
+
+    def _handle_chunk(self, chunk, final):
+        parser = self._message_parser
+        if parser is None and self._message_chunks is None:
+            if final:
+                return self._handle_message(chunk)
+            if self._streams:
+                parser = self._message_parser = ResultStreamParser(self._streams.get)
+            else:
+                self._message_chunks = []
+
+        if parser is None:
+            self._message_chunks.append(chunk)
+            if final:
+                chunks = self._message_chunks
+                self._message_chunks = None
+                self._handle_message(six.u('').join(chunks))
+            return
+
+        try:
+            parser.feed(chunk)
+            message = parser.close() if final else None
+        finally:
+            if final:
+                self._message_parser = None
+        if message is not None:
+            self._dispatch_message(*_validate_message(message))
+
+    def _handle_message(self, event):
+        self._dispatch_message(*_parse_message(event))
+
+    def _dispatch_message(self, message, msg):
+        if self._closed:
+            # don't raise an exception here, it has already been
+            # handled in _run_recv_thread
+            return
+
+        if msg == CONNECTED:
+            self._handle_connected_message(message)
+        elif msg == FAILED:
+            self._handle_failed_message(message)
+        elif msg == RESULT:
+            self._handle_result_message(message)
+        elif msg == REAL_TIME_DATA:
+            self._handle_real_time_data_message(message)
+        else:
+            self._handle_unknown_message(message)
 
     def _handle_connected_message(self, message):
         self._lock.acquire()
@@ -353,49 +883,205 @@ class JCoreAPIConnection:
             self._lock.release()
 
     def _handle_result_message(self, message):
-        self._lock.acquire()
-        try:
-            msg = message[six.u('msg')]
+        _id = _get_result_id(message)
+
+        # popping is atomic, so only one thread can resolve the future
+        future = self._method_calls.pop(_id, None)
+        if future is None:
+            raise JCoreAPIUnexpectedMessageException(
+                "method call not found: " + _id, message)
+
+        error = _get_result_error(message)
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(message.get(six.u('result')))
+
+    def _handle_real_time_data_message(self, message):
+        data = message.get(six.u('data'))
+        if not isinstance(data, dict):
+            raise JCoreAPIInvalidMessageException("data must be an object", message)
+        timestamp = message.get(six.u('timestamp'))
+        for subscription in self._subscriptions:
+            try:
+                subscription._deliver(data, timestamp)
+            except Exception:
+                # one failing callback shouldn't keep the update from other subscriptions
+                self._report_unexpected_exception()
+
+    def _handle_unknown_message(self, message):
+        _to_error_result(message)
 
-            _id = message[six.u('id')]
-            if not (isinstance(_id, six.text_type) and len(_id) > 0):
-                raise JCoreAPIInvalidMessageException(
-                    "id must be a non-empty unicode string", message)
+        # handle it like a result message so that error gets raised on the
+        # caller for its id
+        return self._handle_result_message(message)
 
-            if _id not in self._method_calls:
-                raise JCoreAPIUnexpectedMessageException(
-                    "method call not found: " + _id, message)
 
-            method_call = self._method_calls[_id]
+class JCoreAPIBatch:
+    """
+    Collects method calls and sends them to the server together, so that they
+    cost one socket write and one round trip instead of one each.
+    Create with JCoreAPIConnection.batch().
 
-            if six.u('error') in message:
-                error = message[six.u('error')]
-                if isinstance(error, JCoreAPIException):
-                    method_call['error'] = error
-                else:
-                    method_call['error'] = JCoreAPIErrorResponseException(
-                        _from_protocol_error(error), message)
-            elif six.u('result') in message:
-                method_call['result'] = message[six.u('result')]
-            method_call['done'] = True
-            method_call['cv'].notify()
-        finally:
-            self._lock.release()
+    The methods for adding calls take the same arguments as the corresponding
+    JCoreAPIConnection methods and return the batch, so they can be chained.
+    """
+    def __init__(self, connection):
+        self._connection = connection
+        self._requests = []
 
-    def _handle_unknown_message(self, message):
-        msg = message[six.u('msg')]
-        if six.u('id') not in message:
-            if msg != RESULT:
-                raise JCoreAPIInvalidMessageException(
-                    'invalid message type: ' + msg, message)
+    def __len__(self):
+        return len(self._requests)
+
+    def get_real_time_data(self, channelids=None):
+        self._requests.append(_get_real_time_data_request(channelids))
+        return self
+
+    def set_real_time_data(self, data):
+        self._requests.append(_set_real_time_data_request(data))
+        return self
+
+    def get_metadata(self, channelids=None):
+        self._requests.append(_get_metadata_request(channelids))
+        return self
+
+    def set_metadata(self, metadata):
+        self._requests.append(_set_metadata_request(metadata))
+        return self
+
+    def get_historical_data(self, channelids, begintime, endtime):
+        self._requests.append(_get_historical_data_request(channelids, begintime, endtime))
+        return self
+
+    def call(self, method, params):
+        assert isinstance(method, str) and len(
+            method) > 0, "method must be a non-empty str"
+        self._requests.append((method, params))
+        return self
+
+    def execute_async(self):
+        """
+        Sends the calls without waiting for the results.
+
+        returns: a list of Futures for the results, in the order the calls were added
+        """
+        if not self._requests:
+            return []
+        return [future for _id, future in self._connection._call_many_async(self._requests)]
+
+    def execute(self):
+        """
+        Sends the calls and waits for all of the results.
+
+        returns: a list of the results in the order the calls were added.
+            If a call failed, its item is the JCoreAPIException for the failure
+            instead of a result.  Results of set methods are None.
+
+        raises: JCoreAPITimeoutException if not all results are received in time
+        """
+        if not self._requests:
+            return []
+
+        connection = self._connection
+        timeout = connection._gettimeout()
+        calls = connection._call_many_async(self._requests)
+        try:
+            done, not_done = wait([future for _id, future in calls], timeout)
+            if not_done:
+                raise JCoreAPITimeoutException('operation timed out')
+        finally:
+            for _id, future in calls:
+                connection._method_calls.pop(_id, None)
+
+        results = []
+        for (method, params), (_id, future) in zip(self._requests, calls):
+            error = future.exception()
+            if error:
+                results.append(error)
+            elif method in (SET_REAL_TIME_DATA, SET_METADATA):
+                results.append(None)
             else:
-                raise JCoreAPIInvalidMessageException(
-                    "id field is missing", message)
+                results.append(future.result())
+        return results
 
-        if six.u('error') not in message:
-            message[six.u('error')] = JCoreAPIInvalidMessageException(
-                'invalid message type: ' + msg, message)
 
-        # handle it like a result message so that error gets raised on the
-        # caller for its id
-        return self._handle_result_message(message)
+class RealTimeDataSubscription:
+    """
+    A subscription to real-time data.  Create with JCoreAPIConnection.subscribe_real_time_data().
+
+    If it was created without a callback, iterating over it yields a JSON Real-Time Data object
+    for each update, with only the subscribed channels, until it is closed.  If the connection
+    closes, iteration raises the connection's error.
+
+    channelids: the subscribed channel ids, or None for all channels
+    """
+    def __init__(self, connection, channelids, callback=None):
+        self._connection = connection
+        self.channelids = channelids
+        self._channelid_set = frozenset(channelids) if channelids else None
+        self._callback = callback
+        self._updates = Queue() if callback is None else None
+        self._closed = False
+
+    def _deliver(self, data, timestamp):
+        if self._closed:
+            return
+        if self._channelid_set is not None:
+            data = dict((channelid, value) for channelid, value in six.iteritems(data)
+                        if channelid in self._channelid_set)
+            if not data:
+                return
+        update = {six.u('data'): data, six.u('timestamp'): timestamp}
+        if self._callback is not None:
+            self._callback(update)
+        else:
+            self._updates.put_nowait(update)
+
+    def _end(self, error=None):
+        if not self._closed:
+            self._closed = True
+            if self._updates is not None:
+                self._updates.put_nowait(error)
+
+    def get(self, timeout=None):
+        """
+        Gets the next update.
+
+        timeout: how many seconds to wait for an update, or None to wait forever
+
+        returns: a JSON Real-Time Data object, or None if the subscription is closed
+        raises: JCoreAPITimeoutException if there is no update in time, or the connection's
+            error if the connection closed
+        """
+        assert self._updates is not None, "subscriptions with a callback can't be read"
+        try:
+            update = self._updates.get(timeout=timeout)
+        except Empty:
+            raise JCoreAPITimeoutException('operation timed out')
+        if update is None or isinstance(update, Exception):
+            # leave the end marker for other readers
+            self._updates.put_nowait(update)
+            if update is not None:
+                raise update
+        return update
+
+    def __iter__(self):
+        while True:
+            update = self.get()
+            if update is None:
+                return
+            yield update
+
+    def close(self):
+        """
+        Ends the subscription, and unsubscribes from channels that no other subscription needs.
+        Doesn't wait for the server, so it can be called from the subscription's callback.
+        """
+        self._end()
+        self._connection._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
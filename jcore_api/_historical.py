@@ -0,0 +1,138 @@
+"""
+splitting of large historical data requests into smaller ones, and merging
+of their results
+"""
+
+import bisect
+
+import six
+
+from . import _arrays
+
+def _is_time(time):
+    return isinstance(time, six.integer_types) and not isinstance(time, bool)
+
+def split_request(channelids, begintime, endtime, chunk_duration=None, channels_per_request=None):
+    """
+    splits a historical data request into smaller requests.
+
+    chunk_duration: the maximum number of milliseconds in each request's time range,
+                    or None to not split the time range
+    channels_per_request: the maximum number of channels in each request, or None
+                          to not split the channels
+
+    returns: a list of (channelids, begintime, endtime) tuples, ordered by time
+    """
+    if chunk_duration:
+        assert _is_time(begintime) and _is_time(endtime), \
+            "begintime and endtime must be numbers to split the time range"
+        assert _is_time(chunk_duration) and chunk_duration > 0, \
+            "chunk_duration must be a positive number"
+        times = list(range(begintime, endtime, chunk_duration)) + [endtime]
+        ranges = list(zip(times[:-1], times[1:])) or [(begintime, endtime)]
+    else:
+        ranges = [(begintime, endtime)]
+
+    if channels_per_request:
+        assert _is_time(channels_per_request) and channels_per_request > 0, \
+            "channels_per_request must be a positive number"
+        groups = [channelids[i:i + channels_per_request]
+                  for i in range(0, len(channelids), channels_per_request)]
+    else:
+        groups = [channelids]
+
+    return [(group, begin, end) for begin, end in ranges for group in groups]
+
+def _covers(intervals, time):
+    index = bisect.bisect_right(intervals, [time, float('inf')]) - 1
+    return index >= 0 and intervals[index][1] >= time
+
+def find_gaps(intervals, begintime, endtime):
+    """
+    intervals: sorted, non-overlapping list of [begin, end] time ranges
+
+    returns: a list of (begin, end) time ranges within [begintime, endtime] that
+        aren't in intervals
+    """
+    gaps = []
+    time = begintime
+    for begin, end in intervals:
+        if end < time:
+            continue
+        if begin > endtime:
+            break
+        if begin > time:
+            gaps.append((time, begin))
+        time = max(time, end)
+    if time < endtime or (begintime == endtime and not _covers(intervals, begintime)):
+        gaps.append((time, endtime))
+    return gaps
+
+def add_interval(intervals, begintime, endtime):
+    """
+    intervals: sorted, non-overlapping list of [begin, end] time ranges
+
+    returns: a new list of intervals that also covers [begintime, endtime]
+    """
+    result = []
+    for interval in intervals:
+        if interval[1] < begintime or interval[0] > endtime:
+            result.append(interval)
+        else:
+            begintime = min(begintime, interval[0])
+            endtime = max(endtime, interval[1])
+    bisect.insort(result, [begintime, endtime])
+    return result
+
+class HistoricalDataMerger:
+    """
+    merges the results of requests for consecutive time ranges into one
+    JSON Historical Data object.  Points at the boundaries of the time ranges
+    that are in more than one result are only kept once.
+
+    as_arrays: whether to merge the t and v of each channel into NumPy arrays
+               instead of lists
+    """
+    def __init__(self, begintime, endtime, as_arrays=False):
+        self._begintime = begintime
+        self._endtime = endtime
+        self._as_arrays = as_arrays
+        # list of (t, v) pieces for each channel
+        self._pieces = {}
+
+    def add(self, result):
+        """
+        adds the result of the next request.  Results must be added in time order.
+        """
+        for channelid, data in six.iteritems((result or {}).get(six.u('data')) or {}):
+            t, v = data.get(six.u('t')) or [], data.get(six.u('v')) or []
+            if self._as_arrays:
+                t, v = _arrays.to_arrays(t, v)
+            pieces = self._pieces.setdefault(channelid, [])
+            if pieces:
+                last_t = pieces[-1][0][-1]
+                start = _arrays.numpy.searchsorted(t, last_t, side='right') if self._as_arrays \
+                    else bisect.bisect_right(t, last_t)
+                t, v = t[start:], v[start:]
+            if len(t):
+                pieces.append((t, v))
+
+    def result(self):
+        """
+        returns: the merged JSON Historical Data object
+        """
+        data = {}
+        for channelid, pieces in six.iteritems(self._pieces):
+            if self._as_arrays:
+                numpy = _arrays.numpy
+                t = numpy.concatenate([p[0] for p in pieces]) if pieces else numpy.empty(0, numpy.int64)
+                v = numpy.concatenate([p[1] for p in pieces]) if pieces else numpy.empty(0, numpy.float64)
+            else:
+                t = [time for p in pieces for time in p[0]]
+                v = [value for p in pieces for value in p[1]]
+            data[channelid] = {six.u('t'): t, six.u('v'): v}
+        return {
+            six.u('beginTime'): self._begintime,
+            six.u('endTime'): self._endtime,
+            six.u('data'): data,
+        }
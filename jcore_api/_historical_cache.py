@@ -0,0 +1,165 @@
+"""
+client-side cache of historical data, so that repeated requests for overlapping
+time ranges only fetch the parts that haven't been fetched before
+"""
+
+import bisect
+import collections
+import threading
+
+import six
+
+from . import _arrays
+from ._connection import _get_channelids
+from ._historical import _is_time, find_gaps, add_interval
+
+class _ChannelData:
+    """
+    the cached points of a channel, and the time ranges they cover.
+
+    intervals: sorted, non-overlapping list of [begin, end] time ranges that have been fetched
+    t, v: sorted times and corresponding values of the points in those time ranges
+    """
+    def __init__(self):
+        self.intervals = []
+        self.t = []
+        self.v = []
+
+    def insert(self, begintime, endtime, t, v):
+        """
+        stores the fetched points for [begintime, endtime], replacing any cached points
+        in that range
+        """
+        start = bisect.bisect_left(t, begintime)
+        stop = bisect.bisect_right(t, endtime)
+        left = bisect.bisect_left(self.t, begintime)
+        right = bisect.bisect_right(self.t, endtime)
+        self.t[left:right] = t[start:stop]
+        self.v[left:right] = v[start:stop]
+
+        self.intervals = add_interval(self.intervals, begintime, endtime)
+
+    def get(self, begintime, endtime):
+        left = bisect.bisect_left(self.t, begintime)
+        right = bisect.bisect_right(self.t, endtime)
+        return self.t[left:right], self.v[left:right]
+
+class HistoricalDataCache:
+    """
+    Caches historical data from a connection by channel, and keeps track of the time
+    ranges that have been fetched for each channel, so that requests for overlapping
+    time ranges only fetch the missing parts from the server.
+
+    source: the connection to fetch data from (anything with a get_historical_data
+            method like JCoreAPIConnection's)
+    max_points: the maximum number of points to keep in the cache.  When there are more,
+                the least recently used channels are evicted.  default is 1000000
+    """
+    def __init__(self, source, max_points=1000000):
+        assert max_points > 0, "max_points must be positive"
+        self._source = source
+        self._max_points = max_points
+        self._lock = threading.Lock()
+        # _ChannelData by channel id, in order from least to most recently used
+        self._channels = collections.OrderedDict()
+        self._num_points = 0
+
+    def get_historical_data(self, channelids, begintime, endtime, as_arrays=False, **kwargs):
+        """
+        Gets historical data, fetching the parts that aren't cached from the source.
+        Requests with ISO date strings instead of numeric times aren't cached.
+
+        Takes the same arguments as JCoreAPIConnection.get_historical_data; any additional
+        keyword arguments (like chunk_duration) are passed to the source when fetching.
+
+        returns: a JSON Historical Data object
+            (https://jcoreio.gitbooks.io/jcore-api-py/content/docs/api/schema/historicalData.md)
+        """
+        if not (_is_time(begintime) and _is_time(endtime)):
+            return self._source.get_historical_data(
+                channelids, begintime, endtime, as_arrays=as_arrays, **kwargs)
+        if as_arrays:
+            _arrays.require_numpy()
+        channelids = _get_channelids(channelids)
+
+        # group the channels by their missing time ranges, so that channels that are
+        # missing the same ranges are fetched together
+        fetches = collections.OrderedDict()
+        self._lock.acquire()
+        try:
+            for channelid in channelids:
+                channel = self._channels.get(channelid)
+                gaps = find_gaps(channel.intervals, begintime, endtime) if channel else [(begintime, endtime)]
+                for gap in gaps:
+                    fetches.setdefault(gap, []).append(channelid)
+        finally:
+            self._lock.release()
+
+        results = [(gap, self._source.get_historical_data(group, gap[0], gap[1], **kwargs))
+                   for gap, group in six.iteritems(fetches)]
+
+        self._lock.acquire()
+        try:
+            for (gap_begin, gap_end), result in results:
+                data = (result or {}).get(six.u('data')) or {}
+                for channelid in fetches[(gap_begin, gap_end)]:
+                    channel_data = data.get(channelid) or {}
+                    self._insert(channelid, gap_begin, gap_end,
+                                 channel_data.get(six.u('t')) or [], channel_data.get(six.u('v')) or [])
+
+            data = {}
+            for channelid in channelids:
+                channel = self._use(channelid)
+                t, v = channel.get(begintime, endtime) if channel else ([], [])
+                if as_arrays:
+                    t, v = _arrays.to_arrays(t, v)
+                data[channelid] = {six.u('t'): t, six.u('v'): v}
+            self._evict()
+        finally:
+            self._lock.release()
+
+        return {
+            six.u('beginTime'): begintime,
+            six.u('endTime'): endtime,
+            six.u('data'): data,
+        }
+
+    def invalidate(self, channelids=None):
+        """
+        Removes channels from the cache, for instance if their historical data has changed.
+
+        channelids: a string or list of strings specifying the channel id(s) to remove,
+                    or None to remove all channels
+        """
+        self._lock.acquire()
+        try:
+            if channelids is None:
+                self._channels.clear()
+                self._num_points = 0
+                return
+            for channelid in _get_channelids(channelids):
+                channel = self._channels.pop(channelid, None)
+                if channel:
+                    self._num_points -= len(channel.t)
+        finally:
+            self._lock.release()
+
+    def _insert(self, channelid, begintime, endtime, t, v):
+        channel = self._channels.get(channelid)
+        if channel is None:
+            channel = self._channels[channelid] = _ChannelData()
+        num_points = len(channel.t)
+        channel.insert(begintime, endtime, t, v)
+        self._num_points += len(channel.t) - num_points
+
+    def _use(self, channelid):
+        # move the channel to the end of the LRU order
+        channel = self._channels.pop(channelid, None)
+        if channel is not None:
+            self._channels[channelid] = channel
+        return channel
+
+    def _evict(self):
+        while self._num_points > self._max_points and self._channels:
+            channelid, channel = self._channels.popitem(last=False)
+            self._num_points -= len(channel.t)
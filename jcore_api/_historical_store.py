@@ -0,0 +1,264 @@
+"""
+persistent on-disk store of historical data (requires numpy)
+
+Each channel's points are kept in two files: <name>.t with the times as
+little-endian int64s, and <name>.v with the values as little-endian float64s
+(NaN for null values), where <name> is the hex-encoded UTF-8 channel id.
+Fetched data is appended to the files as a new segment, and compaction
+rewrites them as a single sorted segment.  index.json records the segments
+and the time ranges that have been fetched for each channel.
+"""
+
+import binascii
+import collections
+import json
+import os
+import threading
+
+import six
+
+from . import _arrays
+from ._connection import _get_channelids
+from ._historical import _is_time, find_gaps, add_interval
+
+INDEX_FILE = 'index.json'
+
+_T_DTYPE = '<i8'
+_V_DTYPE = '<f8'
+
+def _channel_file_name(channelid):
+    return binascii.hexlify(channelid.encode('utf-8')).decode('ascii')
+
+def _rename(src, dst):
+    if os.name == 'nt' and os.path.exists(dst):
+        os.remove(dst)
+    os.rename(src, dst)
+
+def _concat(pieces):
+    """
+    concatenates (t, v) pieces into sorted arrays, keeping only one point for each time
+    """
+    numpy = _arrays.numpy
+    pieces = [piece for piece in pieces if len(piece[0])]
+    if len(pieces) == 1:
+        return pieces[0]
+    if not pieces:
+        return numpy.empty(0, numpy.int64), numpy.empty(0, numpy.float64)
+    t = numpy.concatenate([piece[0] for piece in pieces])
+    v = numpy.concatenate([piece[1] for piece in pieces])
+    # segments overlap at their boundaries, and a compacted segment can span
+    # segments that were added after it
+    order = numpy.argsort(t, kind='mergesort')
+    t, v = t[order], v[order]
+    keep = numpy.empty(len(t), dtype=bool)
+    keep[0] = True
+    numpy.not_equal(t[1:], t[:-1], out=keep[1:])
+    return t[keep], v[keep]
+
+def _to_lists(t, v):
+    return t.tolist(), [None if value != value else value for value in v.tolist()]
+
+class HistoricalDataStore:
+    """
+    Stores historical data from a connection on disk, and keeps track of the time
+    ranges that have been fetched for each channel, so that requests only fetch the
+    missing parts from the server, even after the process restarts.  The stored data
+    is memory-mapped when it is read.  Requires numpy.
+
+    Only one HistoricalDataStore at a time may use a directory.
+
+    directory: the directory to store data in.  It is created if it doesn't exist.
+    source: the connection to fetch data from (anything with a get_historical_data
+            method like JCoreAPIConnection's)
+    max_segments: when a channel has more than this many segments of fetched data,
+                  it is compacted automatically.  default is 64
+    """
+    def __init__(self, directory, source, max_segments=64):
+        _arrays.require_numpy()
+        assert max_segments > 0, "max_segments must be positive"
+        self._directory = directory
+        self._source = source
+        self._max_segments = max_segments
+        self._lock = threading.Lock()
+        # memory maps of the (t, v) files by channel id
+        self._maps = {}
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self._index = json.load(f)
+        else:
+            self._index = {}
+
+    def get_historical_data(self, channelids, begintime, endtime, as_arrays=False, **kwargs):
+        """
+        Gets historical data, fetching the parts that aren't stored from the source.
+        Requests with ISO date strings instead of numeric times aren't stored.
+
+        Takes the same arguments as JCoreAPIConnection.get_historical_data; any additional
+        keyword arguments (like chunk_duration) are passed to the source when fetching.
+        Arrays returned with as_arrays may be read-only views of the stored data.
+
+        returns: a JSON Historical Data object
+            (https://jcoreio.gitbooks.io/jcore-api-py/content/docs/api/schema/historicalData.md)
+        """
+        if not (_is_time(begintime) and _is_time(endtime)):
+            return self._source.get_historical_data(
+                channelids, begintime, endtime, as_arrays=as_arrays, **kwargs)
+        channelids = _get_channelids(channelids)
+
+        fetches = collections.OrderedDict()
+        self._lock.acquire()
+        try:
+            for channelid in channelids:
+                entry = self._index.get(channelid)
+                gaps = find_gaps(entry['intervals'], begintime, endtime) if entry else [(begintime, endtime)]
+                for gap in gaps:
+                    fetches.setdefault(gap, []).append(channelid)
+        finally:
+            self._lock.release()
+
+        results = [(gap, self._source.get_historical_data(group, gap[0], gap[1], as_arrays=True, **kwargs))
+                   for gap, group in six.iteritems(fetches)]
+
+        self._lock.acquire()
+        try:
+            if results:
+                for (gap_begin, gap_end), result in results:
+                    data = (result or {}).get(six.u('data')) or {}
+                    for channelid in fetches[(gap_begin, gap_end)]:
+                        channel_data = data.get(channelid) or {}
+                        t, v = _arrays.to_arrays(channel_data.get(six.u('t')), channel_data.get(six.u('v')))
+                        self._append(channelid, gap_begin, gap_end, t, v)
+                for channelid in channelids:
+                    if len(self._index[channelid]['segments']) > self._max_segments:
+                        self._compact(channelid)
+                self._write_index()
+
+            data = {}
+            for channelid in channelids:
+                t, v = self._read(channelid, begintime, endtime)
+                data[channelid] = {six.u('t'): t, six.u('v'): v} if as_arrays else \
+                    dict(zip((six.u('t'), six.u('v')), _to_lists(t, v)))
+        finally:
+            self._lock.release()
+
+        return {
+            six.u('beginTime'): begintime,
+            six.u('endTime'): endtime,
+            six.u('data'): data,
+        }
+
+    def compact(self, channelids=None):
+        """
+        Rewrites the files of channels as a single sorted segment each, which makes
+        reads faster and removes points that were stored more than once.
+
+        channelids: a string or list of strings specifying the channel id(s) to compact,
+                    or None to compact all channels
+        """
+        self._lock.acquire()
+        try:
+            for channelid in (_get_channelids(channelids) if channelids is not None else list(self._index)):
+                if channelid in self._index:
+                    self._compact(channelid)
+            self._write_index()
+        finally:
+            self._lock.release()
+
+    def invalidate(self, channelids=None):
+        """
+        Removes channels from the store, for instance if their historical data has changed.
+
+        channelids: a string or list of strings specifying the channel id(s) to remove,
+                    or None to remove all channels
+        """
+        self._lock.acquire()
+        try:
+            for channelid in (_get_channelids(channelids) if channelids is not None else list(self._index)):
+                if self._index.pop(channelid, None) is not None:
+                    self._maps.pop(channelid, None)
+                    for path in self._paths(channelid):
+                        if os.path.exists(path):
+                            os.remove(path)
+            self._write_index()
+        finally:
+            self._lock.release()
+
+    def _paths(self, channelid):
+        name = os.path.join(self._directory, _channel_file_name(channelid))
+        return name + '.t', name + '.v'
+
+    def _append(self, channelid, begintime, endtime, t, v):
+        numpy = _arrays.numpy
+        entry = self._index.setdefault(channelid, {'intervals': [], 'segments': []})
+        start = numpy.searchsorted(t, begintime, side='left')
+        stop = numpy.searchsorted(t, endtime, side='right')
+        t, v = t[start:stop], v[start:stop]
+        if len(t):
+            t_path, v_path = self._paths(channelid)
+            # use the file size rather than the index for the offset, in case data was
+            # appended before without the index being written
+            offset = os.path.getsize(t_path) // 8 if os.path.exists(t_path) else 0
+            with open(t_path, 'ab') as f:
+                f.write(t.astype(_T_DTYPE).tobytes())
+            with open(v_path, 'r+b' if os.path.exists(v_path) else 'wb') as f:
+                f.seek(offset * 8)
+                f.write(v.astype(_V_DTYPE).tobytes())
+            entry['segments'].append([begintime, endtime, offset, len(t)])
+            entry['segments'].sort()
+            self._maps.pop(channelid, None)
+        entry['intervals'] = add_interval(entry['intervals'], begintime, endtime)
+
+    def _map(self, channelid):
+        maps = self._maps.get(channelid)
+        if maps is None:
+            numpy = _arrays.numpy
+            t_path, v_path = self._paths(channelid)
+            maps = self._maps[channelid] = (
+                numpy.memmap(t_path, dtype=_T_DTYPE, mode='r'),
+                numpy.memmap(v_path, dtype=_V_DTYPE, mode='r'))
+        return maps
+
+    def _read(self, channelid, begintime, endtime):
+        numpy = _arrays.numpy
+        entry = self._index.get(channelid)
+        pieces = []
+        if entry and entry['segments']:
+            t_map, v_map = self._map(channelid)
+            for begin, end, offset, count in entry['segments']:
+                if end < begintime or begin > endtime:
+                    continue
+                t = t_map[offset:offset + count]
+                start = numpy.searchsorted(t, begintime, side='left')
+                stop = numpy.searchsorted(t, endtime, side='right')
+                pieces.append((t[start:stop], v_map[offset + start:offset + stop]))
+        return _concat(pieces)
+
+    def _compact(self, channelid):
+        entry = self._index[channelid]
+        segments = entry['segments']
+        if len(segments) <= 1:
+            return
+        t_map, v_map = self._map(channelid)
+        t, v = _concat([(t_map[offset:offset + count], v_map[offset:offset + count])
+                        for begin, end, offset, count in segments])
+        t_path, v_path = self._paths(channelid)
+        with open(t_path + '.tmp', 'wb') as f:
+            f.write(t.astype(_T_DTYPE).tobytes())
+        with open(v_path + '.tmp', 'wb') as f:
+            f.write(v.astype(_V_DTYPE).tobytes())
+        del t_map, v_map, t, v
+        self._maps.pop(channelid, None)
+        _rename(t_path + '.tmp', t_path)
+        _rename(v_path + '.tmp', v_path)
+        count = os.path.getsize(t_path) // 8
+        entry['segments'] = [[segments[0][0], max(segment[1] for segment in segments), 0, count]]
+
+    def _write_index(self):
+        index_path = os.path.join(self._directory, INDEX_FILE)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(self._index, f)
+        _rename(index_path + '.tmp', index_path)
@@ -1,5 +1,6 @@
-from websocket import WebSocket
-from websocket._exceptions import WebSocketConnectionClosedException, WebSocketTimeoutException
+from ._websocket_client.websocket._abnf import ABNF
+from ._websocket_client.websocket._exceptions import WebSocketConnectionClosedException, \
+    WebSocketTimeoutException
 
 from .exceptions import JCoreAPIConnectionClosedException, JCoreAPITimeoutException
 
@@ -28,3 +29,16 @@ class JCoreWebSocket:
             raise JCoreAPIConnectionClosedException("connection closed", e)
         except WebSocketTimeoutException as e:
             raise JCoreAPITimeoutException("send timed out", e)
+
+    def send_many(self, messages):
+        if not hasattr(self._sock, 'send_frames'):
+            for message in messages:
+                self.send(message)
+            return
+        try:
+            return self._sock.send_frames(
+                [ABNF.create_frame(message, ABNF.OPCODE_TEXT) for message in messages])
+        except WebSocketConnectionClosedException as e:
+            raise JCoreAPIConnectionClosedException("connection closed", e)
+        except WebSocketTimeoutException as e:
+            raise JCoreAPITimeoutException("send timed out", e)
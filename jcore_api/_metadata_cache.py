@@ -0,0 +1,107 @@
+"""
+cache of channel metadata for JCoreAPIConnection
+"""
+
+import threading
+import time
+
+import six
+
+class MetadataCache:
+    """
+    Holds the metadata of channels that have been fetched, so that get_metadata only
+    has to fetch channels that aren't cached.
+
+    ttl: how many seconds cached metadata stays valid, or None to keep it until it
+         is invalidated
+    """
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        # (metadata, time fetched) by channel id
+        self._entries = {}
+        # when the metadata of all channels was fetched, if the cache has all of them
+        self._complete_time = None
+
+    def _fresh(self, fetched_time, now):
+        return self._ttl is None or now - fetched_time < self._ttl
+
+    def get(self, channelids):
+        """
+        channelids: the channel ids to get metadata for, or None for all channels
+
+        returns: a tuple of a dict of the cached metadata, and the list of channel ids
+            to fetch (None to fetch all channels)
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            complete = self._complete_time is not None and self._fresh(self._complete_time, now)
+            if channelids is None:
+                if not complete:
+                    return {}, None
+                channelids = list(self._entries)
+
+            cached = {}
+            missing = []
+            for channelid in channelids:
+                entry = self._entries.get(channelid)
+                if entry is not None and self._fresh(entry[1], now):
+                    cached[channelid] = entry[0]
+                elif entry is not None or not complete:
+                    # if the cache has all channels, a channel that isn't in it doesn't exist
+                    missing.append(channelid)
+            return cached, missing
+        finally:
+            self._lock.release()
+
+    def put(self, metadata, complete=False):
+        """
+        stores fetched metadata.
+
+        complete: whether metadata contains all channels
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            if complete:
+                self._entries.clear()
+                self._complete_time = now
+            for channelid, channel_metadata in six.iteritems(metadata or {}):
+                self._entries[channelid] = (channel_metadata, now)
+        finally:
+            self._lock.release()
+
+    def update(self, metadata):
+        """
+        applies metadata that was set on the server
+        """
+        self._lock.acquire()
+        try:
+            for channelid, channel_metadata in six.iteritems(metadata):
+                entry = self._entries.get(channelid)
+                if entry is None:
+                    # the server fills in defaults for the rest of a new channel's metadata,
+                    # so it has to be fetched
+                    self._complete_time = None
+                    continue
+                merged = dict(entry[0])
+                merged.update(channel_metadata)
+                self._entries[channelid] = (merged, entry[1])
+        finally:
+            self._lock.release()
+
+    def invalidate(self, channelids=None):
+        """
+        removes channels from the cache, or all channels if channelids is None
+        """
+        self._lock.acquire()
+        try:
+            if channelids is None:
+                self._entries.clear()
+            else:
+                for channelid in channelids:
+                    self._entries.pop(channelid, None)
+            self._complete_time = None
+        finally:
+            self._lock.release()
@@ -0,0 +1,186 @@
+"""
+pool of connections to a jcore.io server
+"""
+
+import random
+import threading
+import time
+
+from concurrent.futures import Future
+
+from ._reconnecting import _delegate
+from .exceptions import JCoreAPIConnectionClosedException
+
+def _least_busy(name):
+    return _delegate(name, "the least busy connection")
+
+class JCoreAPIConnectionPool:
+    """
+    A pool of connections to a jcore.io server.  Each method call goes to the connection
+    with the fewest calls in flight, so that a multi-threaded program isn't limited by
+    one socket and receive thread.  Connections that have closed are replaced by
+    the next call; if that fails, the calls go to the other connections, and the
+    replacement is tried again after a delay.
+
+    Has the same methods as JCoreAPIConnection.  Create with connect_pool() or
+    connect_local_pool().
+
+    create_connection: a function that returns a new (authenticated, if necessary)
+                       JCoreAPIConnection
+    size: the number of connections.  default is 4
+    initial_delay: how many seconds to wait before trying to replace a connection again,
+                   after the first attempt fails.  The delay doubles (with some
+                   randomness) for each failed attempt after that.  default is 0.1
+    max_delay: the maximum number of seconds to wait between attempts.  default is 30
+    """
+    def __init__(self, create_connection, size=4, initial_delay=0.1, max_delay=30):
+        assert size > 0, "size must be positive"
+        self._create_connection = create_connection
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        self._lock = threading.Lock()
+        self._closed = False
+        self._connections = []
+        # per slot: whether a thread is replacing its connection, how many attempts
+        # to replace it have failed in a row, and when to try again
+        self._replacing = [False] * size
+        self._failures = [0] * size
+        self._retry_times = [0] * size
+        try:
+            for _ in range(size):
+                self._connections.append(create_connection())
+        except:
+            self.close()
+            raise
+
+    def __len__(self):
+        return len(self._connections)
+
+    def _get_connection(self):
+        if self._closed:
+            raise JCoreAPIConnectionClosedException("connection pool is already closed")
+
+        connections = list(self._connections)
+        for index, connection in enumerate(connections):
+            if connection._closed:
+                connections[index] = self._replace(index, connection)
+
+        best = None
+        for connection in connections:
+            if connection is not None and not connection._closed and \
+                    (best is None or len(connection._method_calls) < len(best._method_calls)):
+                best = connection
+        if best is None:
+            raise JCoreAPIConnectionClosedException("all connections in the pool are closed")
+        return best
+
+    def _replace(self, index, dead):
+        """
+        replaces a closed connection, unless another thread is already replacing it
+        or the last attempt failed too recently.
+
+        returns: the new connection, or None if there isn't one yet
+        """
+        self._lock.acquire()
+        try:
+            if self._closed or self._connections[index] is not dead:
+                # the pool was closed, or another thread already replaced it
+                return self._connections[index] if not self._closed else None
+            if self._replacing[index] or time.time() < self._retry_times[index]:
+                return None
+            self._replacing[index] = True
+        finally:
+            self._lock.release()
+
+        try:
+            connection = self._create_connection()
+        except Exception:
+            connection = None
+
+        self._lock.acquire()
+        try:
+            self._replacing[index] = False
+            if connection is None:
+                self._failures[index] += 1
+                delay = min(self._max_delay, self._initial_delay * 2 ** (self._failures[index] - 1))
+                self._retry_times[index] = time.time() + delay * random.uniform(0.5, 1)
+                return None
+            self._failures[index] = 0
+            if not self._closed:
+                self._connections[index] = connection
+                return connection
+        finally:
+            self._lock.release()
+        connection.close()
+        return None
+
+    def close(self):
+        """
+        Closes all connections in the pool.
+        """
+        self._lock.acquire()
+        try:
+            self._closed = True
+            connections = self._connections
+        finally:
+            self._lock.release()
+        for connection in connections:
+            connection.close()
+
+    def invalidate_metadata(self, channelids=None):
+        """
+        Calls JCoreAPIConnection.invalidate_metadata on all connections.
+        """
+        for connection in list(self._connections):
+            connection.invalidate_metadata(channelids)
+
+    def set_metadata(self, metadata, wait=True):
+        """
+        Calls JCoreAPIConnection.set_metadata on the least busy connection.  Once the
+        metadata has been set, the other connections' metadata caches drop the channels,
+        so that they don't keep returning the old metadata.
+        """
+        connection = self._get_connection()
+        if wait:
+            connection.set_metadata(metadata)
+            for other in list(self._connections):
+                if other is not connection:
+                    other.invalidate_metadata(list(metadata))
+            return
+
+        def on_done(future):
+            if future.exception() is None:
+                self.invalidate_metadata(list(metadata))
+            else:
+                connection._report_async_error(future.exception())
+        connection.set_metadata_async(metadata).add_done_callback(on_done)
+
+    def set_metadata_async(self, metadata):
+        """
+        Calls JCoreAPIConnection.set_metadata_async on the least busy connection.  The
+        Future is done once the channels have been dropped from the metadata caches.
+        """
+        result = Future()
+        result.set_running_or_notify_cancel()
+
+        def on_done(future):
+            error = future.exception()
+            if error is not None:
+                return result.set_exception(error)
+            self.invalidate_metadata(list(metadata))
+            result.set_result(future.result())
+        self._get_connection().set_metadata_async(metadata).add_done_callback(on_done)
+        return result
+
+    get_real_time_data = _least_busy('get_real_time_data')
+    get_real_time_data_async = _least_busy('get_real_time_data_async')
+    set_real_time_data = _least_busy('set_real_time_data')
+    set_real_time_data_async = _least_busy('set_real_time_data_async')
+    subscribe_real_time_data = _least_busy('subscribe_real_time_data')
+    get_metadata = _least_busy('get_metadata')
+    get_metadata_async = _least_busy('get_metadata_async')
+    get_historical_data = _least_busy('get_historical_data')
+    get_historical_data_async = _least_busy('get_historical_data_async')
+    get_historical_data_stream = _least_busy('get_historical_data_stream')
+    call_async = _least_busy('call_async')
+    batch = _least_busy('batch')
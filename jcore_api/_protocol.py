@@ -5,9 +5,12 @@ CONNECTED = six.u('connected')
 FAILED = six.u('failed')
 METHOD = six.u('method')
 RESULT = six.u('result')
+REAL_TIME_DATA = six.u('realTimeData')
 
 GET_METADATA = 'getMetadata'
 SET_METADATA = 'setMetadata'
 GET_REAL_TIME_DATA = 'getRealTimeData'
 SET_REAL_TIME_DATA = 'setRealTimeData'
 GET_HISTORICAL_DATA = 'getHistoricalData'
+SUBSCRIBE_REAL_TIME_DATA = 'subscribeRealTimeData'
+UNSUBSCRIBE_REAL_TIME_DATA = 'unsubscribeRealTimeData'
@@ -0,0 +1,128 @@
+"""
+client-side mirror of real-time data, which keeps track of which values changed
+"""
+
+import collections
+import threading
+
+import six
+
+class RealTimeDataMirror:
+    """
+    Holds the latest value of each channel, and a version number that increases
+    whenever a value changes, so that consumers can get only the values that changed
+    since they last looked.
+
+    Feed it with subscribe() (updates pushed by the server), refresh() (polling), or
+    apply() (any JSON Real-Time Data objects).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._timestamp = None
+        # (value, version) by channel id, in the order they last changed
+        self._values = collections.OrderedDict()
+
+    @property
+    def version(self):
+        """
+        the version of the latest change, or 0 if there hasn't been any
+        """
+        return self._version
+
+    @property
+    def timestamp(self):
+        """
+        the timestamp of the latest applied update
+        """
+        return self._timestamp
+
+    def apply(self, update):
+        """
+        Applies the values in a JSON Real-Time Data object.  Values that are the same as
+        the mirrored ones don't count as changes.
+
+        update: a dict with a data field mapping from channel id to value, and
+                optionally a timestamp field
+
+        returns: the version after applying the update
+        """
+        data = update.get(six.u('data')) or {}
+        self._lock.acquire()
+        try:
+            version = self._version + 1
+            changed = False
+            for channelid, value in six.iteritems(data):
+                current = self._values.get(channelid)
+                if current is not None and _same(current[0], value):
+                    continue
+                if current is not None:
+                    del self._values[channelid]
+                self._values[channelid] = (value, version)
+                changed = True
+            if changed:
+                self._version = version
+            if six.u('timestamp') in update:
+                self._timestamp = update[six.u('timestamp')]
+            return self._version
+        finally:
+            self._lock.release()
+
+    def refresh(self, connection, channelids=None):
+        """
+        Gets real-time data from a connection and applies it.
+
+        returns: the version after applying it
+        """
+        return self.apply(connection.get_real_time_data(channelids))
+
+    def subscribe(self, connection, channelids=None):
+        """
+        Subscribes to real-time data on a connection and applies each update.
+
+        returns: the RealTimeDataSubscription; close it to stop updating the mirror
+        """
+        return connection.subscribe_real_time_data(channelids, callback=self.apply)
+
+    def get(self, channelid, default=None):
+        """
+        returns: the latest value of a channel
+        """
+        current = self._values.get(channelid)
+        return current[0] if current is not None else default
+
+    def values(self):
+        """
+        returns: a dict of the latest value of each channel
+        """
+        self._lock.acquire()
+        try:
+            return dict((channelid, current[0]) for channelid, current in six.iteritems(self._values))
+        finally:
+            self._lock.release()
+
+    def changed_since(self, version):
+        """
+        Gets the values that changed after a version.  The cost is proportional to the
+        number of changed channels, not the total number of channels.
+
+        version: a version previously returned by this mirror, or 0 for all values
+
+        returns: a tuple of the current version and a dict of the channels that
+            changed after version and their latest values
+        """
+        self._lock.acquire()
+        try:
+            changed = {}
+            for channelid in reversed(self._values):
+                value, changed_version = self._values[channelid]
+                if changed_version <= version:
+                    break
+                changed[channelid] = value
+            return self._version, changed
+        finally:
+            self._lock.release()
+
+def _same(a, b):
+    # NaN never equals itself, but shouldn't count as a change
+    return a == b or (a != a and b != b)
@@ -0,0 +1,190 @@
+"""
+write-behind buffer for setting real-time data
+"""
+
+import threading
+import time
+
+from ._connection import _wait, _set_real_time_data_request
+from .exceptions import JCoreAPIConnectionClosedException
+
+class RealTimeDataWriter:
+    """
+    Buffers real-time data to set on the server, and sends it in batches instead of
+    making a round trip for each set.  If a channel is set more than once before the
+    buffer is flushed, only its last value is sent.
+
+    An error from sending a batch is raised from the next call to set() or flush().
+
+    connection: the JCoreAPIConnection to set data on, or a JCoreAPIConnectionPool or
+                ReconnectingJCoreAPIConnection
+    flush_interval: how many seconds to wait after the first buffered value before
+                    flushing the buffer.  default is 0.05
+    max_pending: flush as soon as this many channels are buffered.  default is 1000
+    max_in_flight: the maximum number of batches to wait for the server to acknowledge.
+                   When there are this many, flushing blocks until one is acknowledged,
+                   so that writers can't get ahead of the server.  default is 4
+    timeout: how many seconds to wait for the server to acknowledge batches before
+             raising JCoreAPITimeoutException.  default is the connection's timeout,
+             or no timeout if connection isn't a JCoreAPIConnection
+    """
+    def __init__(self, connection, flush_interval=0.05, max_pending=1000, max_in_flight=4,
+                 timeout=None):
+        assert flush_interval > 0, "flush_interval must be positive"
+        assert max_pending > 0, "max_pending must be positive"
+        assert max_in_flight > 0, "max_in_flight must be positive"
+        self._connection = connection
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._max_in_flight = max_in_flight
+        self._timeout = timeout
+
+        # guards the fields below.  _flush_lock is held while sending a batch, so that
+        # batches are sent in the order they were taken from the buffer
+        self._lock = threading.Lock()
+        self._cv = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._pending_since = None
+        self._in_flight = 0
+        self._error = None
+        self._closed = False
+
+        self._thread = None
+
+    def set(self, data):
+        """
+        Buffers real-time data to set on the server.
+
+        data: a dict mapping from channel id to value
+        """
+        _set_real_time_data_request(data)
+        self._lock.acquire()
+        try:
+            self._raise_error()
+            if self._closed:
+                raise JCoreAPIConnectionClosedException("writer is already closed")
+            if not self._pending:
+                self._pending_since = time.time()
+                self._cv.notify_all()
+            self._pending.update(data)
+            full = len(self._pending) >= self._max_pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_flush_thread, name="jcore.io writer")
+                self._thread.daemon = True
+                self._thread.start()
+        finally:
+            self._lock.release()
+
+        if full:
+            self._flush()
+
+    def flush(self):
+        """
+        Sends the buffered data and waits for the server to acknowledge all of it.
+
+        raises: the error from sending any batch that failed since the last call to set() or flush()
+        """
+        self._flush()
+        timeout = self._gettimeout()
+        self._lock.acquire()
+        try:
+            while self._in_flight:
+                _wait(self._cv, timeout)
+            self._raise_error()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """
+        Flushes the buffered data and stops the writer.
+        """
+        try:
+            self.flush()
+        finally:
+            self._lock.acquire()
+            try:
+                self._closed = True
+                self._cv.notify_all()
+            finally:
+                self._lock.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _gettimeout(self):
+        if self._timeout is not None:
+            return self._timeout
+        # pools and reconnecting connections don't have a socket of their own
+        gettimeout = getattr(self._connection, '_gettimeout', None)
+        return gettimeout() if gettimeout is not None else None
+
+    def _raise_error(self):
+        error = self._error
+        if error is not None:
+            self._error = None
+            raise error
+
+    def _flush(self):
+        timeout = self._gettimeout()
+        self._flush_lock.acquire()
+        try:
+            self._lock.acquire()
+            try:
+                if not self._pending:
+                    return
+                while self._in_flight >= self._max_in_flight:
+                    _wait(self._cv, timeout)
+                data = self._pending
+                self._pending = {}
+                self._pending_since = None
+                self._in_flight += 1
+            finally:
+                self._lock.release()
+
+            try:
+                future = self._connection.call_async(*_set_real_time_data_request(data))
+            except:
+                self._on_done(None)
+                raise
+            future.add_done_callback(self._on_done)
+        finally:
+            self._flush_lock.release()
+
+    def _on_done(self, future):
+        self._lock.acquire()
+        try:
+            self._in_flight -= 1
+            error = future.exception() if future is not None else None
+            if error is not None and self._error is None:
+                self._error = error
+            self._cv.notify_all()
+        finally:
+            self._lock.release()
+
+    def _run_flush_thread(self):
+        self._lock.acquire()
+        try:
+            while not self._closed:
+                if self._pending_since is None:
+                    self._cv.wait()
+                    continue
+                remaining = self._pending_since + self._flush_interval - time.time()
+                if remaining > 0:
+                    self._cv.wait(remaining)
+                    continue
+
+                self._lock.release()
+                error = None
+                try:
+                    self._flush()
+                except Exception as e:
+                    error = e
+                self._lock.acquire()
+                if error is not None and self._error is None:
+                    self._error = error
+        finally:
+            self._lock.release()
@@ -0,0 +1,221 @@
+"""
+connection wrapper that reconnects when the connection drops
+"""
+
+import random
+import threading
+import time
+
+from concurrent.futures import Future
+
+from .exceptions import JCoreAPIConnectionClosedException
+
+def _retrying(name, idempotent):
+    def method(self, *args, **kwargs):
+        return self._call(name, idempotent, args, kwargs)
+    method.__name__ = name
+    method.__doc__ = "Calls JCoreAPIConnection.%s, reconnecting if the connection drops." % name
+    return method
+
+def _retrying_async(name, idempotent):
+    def method(self, *args, **kwargs):
+        return self._call_async(name, idempotent, args, kwargs)
+    method.__name__ = name
+    method.__doc__ = "Calls JCoreAPIConnection.%s, reconnecting if the connection drops." % name
+    return method
+
+def _delegate(name, which="the current connection, without retrying"):
+    def method(self, *args, **kwargs):
+        return getattr(self._get_connection(), name)(*args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = "Calls JCoreAPIConnection.%s on %s." % (name, which)
+    return method
+
+class ReconnectingJCoreAPIConnection:
+    """
+    Wraps a connection to a jcore.io server, and opens a new connection when it closes.
+    Calls that fail because the connection closed are sent again on the new connection
+    if they are gets, which are safe to repeat.  Whether sets are repeated depends on
+    retry_sets.
+
+    Has the same methods as JCoreAPIConnection.  get_historical_data_stream, call_async,
+    batch and subscribe_real_time_data use the current connection without retrying.
+
+    create_connection: a function that returns a new (authenticated, if necessary)
+                       JCoreAPIConnection, for instance lambda: connect(api_token)
+    retry_sets: if True, set calls that fail because the connection closed are sent
+                again too.  This may apply them twice, if the server received them
+                before the connection closed.  default is False
+    max_attempts: how many times to try to connect in a row before giving up and
+                  raising the error, and how many times to send a call before raising
+                  the error if its connection keeps closing.  None to keep trying
+                  forever.  default is 10
+    initial_delay: how many seconds to wait before the second attempt to connect.
+                   The delay doubles (with some randomness, so that many clients don't
+                   reconnect at the same time) for each attempt after that.  default is 0.1
+    max_delay: the maximum number of seconds to wait between attempts.  default is 30
+    """
+    def __init__(self, create_connection, retry_sets=False, max_attempts=10,
+                 initial_delay=0.1, max_delay=30):
+        assert max_attempts is None or max_attempts > 0, "max_attempts must be positive"
+        self._create_connection = create_connection
+        self._retry_sets = retry_sets
+        self._max_attempts = max_attempts
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        # held while connecting, so that only one thread connects at a time
+        self._lock = threading.Lock()
+        self._closed = False
+        # async calls waiting to be sent again, and whether a thread is sending them
+        self._pending_lock = threading.Lock()
+        self._pending = []
+        self._resubmitting = False
+        self._connection = create_connection()
+
+    def _get_connection(self):
+        connection = self._connection
+        if connection is not None and not connection._closed:
+            return connection
+
+        self._lock.acquire()
+        try:
+            attempt = 0
+            while True:
+                if self._closed:
+                    raise JCoreAPIConnectionClosedException("connection is already closed")
+                connection = self._connection
+                if connection is not None and not connection._closed:
+                    return connection
+                if attempt:
+                    delay = min(self._max_delay, self._initial_delay * 2 ** (attempt - 1))
+                    time.sleep(delay * random.uniform(0.5, 1))
+                attempt += 1
+                try:
+                    self._connection = self._create_connection()
+                except Exception:
+                    if self._max_attempts is not None and attempt >= self._max_attempts:
+                        raise
+        finally:
+            self._lock.release()
+
+    def _should_retry(self, error, idempotent, attempt):
+        """
+        attempt: how many times the call has been sent
+        """
+        return isinstance(error, JCoreAPIConnectionClosedException) and not self._closed and \
+            (idempotent or self._retry_sets) and \
+            (self._max_attempts is None or attempt < self._max_attempts)
+
+    def _call(self, name, idempotent, args, kwargs):
+        attempt = 0
+        while True:
+            connection = self._get_connection()
+            attempt += 1
+            try:
+                return getattr(connection, name)(*args, **kwargs)
+            except JCoreAPIConnectionClosedException as error:
+                if not self._should_retry(error, idempotent, attempt):
+                    raise
+
+    def _call_async(self, name, idempotent, args, kwargs):
+        result = Future()
+        result.set_running_or_notify_cancel()
+        self._submit(result, name, idempotent, args, kwargs)
+        return result
+
+    def _submit(self, result, name, idempotent, args, kwargs, attempt=1):
+        try:
+            future = getattr(self._get_connection(), name)(*args, **kwargs)
+        except JCoreAPIConnectionClosedException as error:
+            if self._should_retry(error, idempotent, attempt):
+                return self._resubmit(result, name, idempotent, args, kwargs, attempt + 1)
+            return result.set_exception(error)
+        except Exception as error:
+            return result.set_exception(error)
+
+        def on_done(future):
+            error = future.exception()
+            if error is None:
+                result.set_result(future.result())
+            elif self._should_retry(error, idempotent, attempt):
+                self._resubmit(result, name, idempotent, args, kwargs, attempt + 1)
+            else:
+                result.set_exception(error)
+        future.add_done_callback(on_done)
+
+    def _resubmit(self, result, name, idempotent, args, kwargs, attempt):
+        # reconnecting can take a while, so don't block the thread that failed the call
+        # (which may be the old connection's receive thread).  One thread reconnects and
+        # sends all of the pending calls again, however many failed at once.
+        self._pending_lock.acquire()
+        try:
+            self._pending.append((result, name, idempotent, args, kwargs, attempt))
+            if self._resubmitting:
+                return
+            self._resubmitting = True
+        finally:
+            self._pending_lock.release()
+        thread = threading.Thread(target=self._resubmit_pending, name="jcore.io reconnect")
+        thread.daemon = True
+        thread.start()
+
+    def _resubmit_pending(self):
+        while True:
+            self._pending_lock.acquire()
+            try:
+                pending = self._pending
+                self._pending = []
+                if not pending:
+                    self._resubmitting = False
+                    return
+            finally:
+                self._pending_lock.release()
+
+            try:
+                self._get_connection()
+            except Exception as error:
+                # calls that failed while reconnecting fail with it, rather than
+                # trying to reconnect again
+                self._pending_lock.acquire()
+                try:
+                    pending += self._pending
+                    self._pending = []
+                finally:
+                    self._pending_lock.release()
+                for call in pending:
+                    call[0].set_exception(error)
+                continue
+            for call in pending:
+                self._submit(*call)
+
+    def close(self):
+        """
+        Closes the connection, and stops reconnecting.
+        """
+        self._closed = True
+        connection = self._connection
+        if connection is not None:
+            connection.close()
+
+    def invalidate_metadata(self, channelids=None):
+        """
+        Calls JCoreAPIConnection.invalidate_metadata on the current connection.
+        """
+        connection = self._connection
+        if connection is not None:
+            connection.invalidate_metadata(channelids)
+
+    get_real_time_data = _retrying('get_real_time_data', True)
+    get_real_time_data_async = _retrying_async('get_real_time_data_async', True)
+    set_real_time_data = _retrying('set_real_time_data', False)
+    set_real_time_data_async = _retrying_async('set_real_time_data_async', False)
+    get_metadata = _retrying('get_metadata', True)
+    get_metadata_async = _retrying_async('get_metadata_async', True)
+    set_metadata = _retrying('set_metadata', False)
+    set_metadata_async = _retrying_async('set_metadata_async', False)
+    get_historical_data = _retrying('get_historical_data', True)
+    get_historical_data_async = _retrying_async('get_historical_data_async', True)
+    get_historical_data_stream = _delegate('get_historical_data_stream')
+    subscribe_real_time_data = _delegate('subscribe_real_time_data')
+    call_async = _delegate('call_async')
+    batch = _delegate('batch')
@@ -0,0 +1,232 @@
+"""
+incremental parsing of result messages, so that the channels in a large
+getHistoricalData result can be handled as soon as each one is received
+instead of after the whole message has been buffered and parsed
+"""
+
+import json
+import re
+
+import six
+
+from .exceptions import JCoreAPIInvalidMessageException
+
+# matches the rest of a string up to (not including) its closing quote
+_STRING_REST = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*', re.S)
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_SCALAR_END = re.compile(r'[\s,\]}]')
+_WHITESPACE = re.compile(r'\s*')
+
+# what the parser expects next in the current object
+_EXPECT_OBJECT = 0
+_EXPECT_KEY_OR_END = 1
+_EXPECT_KEY = 2
+_EXPECT_COLON = 3
+_EXPECT_VALUE = 4
+_EXPECT_COMMA_OR_END = 5
+_EXPECT_NOTHING = 6
+
+# object nesting levels in {"msg": "result", "id": ..., "result": {"data": {<channelid>: ...}}}
+_LEVEL_MESSAGE = 0
+_LEVEL_RESULT = 1
+_LEVEL_DATA = 2
+
+class _Value:
+    """
+    collects the text of a JSON value that may span several chunks
+    """
+    def __init__(self, first_char):
+        self.parts = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.scalar = first_char not in '"[{'
+
+    def scan(self, text, pos):
+        """
+        scans text from pos for the end of the value.
+
+        returns: the index after the end of the value, or None if it continues past the end of text
+        """
+        if self.scalar:
+            match = _SCALAR_END.search(text, pos)
+            return match.start() if match else None
+
+        end = len(text)
+        if self.escape:
+            pos += 1
+            self.escape = False
+        while pos < end:
+            if self.in_string:
+                pos = _STRING_REST.match(text, pos).end()
+                if pos >= end:
+                    return None
+                if text[pos] == '\\':
+                    # an escape sequence is split across chunks
+                    self.escape = True
+                    return None
+                self.in_string = False
+                pos += 1
+                if not self.depth:
+                    return pos
+            else:
+                match = _STRUCTURAL.search(text, pos)
+                if not match:
+                    return None
+                char = match.group()
+                pos = match.end()
+                if char == '"':
+                    self.in_string = True
+                elif char in '[{':
+                    self.depth += 1
+                else:
+                    self.depth -= 1
+                    if not self.depth:
+                        return pos
+        return None
+
+    def finish(self, last_part=None):
+        """
+        returns: the JSON text of the value
+        """
+        if last_part is not None:
+            self.parts.append(last_part)
+        return six.u('').join(self.parts)
+
+def _parse(text):
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise JCoreAPIInvalidMessageException("invalid JSON in message", e)
+
+class ResultStreamParser:
+    """
+    Parses a message from text chunks.  If the message is a result whose id has a
+    stream callback, the entries of result.data are passed to the callback as they are
+    completed, and left out of the parsed message.
+
+    get_stream: called with the message id; returns the callback for the
+                call's stream, or None.  The callback is called with the channel id
+                and the (unparsed) JSON text of the channel's data.
+    """
+    def __init__(self, get_stream):
+        self._get_stream = get_stream
+        self._stream = None
+        self._expect = _EXPECT_OBJECT
+        self._objects = []
+        self._keys = []
+        self._key = None
+        self._value = None
+        self._failed = False
+
+    def feed(self, text):
+        """
+        parses the next chunk of the message.
+        """
+        if self._failed:
+            return
+        try:
+            self._feed(text)
+        except:
+            self._failed = True
+            raise
+
+    def close(self):
+        """
+        finishes parsing the message.
+
+        returns: the parsed message (without the streamed result.data entries), or
+            None if parsing already failed
+        """
+        if self._failed:
+            return None
+        if self._value is not None and self._value.scalar:
+            self._end_value(self._value.finish())
+        if self._expect != _EXPECT_NOTHING:
+            raise JCoreAPIInvalidMessageException("message is incomplete")
+        return self._message
+
+    def _feed(self, text):
+        pos = 0
+        end = len(text)
+        while pos < end:
+            value = self._value
+            if value is not None:
+                value_end = value.scan(text, pos)
+                if value_end is None:
+                    value.parts.append(text[pos:])
+                    return
+                self._value = None
+                self._end_value(value.finish(text[pos:value_end]))
+                pos = value_end
+                continue
+
+            pos = _WHITESPACE.match(text, pos).end()
+            if pos >= end:
+                return
+            char = text[pos]
+            expect = self._expect
+
+            if expect == _EXPECT_VALUE and char == '{' and self._should_descend():
+                self._objects.append({})
+                self._keys.append(self._key)
+                self._expect = _EXPECT_KEY_OR_END
+                pos += 1
+            elif expect == _EXPECT_OBJECT and char == '{':
+                self._objects.append({})
+                self._expect = _EXPECT_KEY_OR_END
+                pos += 1
+            elif (expect == _EXPECT_KEY_OR_END or expect == _EXPECT_COMMA_OR_END) and char == '}':
+                self._end_object()
+                pos += 1
+            elif (expect == _EXPECT_KEY_OR_END or expect == _EXPECT_KEY) and char == '"':
+                self._value = _Value(char)
+            elif expect == _EXPECT_COLON and char == ':':
+                self._expect = _EXPECT_VALUE
+                pos += 1
+            elif expect == _EXPECT_VALUE:
+                self._value = _Value(char)
+            elif expect == _EXPECT_COMMA_OR_END and char == ',':
+                self._expect = _EXPECT_KEY
+                pos += 1
+            else:
+                raise JCoreAPIInvalidMessageException(
+                    "unexpected character in message: " + repr(char))
+
+    def _should_descend(self):
+        level = len(self._objects) - 1
+        if level == _LEVEL_MESSAGE:
+            return self._key == six.u('result') and self._stream is not None
+        return level == _LEVEL_RESULT and self._key == six.u('data')
+
+    def _end_value(self, text):
+        if len(self._objects) - 1 == _LEVEL_DATA and self._expect == _EXPECT_VALUE:
+            self._stream(self._key, text)
+            self._expect = _EXPECT_COMMA_OR_END
+            return
+
+        value = _parse(text)
+        if self._expect != _EXPECT_VALUE:
+            if not isinstance(value, six.text_type):
+                raise JCoreAPIInvalidMessageException("object keys must be strings")
+            self._key = value
+            self._expect = _EXPECT_COLON
+            return
+
+        self._objects[-1][self._key] = value
+        if len(self._objects) - 1 == _LEVEL_MESSAGE and self._key == six.u('id') and \
+                isinstance(value, six.text_type):
+            self._stream = self._get_stream(value)
+        self._expect = _EXPECT_COMMA_OR_END
+
+    def _end_object(self):
+        obj = self._objects.pop()
+        if not self._objects:
+            self._message = obj
+            self._expect = _EXPECT_NOTHING
+            return
+        self._key = self._keys.pop()
+        if len(self._objects) - 1 != _LEVEL_RESULT:
+            # leave the streamed data object out of the result
+            self._objects[-1][self._key] = obj
+        self._expect = _EXPECT_COMMA_OR_END
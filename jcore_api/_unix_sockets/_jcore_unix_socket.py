@@ -3,8 +3,8 @@ A WebSocket-like interface to a unix socket with basic message framing
 (from ._message_codec)
 """
 
+import socket
 import threading
-from socket import socket
 
 import six
 
@@ -17,33 +17,77 @@ from ..exceptions import JCoreAPIConnectionClosedException, JCoreAPITimeoutExcep
 from ._message_codec import encode_message, MessageDecoder
 
 CHUNK_SIZE = 2048
+MAX_CHUNK_SIZE = 1 << 20
 
 class JCoreUnixSocket:
-    def __init__(self, sock):
+    """
+    sock: the connected unix socket
+    min_chunk_size: the minimum number of bytes to read at once.  default is CHUNK_SIZE
+    max_chunk_size: the maximum number of bytes to read at once.  Reads are sized to fit
+                    the rest of the message being received, within these limits, so that
+                    large messages take few reads.  default is MAX_CHUNK_SIZE
+    """
+    def __init__(self, sock, min_chunk_size=CHUNK_SIZE, max_chunk_size=MAX_CHUNK_SIZE):
+        assert 0 < min_chunk_size <= max_chunk_size, \
+            "min_chunk_size must be positive and no greater than max_chunk_size"
         self._sock = sock
+        self._min_chunk_size = min_chunk_size
+        self._max_chunk_size = max_chunk_size
         self._recv_queue = Queue()
         self._started = False
         self._closed = False
-        self._decoder = MessageDecoder(on_message=self._on_message)
+        self._recv_parts = []
+        self._decoder = MessageDecoder(on_chunk=self._on_chunk)
+        self._on_close = self._on_closed
+        # reused for every read, so that receiving doesn't allocate
+        self._buffer = bytearray(min_chunk_size)
+        self._view = memoryview(self._buffer)
 
         self._thread = threading.Thread(
             target=self._run, name="jcore.io unix socket")
         self._thread.daemon = True
 
-    def _on_message(self, message):
-        self._recv_queue.put_nowait(message)
+    def _on_chunk(self, chunk, final):
+        self._recv_queue.put_nowait((chunk, final))
+
+    def _on_closed(self, error):
+        self._recv_queue.put_nowait(error)
+
+    def start_receiving(self, on_chunk, on_close):
+        """
+        starts receiving, and calls on_chunk(text, final) with each piece of a message
+        on the socket's own thread as soon as it's decoded, instead of queueing it for
+        recv_chunk().  After this, recv() and recv_chunk() can't be used.
+
+        on_close: called with a JCoreAPIConnectionClosedException when the other end
+                  closes the socket
+        """
+        assert not self._started, "already receiving"
+        self._started = True
+        self._decoder = MessageDecoder(on_chunk=on_chunk)
+        self._on_close = on_close
+        self._thread.start()
 
     def _run(self):
         while not self._closed:
+            chunk_size = max(self._min_chunk_size,
+                             min(self._max_chunk_size, self._decoder.bytes_needed()))
+            if chunk_size > len(self._buffer):
+                self._buffer = bytearray(max(chunk_size, min(self._max_chunk_size, len(self._buffer) * 2)))
+                self._view = memoryview(self._buffer)
             try:
-                message = self._sock.recv(CHUNK_SIZE)
+                size = self._sock.recv_into(self._buffer, chunk_size)
             except socket.timeout:
                 continue
-            if not len(message):
+            except socket.error:
+                if self._closed:
+                    return
+                raise
+            if not size:
                 self._closed = True
-                self._recv_queue.put_nowait(JCoreAPIConnectionClosedException("socket connection broken"))
+                self._on_close(JCoreAPIConnectionClosedException("socket connection broken"))
                 return
-            self._decoder.decode(message)
+            self._decoder.decode(self._view[:size])
 
     def gettimeout(self):
         return self._sock.gettimeout()
@@ -53,6 +97,23 @@ class JCoreUnixSocket:
         self._closed = True
 
     def recv(self):
+        while True:
+            chunk, final = self.recv_chunk()
+            if final:
+                break
+            self._recv_parts.append(chunk)
+        if self._recv_parts:
+            self._recv_parts.append(chunk)
+            chunk = six.u('').join(self._recv_parts)
+            self._recv_parts = []
+        return chunk
+
+    def recv_chunk(self):
+        """
+        receives the next piece of a message as soon as it arrives.
+
+        returns: a tuple of the text and whether it is the final piece of the message
+        """
         if not self._started:
             self._started = True
             self._thread.start()
@@ -69,8 +130,13 @@ class JCoreUnixSocket:
         return message
 
     def send(self, message):
+        self._send_encoded(encode_message(message))
+
+    def send_many(self, messages):
+        self._send_encoded(six.b('').join(encode_message(message) for message in messages))
+
+    def _send_encoded(self, encoded):
         totalsent = 0
-        encoded = encode_message(message)
         while totalsent < len(encoded):
             try:
                 sent = self._sock.send(encoded[totalsent:])
@@ -2,6 +2,7 @@
 utils for framing string messages for unix sockets
 """
 
+import codecs
 import struct
 
 import six
@@ -9,12 +10,24 @@ import six
 PREAMBLE = 35    # '#' character
 LENGTH_LEN = 4  # number of bytes for representing message length
 HEADER_LEN = 1 + LENGTH_LEN  # number of bytes in message header
+_HEADER = struct.Struct(">BI")
 
 DECODE_STATE_INITIAL = 0
 DECODE_STATE_READ_LENGTH = 1
 DECODE_STATE_READ_DATA = 2
 
 
+if six.PY3:
+    def _decodable(view):
+        return view
+else:
+    # python 2 codecs don't accept memoryviews
+    def _decodable(view):
+        return view.tobytes()
+
+def _decode_utf8(view):
+    return codecs.utf_8_decode(_decodable(view), 'strict', True)[0]
+
 def encode_message(data):
     """
     frames a message for sending on a unix socket
@@ -29,7 +42,7 @@ def encode_message(data):
     pos = 0
     encoded[0] = PREAMBLE
     pos += 1
-    encoded[pos:pos + LENGTH_LEN] = struct.pack(">I", len(data))
+    encoded[pos:pos + LENGTH_LEN] = struct.pack(">I", len(encoded_data))
     pos += LENGTH_LEN
     encoded[pos:] = encoded_data
     return six.binary_type(encoded)
@@ -40,65 +53,163 @@ class MessageDecoder:
 
     on_message: callback to call with decoded message(s) when complete
                 frames have been received
+    on_chunk: if given, messages are not buffered; instead this is called with
+              (text, final) for each piece of a message as it is received,
+              where final is True for the last piece of the message.
     """
-    def __init__(self, on_message):
-        assert hasattr(on_message, '__call__'), "on_message must be callable"
+    def __init__(self, on_message=None, on_chunk=None):
+        assert hasattr(on_message if on_chunk is None else on_chunk, '__call__'), \
+            "on_message or on_chunk must be callable"
         self._on_message = on_message
+        self._on_chunk = on_chunk
         self._decode_state = DECODE_STATE_INITIAL
         self._length_buf = bytearray(LENGTH_LEN)
         self._length_buf_pos = 0
         self._decode_buffer_pos = 0
         self._decode_buffer = None
+        self._decode_remaining = 0
+        self._text_decoder = codecs.getincrementaldecoder('utf8')()
+
+    def bytes_needed(self):
+        """
+        returns: the number of bytes needed to finish the current frame (or its header)
+        """
+        if self._decode_state is DECODE_STATE_INITIAL:
+            return HEADER_LEN
+        if self._decode_state is DECODE_STATE_READ_LENGTH:
+            return LENGTH_LEN - self._length_buf_pos
+        if self._on_chunk:
+            return self._decode_remaining
+        return len(self._decode_buffer) - self._decode_buffer_pos
 
     def decode(self, src_buffer):
         """
         decode a chunk of data from the unix socket.
 
-        src_buffer: the data from the unix socket, a byte array or binary string
+        src_buffer: the data from the unix socket, a binary string, bytearray or memoryview.
+                    It is not referenced after decode returns, so the caller can reuse it.
+        """
+        view = memoryview(src_buffer)
+        src_pos = 0
+        if self._decode_state is not DECODE_STATE_INITIAL:
+            # finish the frame left over from the last chunk
+            src_pos = self._decode_states(view, src_pos, until_frame_end=True)
+        if len(view) - src_pos >= HEADER_LEN:
+            src_pos = self._decode_frames(view, src_pos)
+        if src_pos < len(view):
+            # an incomplete frame at the end
+            self._decode_states(view, src_pos)
+
+    def _decode_frames(self, view, src_pos):
         """
+        decodes the complete frames in view starting at src_pos, which must be the
+        start of a frame.
 
-        if isinstance(src_buffer, six.binary_type):
-            src_buffer = bytearray(src_buffer)
+        returns: the position after the last complete frame, or after the header of
+            an incomplete frame at the end, whose data is left to _decode_states
+        """
+        src_len = len(view)
+        on_chunk = self._on_chunk
+        on_message = self._on_message
+        unpack_header = _HEADER.unpack_from
+        while src_len - src_pos >= HEADER_LEN:
+            preamble, message_length = unpack_header(view, src_pos)
+            assert preamble == PREAMBLE, "preamble does not match; expected %(exp)c, got %(actual)c" % \
+                {'exp': PREAMBLE, 'actual': preamble}
+            end = src_pos + HEADER_LEN + message_length
+            if end > src_len:
+                # don't read the header again a byte at a time
+                self._start_message(message_length)
+                return src_pos + HEADER_LEN
+            message = _decode_utf8(view[src_pos + HEADER_LEN:end])
+            src_pos = end
+            if on_chunk:
+                on_chunk(message, True)
+            else:
+                on_message(message)
+        return src_pos
+
+    def _decode_states(self, view, src_pos, until_frame_end=False):
+        """
+        decodes view starting at src_pos a piece at a time, keeping the state of
+        incomplete frames between chunks.
 
-        src_pos = 0
-        while src_pos < len(src_buffer):
-            src_remain = len(src_buffer) - src_pos
+        until_frame_end: if True, stops at the end of the current frame
+
+        returns: the position where decoding stopped
+        """
+        src_len = len(view)
+        while src_pos < src_len:
+            src_remain = src_len - src_pos
             bytes_read = 0
 
             if self._decode_state is DECODE_STATE_INITIAL:
-                preamble = src_buffer[src_pos]
+                preamble = six.indexbytes(view, src_pos)
                 bytes_read = 1
-                assert preamble is PREAMBLE, "preamble does not match; expected %(exp)c, got %(actual)c" % \
+                assert preamble == PREAMBLE, "preamble does not match; expected %(exp)c, got %(actual)c" % \
                     {'exp': PREAMBLE, 'actual': preamble}
                 self._decode_state = DECODE_STATE_READ_LENGTH
 
             elif self._decode_state is DECODE_STATE_READ_LENGTH:
-                bytes_read = min(src_remain, LENGTH_LEN - self._length_buf_pos)
-                self._length_buf[self._length_buf_pos:self._length_buf_pos + bytes_read] = \
-                    src_buffer[src_pos:src_pos + bytes_read]
-                self._length_buf_pos += bytes_read
-                if self._length_buf_pos >= LENGTH_LEN:
-                    message_length = struct.unpack(">I", self._length_buf[0:LENGTH_LEN])[0]
-                    if message_length:
-                        self._decode_buffer = bytearray(message_length)
-                        self._decode_buffer_pos = 0
-                        self._decode_state = DECODE_STATE_READ_DATA
-                    else:
-                        self._on_message(six.u(''))
-                        self._decode_state = DECODE_STATE_INITIAL
-                    self._length_buf_pos = 0
-                    self._length_buf = bytearray(LENGTH_LEN)
+                if not self._length_buf_pos and src_remain >= LENGTH_LEN:
+                    # the whole length is in this chunk
+                    bytes_read = LENGTH_LEN
+                    message_length = struct.unpack_from(">I", view, src_pos)[0]
+                else:
+                    bytes_read = min(src_remain, LENGTH_LEN - self._length_buf_pos)
+                    self._length_buf[self._length_buf_pos:self._length_buf_pos + bytes_read] = \
+                        view[src_pos:src_pos + bytes_read]
+                    self._length_buf_pos += bytes_read
+                    message_length = None
+                    if self._length_buf_pos >= LENGTH_LEN:
+                        message_length = struct.unpack_from(">I", self._length_buf)[0]
+                        self._length_buf_pos = 0
+                if message_length is not None:
+                    self._start_message(message_length)
+
+            elif self._decode_state is DECODE_STATE_READ_DATA and self._on_chunk:
+                bytes_read = min(src_remain, self._decode_remaining)
+                self._decode_remaining -= bytes_read
+                final = not self._decode_remaining
+                self._on_chunk(self._text_decoder.decode(_decodable(view[src_pos:src_pos + bytes_read]), final), final)
+                if final:
+                    self._decode_state = DECODE_STATE_INITIAL
 
             elif self._decode_state is DECODE_STATE_READ_DATA:
                 bytes_read = min(src_remain, 
                     len(self._decode_buffer) - self._decode_buffer_pos)
-                self._decode_buffer[self._decode_buffer_pos:self._decode_buffer_pos + bytes_read] = \
-                    src_buffer[src_pos:src_pos + bytes_read]
-                self._decode_buffer_pos += bytes_read
-                if self._decode_buffer_pos >= len(self._decode_buffer):
-                    self._on_message(self._decode_buffer.decode('utf8'))
+                if not self._decode_buffer_pos and bytes_read == len(self._decode_buffer):
+                    # the whole message is in this chunk, so decode it without copying
+                    message = _decode_utf8(view[src_pos:src_pos + bytes_read])
+                else:
+                    self._decode_buffer[self._decode_buffer_pos:self._decode_buffer_pos + bytes_read] = \
+                        view[src_pos:src_pos + bytes_read]
+                    self._decode_buffer_pos += bytes_read
+                    message = None
+                    if self._decode_buffer_pos >= len(self._decode_buffer):
+                        message = self._decode_buffer.decode('utf8')
+                if message is not None:
                     self._decode_state = DECODE_STATE_INITIAL
                     self._decode_buffer = None
+                    self._on_message(message)
 
             assert bytes_read > 0
             src_pos += bytes_read
+            if until_frame_end and self._decode_state is DECODE_STATE_INITIAL:
+                break
+        return src_pos
+
+    def _start_message(self, message_length):
+        if not message_length:
+            self._decode_state = DECODE_STATE_INITIAL
+            if self._on_chunk:
+                self._on_chunk(six.u(''), True)
+            else:
+                self._on_message(six.u(''))
+        elif self._on_chunk:
+            self._decode_remaining = message_length
+            self._decode_state = DECODE_STATE_READ_DATA
+        else:
+            self._decode_buffer = bytearray(message_length)
+            self._decode_buffer_pos = 0
+            self._decode_state = DECODE_STATE_READ_DATA
@@ -21,6 +21,7 @@ Copyright (C) 2010 Hiroki Ohtani(liris)
 """
 from ._abnf import *
 from ._app import WebSocketApp
+from ._compression import *
 from ._core import *
 from ._exceptions import *
 from ._logging import *
@@ -19,14 +19,14 @@ Copyright (C) 2010 Hiroki Ohtani(liris)
     Boston, MA  02110-1335  USA
 
 """
-import array
+import binascii
 import os
 import struct
 
 import six
 
 from ._exceptions import *
-from ._utils import validate_utf8
+from ._utils import validate_utf8, decode_utf8
 
 try:
     # If wsaccel is available we use compiled routines to mask data.
@@ -37,14 +37,24 @@ try:
 
 except ImportError:
     # wsaccel is not available, we rely on python implementations.
-    def _mask(_m, _d):
-        for i in range(len(_d)):
-            _d[i] ^= _m[i % 4]
-
-        if six.PY3:
-            return _d.tobytes()
-        else:
-            return _d.tostring()
+    # Instead of xoring one byte at a time, xor the whole payload as one
+    # big integer with the mask key repeated to the same length.
+    if hasattr(int, 'from_bytes'):
+        def _mask(_m, _d):
+            length = len(_d)
+            if not length:
+                return b''
+            _m = (_m * (length // 4 + 1))[:length]
+            return (int.from_bytes(_d, 'big') ^
+                    int.from_bytes(_m, 'big')).to_bytes(length, 'big')
+    else:
+        def _mask(_m, _d):
+            length = len(_d)
+            if not length:
+                return ''
+            _m = (_m * (length // 4 + 1))[:length]
+            masked = int(binascii.hexlify(_d), 16) ^ int(binascii.hexlify(_m), 16)
+            return binascii.unhexlify('%0*x' % (length * 2, masked))
 
 __all__ = [
     'ABNF', 'continuous_frame', 'frame_buffer',
@@ -138,14 +148,21 @@ class ABNF(object):
         if data is None:
             data = ""
         self.data = data
+        # data of a text frame decoded while validating it, if it was
+        self.text = None
         self.get_mask_key = os.urandom
 
-    def validate(self, skip_utf8_validation=False):
+    def validate(self, skip_utf8_validation=False, compressed=False):
         """
         validate the ABNF frame.
         skip_utf8_validation: skip utf8 validation.
+        compressed: whether permessage-deflate was negotiated, which marks
+            the first frame of compressed messages with rsv1.
         """
-        if self.rsv1 or self.rsv2 or self.rsv3:
+        if self.rsv2 or self.rsv3:
+            raise WebSocketProtocolException("rsv is not implemented, yet")
+        if self.rsv1 and not (compressed and self.opcode in
+                              (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY)):
             raise WebSocketProtocolException("rsv is not implemented, yet")
 
         if self.opcode not in ABNF.OPCODES:
@@ -254,21 +271,32 @@ class ABNF(object):
         if isinstance(data, six.text_type):
             data = six.b(data)
 
-        _m = array.array("B", mask_key)
-        _d = array.array("B", data)
-        return _mask(_m, _d)
+        return _mask(six.binary_type(mask_key), six.binary_type(data))
 
 
 class frame_buffer(object):
     _HEADER_MASK_INDEX = 5
     _HEADER_LENGTH_INDEX = 6
 
-    def __init__(self, recv_fn, skip_utf8_validation):
+    # Smallest buffer to receive into, so that small frames that arrive
+    # together are received at once.
+    _RECV_SIZE = 16384
+    # A buffer grown for large frames is reused for the next ones, unless
+    # it's bigger than this.
+    _MAX_KEPT_SIZE = 16 << 20
+
+    def __init__(self, recv_fn, skip_utf8_validation, recv_into_fn=None):
         self.recv = recv_fn
+        self.recv_into = recv_into_fn
         self.skip_utf8_validation = skip_utf8_validation
+        # whether permessage-deflate was negotiated
+        self.compressed = False
         # Buffers over the packets from the layer beneath until desired amount
-        # bytes of bytes are received.
-        self.recv_buffer = []
+        # bytes of bytes are received.  The bytes that haven't been consumed
+        # yet are recv_buffer[recv_start:recv_end].
+        self._set_recv_buffer(bytearray(frame_buffer._RECV_SIZE))
+        self.recv_start = 0
+        self.recv_end = 0
         self.clear()
 
     def clear(self):
@@ -352,31 +380,62 @@ class frame_buffer(object):
         self.clear()
 
         frame = ABNF(fin, rsv1, rsv2, rsv3, opcode, has_mask, payload)
-        frame.validate(self.skip_utf8_validation)
+        frame.validate(self.skip_utf8_validation, self.compressed)
 
         return frame
 
     def recv_strict(self, bufsize):
-        shortage = bufsize - sum(len(x) for x in self.recv_buffer)
-        while shortage > 0:
-            # Limit buffer size that we pass to socket.recv() to avoid
-            # fragmenting the heap -- the number of bytes recv() actually
-            # reads is limited by socket buffer and is relatively small,
-            # yet passing large numbers repeatedly causes lots of large
-            # buffers allocated and then shrunk, which results in
-            # fragmentation.
-            bytes_ = self.recv(min(16384, shortage))
-            self.recv_buffer.append(bytes_)
-            shortage -= len(bytes_)
-
-        unified = six.b("").join(self.recv_buffer)
-
-        if shortage == 0:
-            self.recv_buffer = []
-            return unified
-        else:
-            self.recv_buffer = [unified[bufsize:]]
-            return unified[:bufsize]
+        start = self.recv_start
+        if self.recv_end - start < bufsize:
+            self._fill(bufsize)
+            start = self.recv_start
+        self.recv_start = start + bufsize
+        return self.recv_view[start:start + bufsize].tobytes()
+
+    def _set_recv_buffer(self, buffer):
+        self.recv_buffer = buffer
+        self.recv_view = memoryview(buffer)
+
+    def _fill(self, bufsize):
+        """
+        receive until there are at least bufsize unconsumed bytes.
+        """
+        start = self.recv_start
+        available = self.recv_end - start
+        if not available:
+            self.recv_start = self.recv_end = start = 0
+            if len(self.recv_buffer) > max(bufsize, frame_buffer._MAX_KEPT_SIZE):
+                # don't hold on to the memory of an unusually large frame
+                self._set_recv_buffer(bytearray(frame_buffer._RECV_SIZE))
+
+        if len(self.recv_buffer) - start < bufsize:
+            # Move the unconsumed bytes to the front of a buffer that fits
+            # the whole frame, so that its payload is received straight into
+            # place.
+            if len(self.recv_buffer) >= bufsize:
+                self.recv_buffer[:available] = self.recv_view[start:self.recv_end].tobytes()
+            else:
+                buffer = bytearray(bufsize)
+                buffer[:available] = self.recv_view[start:self.recv_end]
+                self._set_recv_buffer(buffer)
+            self.recv_start = 0
+            self.recv_end = available
+
+        while self.recv_end - self.recv_start < bufsize:
+            self.recv_end += self._recv_into(self.recv_view[self.recv_end:])
+
+    def _recv_into(self, view):
+        if self.recv_into:
+            return self.recv_into(view)
+        # Limit buffer size that we pass to socket.recv() to avoid
+        # fragmenting the heap -- the number of bytes recv() actually
+        # reads is limited by socket buffer and is relatively small,
+        # yet passing large numbers repeatedly causes lots of large
+        # buffers allocated and then shrunk, which results in
+        # fragmentation.
+        bytes_ = self.recv(min(16384, len(view)))
+        view[:len(bytes_)] = bytes_
+        return len(bytes_)
 
 
 class continuous_frame(object):
@@ -386,6 +445,10 @@ class continuous_frame(object):
         self.skip_utf8_validation = skip_utf8_validation
         self.cont_data = None
         self.recving_frames = None
+        # the negotiated permessage_deflate, if any, and whether the message
+        # being received is compressed
+        self.compression = None
+        self.decompressing = False
 
     def validate(self, frame):
         if not self.recving_frames and frame.opcode == ABNF.OPCODE_CONT:
@@ -395,15 +458,25 @@ class continuous_frame(object):
             raise WebSocketProtocolException("Illegal frame")
 
     def add(self, frame):
+        if frame.opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
+            # only the first frame of a compressed message has rsv1 set
+            self.decompressing = bool(frame.rsv1)
+        data = frame.data
+        if self.decompressing:
+            data = self.compression.decompress(data, frame.fin)
+
+        # the payloads of the fragments are joined once, in extract, so that
+        # a message in many fragments isn't copied for each one
         if self.cont_data:
-            self.cont_data[1] += frame.data
+            self.cont_data[1].append(data)
         else:
             if frame.opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
                 self.recving_frames = frame.opcode
-            self.cont_data = [frame.opcode, frame.data]
+            self.cont_data = [frame.opcode, [data]]
 
         if frame.fin:
             self.recving_frames = None
+            self.decompressing = False
 
     def is_fire(self, frame):
         return frame.fin or self.fire_cont_frame
@@ -411,9 +484,17 @@ class continuous_frame(object):
     def extract(self, frame):
         data = self.cont_data
         self.cont_data = None
-        frame.data = data[1]
-        if not self.fire_cont_frame and data[0] == ABNF.OPCODE_TEXT and not self.skip_utf8_validation and not validate_utf8(frame.data):
-            raise WebSocketPayloadException(
-                "cannot decode: " + repr(frame.data))
+        fragments = data[1]
+        frame.data = fragments[0] if len(fragments) == 1 else six.b("").join(fragments)
+        if not self.fire_cont_frame and data[0] == ABNF.OPCODE_TEXT and not self.skip_utf8_validation:
+            if six.PY3:
+                # validate by decoding, and keep the text so recv doesn't decode it again
+                frame.text = decode_utf8(frame.data)
+                valid = frame.text is not None
+            else:
+                valid = validate_utf8(frame.data)
+            if not valid:
+                raise WebSocketPayloadException(
+                    "cannot decode: " + repr(frame.data))
 
         return [data[0], frame]
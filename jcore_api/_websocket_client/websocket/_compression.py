@@ -0,0 +1,208 @@
+"""
+websocket - WebSocket client library for Python
+
+Copyright (C) 2010 Hiroki Ohtani(liris)
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor,
+    Boston, MA 02110-1335  USA
+
+"""
+import zlib
+
+import six
+
+from ._exceptions import *
+
+__all__ = ["permessage_deflate"]
+
+# the end of a deflate block flushed with Z_SYNC_FLUSH, which is left out of
+# compressed messages (RFC 7692 section 7.2.1)
+_TAIL = six.b("\x00\x00\xff\xff")
+
+
+class permessage_deflate(object):
+    """
+    compresses sent messages and decompresses received ones for a connection
+    that negotiated the permessage-deflate extension (RFC 7692).
+
+    client_no_context_takeover: reset the compressor after each sent message.
+    server_no_context_takeover: the server resets its compressor after each
+        message it sends, so reset the decompressor after each received one.
+    client_max_window_bits: the window size the compressor uses.
+    server_max_window_bits: the window size the server compresses with.
+    level: the zlib compression level.
+    """
+    NAME = "permessage-deflate"
+
+    _PARAMS = ("client_no_context_takeover", "server_no_context_takeover",
+               "client_max_window_bits", "server_max_window_bits")
+
+    def __init__(self, client_no_context_takeover=False,
+                 server_no_context_takeover=False, client_max_window_bits=15,
+                 server_max_window_bits=15, level=zlib.Z_DEFAULT_COMPRESSION):
+        self.client_no_context_takeover = client_no_context_takeover
+        self.server_no_context_takeover = server_no_context_takeover
+        self.client_max_window_bits = client_max_window_bits
+        self.server_max_window_bits = server_max_window_bits
+        self.level = level
+        self._compressor = None
+        self._decompressor = None
+
+    @staticmethod
+    def offer(options):
+        """
+        create the Sec-WebSocket-Extensions header value to offer.
+
+        options: True, or a dict with any of these items:
+            "client_no_context_takeover" - if True, the client resets its
+                compressor after each message (it tells the server it may
+                too).
+            "server_no_context_takeover" - if True, ask the server to reset
+                its compressor after each message, so that neither side has
+                to keep the context between messages.
+            "client_max_window_bits" - if set (9 to 15), compress with a
+                smaller window, so that the server needs less memory.
+            "server_max_window_bits" - if set (8 to 15), ask the server to
+                compress with a smaller window, to need less memory.
+            "level" - the zlib compression level.
+        """
+        options = _get_options(options)
+        params = [permessage_deflate.NAME]
+        if options.get("client_no_context_takeover"):
+            params.append("client_no_context_takeover")
+        if options.get("server_no_context_takeover"):
+            params.append("server_no_context_takeover")
+        client_max_window_bits = options.get("client_max_window_bits")
+        if client_max_window_bits:
+            _check_window_bits(client_max_window_bits, 9)
+            params.append("client_max_window_bits=%d" % client_max_window_bits)
+        server_max_window_bits = options.get("server_max_window_bits")
+        if server_max_window_bits:
+            _check_window_bits(server_max_window_bits, 8)
+            params.append("server_max_window_bits=%d" % server_max_window_bits)
+        return "; ".join(params)
+
+    @staticmethod
+    def accept(response, options):
+        """
+        check the server's Sec-WebSocket-Extensions header value against what
+        was offered.
+
+        response: the header value, or None if the server didn't send it.
+        options: what was passed to offer, or None if nothing was offered.
+
+        return value: a permessage_deflate for the connection, or None if the
+            server didn't accept the extension.
+        """
+        if not response:
+            return None
+        if not options:
+            raise WebSocketException(
+                "Server accepted an extension that was not offered: " + response)
+        options = _get_options(options)
+
+        extensions = response.split(",")
+        params = [param.strip() for param in extensions[0].split(";")]
+        if len(extensions) > 1 or params[0] != permessage_deflate.NAME:
+            raise WebSocketException(
+                "Server accepted an extension that was not offered: " + response)
+
+        accepted = {}
+        for param in params[1:]:
+            name, _, value = param.partition("=")
+            name = name.strip()
+            value = value.strip().strip('"')
+            if name not in permessage_deflate._PARAMS or name in accepted:
+                raise WebSocketException(
+                    "Invalid permessage-deflate parameter: " + param)
+            if name.endswith("_no_context_takeover"):
+                if value:
+                    raise WebSocketException(
+                        "Invalid permessage-deflate parameter: " + param)
+                accepted[name] = True
+            else:
+                if not value.isdigit():
+                    raise WebSocketException(
+                        "Invalid permessage-deflate parameter: " + param)
+                accepted[name] = int(value)
+
+        client_max_window_bits = accepted.get("client_max_window_bits")
+        if client_max_window_bits is not None:
+            offered = options.get("client_max_window_bits")
+            # zlib can't compress with a window of 8 bits
+            if not offered or not 9 <= client_max_window_bits <= offered:
+                raise WebSocketException(
+                    "Invalid permessage-deflate client_max_window_bits: %d" % client_max_window_bits)
+        server_max_window_bits = accepted.get("server_max_window_bits")
+        if server_max_window_bits is not None:
+            offered = options.get("server_max_window_bits") or 15
+            if not 8 <= server_max_window_bits <= offered:
+                raise WebSocketException(
+                    "Invalid permessage-deflate server_max_window_bits: %d" % server_max_window_bits)
+        if options.get("server_no_context_takeover") and \
+                not accepted.get("server_no_context_takeover"):
+            raise WebSocketException(
+                "Server did not accept permessage-deflate server_no_context_takeover")
+
+        return permessage_deflate(
+            client_no_context_takeover=bool(
+                accepted.get("client_no_context_takeover") or
+                options.get("client_no_context_takeover")),
+            server_no_context_takeover=bool(accepted.get("server_no_context_takeover")),
+            client_max_window_bits=client_max_window_bits or options.get("client_max_window_bits") or 15,
+            server_max_window_bits=server_max_window_bits or 15,
+            level=options.get("level", zlib.Z_DEFAULT_COMPRESSION))
+
+    def compress(self, data):
+        """
+        compress the payload of a message to send.
+        """
+        if self._compressor is None:
+            self._compressor = zlib.compressobj(
+                self.level, zlib.DEFLATED, -self.client_max_window_bits)
+        data = self._compressor.compress(data) + \
+            self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.client_no_context_takeover:
+            self._compressor = None
+        if data.endswith(_TAIL):
+            data = data[:-len(_TAIL)]
+        return data
+
+    def decompress(self, data, fin):
+        """
+        decompress the payload of a received frame of a compressed message.
+
+        fin: whether it is the last frame of the message.
+        """
+        if self._decompressor is None:
+            self._decompressor = zlib.decompressobj(-self.server_max_window_bits)
+        try:
+            data = self._decompressor.decompress(data)
+            if fin:
+                data += self._decompressor.decompress(_TAIL)
+        except zlib.error as e:
+            raise WebSocketPayloadException("cannot decompress: " + str(e))
+        if fin and self.server_no_context_takeover:
+            self._decompressor = None
+        return data
+
+
+def _get_options(options):
+    return options if isinstance(options, dict) else {}
+
+
+def _check_window_bits(bits, minimum):
+    if not isinstance(bits, int) or not minimum <= bits <= 15:
+        raise ValueError("window bits must be from %d to 15" % minimum)
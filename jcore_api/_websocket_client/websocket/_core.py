@@ -87,8 +87,11 @@ class WebSocket(object):
 
         self.connected = False
         self.get_mask_key = get_mask_key
+        # the negotiated permessage_deflate, if any
+        self.compression = None
         # These buffer over the build-up of a single frame.
-        self.frame_buffer = frame_buffer(self._recv, skip_utf8_validation)
+        self.frame_buffer = frame_buffer(
+            self._recv, skip_utf8_validation, self._recv_into)
         self.cont_frame = continuous_frame(
             fire_cont_frame, skip_utf8_validation)
 
@@ -205,6 +208,10 @@ class WebSocket(object):
                  "subprotocols" - array of available sub protocols.
                                   default is None.
                  "socket" - pre-initialized stream socket.
+                 "compression" - if set, offer the permessage-deflate
+                                 extension. True, or a dict of the options
+                                 described in permessage_deflate.offer.
+                                 default is None.
 
         """
         self.sock, addrs = connect(url, self.sock_opt, proxy_info(**options),
@@ -212,6 +219,7 @@ class WebSocket(object):
 
         try:
             self.handshake_response = handshake(self.sock, *addrs, **options)
+            self._set_compression(self.handshake_response.compression)
             self.connected = True
         except:
             if self.sock:
@@ -247,20 +255,49 @@ class WebSocket(object):
         >>> cont_frame = ABNF.create_frame("Foo Bar", ABNF.OPCODE_CONT, 1)
         >>> ws.send_frame(frame)
 
+        """
+        return self.send_frames([frame])
+
+    def send_frames(self, frames):
+        """
+        Send several data frames with a single write to the socket.
+
+        frames: list of frames created by ABNF.create_frame
         """
         if self.get_mask_key:
-            frame.get_mask_key = self.get_mask_key
-        data = frame.format()
-        length = len(data)
-        trace("send: " + repr(data))
+            for frame in frames:
+                frame.get_mask_key = self.get_mask_key
 
         with self.lock:
+            # compressing with context takeover depends on the messages
+            # compressed before, so messages have to be sent in the order
+            # they are compressed
+            if self.compression:
+                for frame in frames:
+                    self._compress(frame)
+            data = six.b("").join(frame.format() for frame in frames)
+            length = len(data)
+            trace("send: " + repr(data))
+
             while data:
                 l = self._send(data)
                 data = data[l:]
 
         return length
 
+    def _compress(self, frame):
+        # only whole messages are compressed; a fragmented message would have
+        # to be compressed as a whole before it was split into frames
+        if frame.fin and not frame.rsv1 and \
+                frame.opcode in (ABNF.OPCODE_TEXT, ABNF.OPCODE_BINARY):
+            frame.data = self.compression.compress(frame.data)
+            frame.rsv1 = 1
+
+    def _set_compression(self, compression):
+        self.compression = compression
+        self.frame_buffer.compressed = compression is not None
+        self.cont_frame.compression = compression
+
     def send_binary(self, payload):
         return self.send(payload, ABNF.OPCODE_BINARY)
 
@@ -290,11 +327,13 @@ class WebSocket(object):
 
         return value: string(byte array) value.
         """
-        opcode, data = self.recv_data()
+        opcode, frame = self.recv_data_frame()
         if six.PY3 and opcode == ABNF.OPCODE_TEXT:
-            return data.decode("utf-8")
+            if frame.text is not None:
+                return frame.text
+            return frame.data.decode("utf-8")
         elif opcode == ABNF.OPCODE_TEXT or opcode == ABNF.OPCODE_BINARY:
-            return data
+            return frame.data
         else:
             return ''
 
@@ -423,8 +462,14 @@ class WebSocket(object):
         return send(self.sock, data)
 
     def _recv(self, bufsize):
+        return self._recv_with(recv, bufsize)
+
+    def _recv_into(self, buffer):
+        return self._recv_with(recv_into, buffer)
+
+    def _recv_with(self, recv_fn, arg):
         try:
-            return recv(self.sock, bufsize)
+            return recv_fn(self.sock, arg)
         except WebSocketConnectionClosedException:
             if self.sock:
                 self.sock.close()
@@ -473,6 +518,9 @@ def create_connection(url, timeout=None, class_=WebSocket, **options):
                               default is None.
              "skip_utf8_validation" - skip utf8 validation.
              "socket" - pre-initialized stream socket.
+             "compression" - if set, offer the permessage-deflate extension.
+                             True, or a dict of the options described in
+                             permessage_deflate.offer.
     """
     sockopt = options.pop("sockopt", [])
     sslopt = options.pop("sslopt", {})
@@ -25,6 +25,7 @@ import os
 
 import six
 
+from ._compression import *
 from ._exceptions import *
 from ._http import *
 from ._logging import *
@@ -49,10 +50,12 @@ VERSION = 13
 
 class handshake_response(object):
 
-    def __init__(self, status, headers, subprotocol):
+    def __init__(self, status, headers, subprotocol, compression=None):
         self.status = status
         self.headers = headers
         self.subprotocol = subprotocol
+        # the negotiated permessage_deflate, if any
+        self.compression = compression
 
 
 def handshake(sock, hostname, port, resource, **options):
@@ -67,7 +70,10 @@ def handshake(sock, hostname, port, resource, **options):
     if not success:
         raise WebSocketException("Invalid WebSocket Header")
 
-    return handshake_response(status, resp, subproto)
+    compression = permessage_deflate.accept(
+        resp.get("sec-websocket-extensions"), options.get("compression"))
+
+    return handshake_response(status, resp, subproto, compression)
 
 
 def _get_handshake_headers(resource, host, port, options):
@@ -99,6 +105,10 @@ def _get_handshake_headers(resource, host, port, options):
     if subprotocols:
         headers.append("Sec-WebSocket-Protocol: %s" % ",".join(subprotocols))
 
+    compression = options.get("compression")
+    if compression:
+        headers.append("Sec-WebSocket-Extensions: %s" % permessage_deflate.offer(compression))
+
     if "header" in options:
         header = options["header"]
         if isinstance(header, dict):
@@ -40,7 +40,7 @@ if hasattr(socket, "TCP_KEEPCNT"):
 _default_timeout = None
 
 __all__ = ["DEFAULT_SOCKET_OPTION", "sock_opt", "setdefaulttimeout", "getdefaulttimeout",
-           "recv", "recv_line", "send"]
+           "recv", "recv_into", "recv_line", "send"]
 
 
 class sock_opt(object):
@@ -72,12 +72,9 @@ def getdefaulttimeout():
     return _default_timeout
 
 
-def recv(sock, bufsize):
-    if not sock:
-        raise WebSocketConnectionClosedException("socket is already closed.")
-
+def _recv(sock_recv, arg):
     try:
-        bytes_ = sock.recv(bufsize)
+        return sock_recv(arg)
     except socket.timeout as e:
         message = extract_err_message(e)
         raise WebSocketTimeoutException(message)
@@ -88,6 +85,13 @@ def recv(sock, bufsize):
         else:
             raise
 
+
+def recv(sock, bufsize):
+    if not sock:
+        raise WebSocketConnectionClosedException("socket is already closed.")
+
+    bytes_ = _recv(sock.recv, bufsize)
+
     if not bytes_:
         raise WebSocketConnectionClosedException(
             "Connection is already closed.")
@@ -95,6 +99,28 @@ def recv(sock, bufsize):
     return bytes_
 
 
+def recv_into(sock, buffer):
+    """
+    receive into a writable buffer (a bytearray or memoryview), without
+    allocating. return value: the number of bytes received.
+    """
+    if not sock:
+        raise WebSocketConnectionClosedException("socket is already closed.")
+
+    if hasattr(sock, "recv_into"):
+        nbytes = _recv(sock.recv_into, buffer)
+    else:
+        bytes_ = _recv(sock.recv, len(buffer))
+        nbytes = len(bytes_) if bytes_ else 0
+        buffer[:nbytes] = bytes_ or six.b("")
+
+    if not nbytes:
+        raise WebSocketConnectionClosedException(
+            "Connection is already closed.")
+
+    return nbytes
+
+
 def recv_line(sock):
     line = []
     while True:
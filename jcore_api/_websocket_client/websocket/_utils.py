@@ -19,9 +19,11 @@ Copyright (C) 2010 Hiroki Ohtani(liris)
     Boston, MA 02110-1335  USA
 
 """
+import codecs
+
 import six
 
-__all__ = ["NoLock", "validate_utf8", "extract_err_message"]
+__all__ = ["NoLock", "validate_utf8", "decode_utf8", "extract_err_message"]
 
 
 class NoLock(object):
@@ -88,6 +90,12 @@ except ImportError:
 
         return True
 
+    if six.PY3:
+        # the built-in codec validates the whole string at C speed, and
+        # (unlike python 2's) rejects surrogates like the DFA above does.
+        def _validate_utf8(utfbytes):
+            return decode_utf8(utfbytes) is not None
+
 
 def validate_utf8(utfbytes):
     """
@@ -98,6 +106,20 @@ def validate_utf8(utfbytes):
     return _validate_utf8(utfbytes)
 
 
+def decode_utf8(utfbytes):
+    """
+    decode utf8 byte string, validating it.
+    utfbytes: utf byte string to decode.
+    return value: the decoded string if valid utf8 string. Otherwise, None.
+    """
+    if six.PY2 and not _validate_utf8(utfbytes):
+        return None
+    try:
+        return codecs.decode(utfbytes, "utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
 def extract_err_message(exception):
     if exception.args:
         return exception.args[0]
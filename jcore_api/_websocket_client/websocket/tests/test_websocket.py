@@ -7,16 +7,19 @@ sys.path[0:0] = [""]
 import os
 import os.path
 import socket
+import struct
+import zlib
 
 import six
 
 # websocket-client
 import websocket as ws
+from websocket._compression import permessage_deflate
 from websocket._handshake import _create_sec_websocket_key, \
-    _validate as _validate_header
+    _get_handshake_headers, _validate as _validate_header
 from websocket._http import read_headers
 from websocket._url import get_proxy_info, parse_url
-from websocket._utils import validate_utf8
+from websocket._utils import validate_utf8, decode_utf8
 
 if six.PY3:
     from base64 import decodebytes as base64decode
@@ -72,6 +75,21 @@ class SockMock(object):
         pass
 
 
+class RecvIntoSockMock(SockMock):
+
+    def __init__(self):
+        SockMock.__init__(self)
+        self.reads = []
+
+    def recv_into(self, buffer):
+        self.reads.append(len(buffer))
+        data = self.recv(len(buffer))
+        if not data:
+            return 0
+        buffer[:len(data)] = data
+        return len(data)
+
+
 class HeaderSockMock(SockMock):
 
     def __init__(self, fname):
@@ -257,6 +275,15 @@ class WebSocketTest(unittest.TestCase):
         data = sock.recv()
         self.assertEqual(data, "Hello")
 
+    def testRecvInvalidUtf8(self):
+        sock = ws.WebSocket()
+        s = sock.sock = SockMock()
+        s.add_packet(six.b("\x81\x02\xce\xba"))
+        self.assertEqual(sock.recv(), six.u("\u03ba") if six.PY3 else six.b("\xce\xba"))
+
+        s.add_packet(six.b("\x81\x03\xed\xa0\x80"))
+        self.assertRaises(ws.WebSocketPayloadException, sock.recv)
+
     @unittest.skipUnless(TEST_WITH_INTERNET, "Internet-requiring tests are disabled")
     def testIter(self):
         count = 2
@@ -291,6 +318,22 @@ class WebSocketTest(unittest.TestCase):
         with self.assertRaises(ws.WebSocketConnectionClosedException):
             sock.frame_buffer.recv_strict(1)
 
+    def testRecvLargeFrame(self):
+        sock = ws.WebSocket()
+        s = sock.sock = RecvIntoSockMock()
+        payload = six.b("x") * 100000
+        data = six.b("\x82\x7f") + struct.pack("!Q", len(payload)) + payload + six.b("\x81\x02hi")
+        for i in range(0, len(data), 30000):
+            s.add_packet(data[i:i + 30000])
+
+        self.assertEqual(sock.recv(), payload)
+        # after the header, the payload is received straight into a buffer
+        # that fits it
+        self.assertEqual(s.reads[1:], [100000 - (16384 - 10), 100000 - 30000 + 10, 100000 - 60000 + 10, 100000 - 90000 + 10])
+        self.assertEqual(sock.recv(), "hi")
+        # the buffer is kept for the next large frame
+        self.assertEqual(len(sock.frame_buffer.recv_buffer), 100000)
+
     def testRecvTimeout(self):
         sock = ws.WebSocket()
         s = sock.sock = SockMock()
@@ -385,6 +428,16 @@ class WebSocketTest(unittest.TestCase):
         with self.assertRaises(ws.WebSocketConnectionClosedException):
             sock.recv()
 
+    def testRecvWithManyFragments(self):
+        sock = ws.WebSocket()
+        s = sock.sock = SockMock()
+        fragments = [six.b("%04d" % i) for i in range(1000)]
+        for i, fragment in enumerate(fragments):
+            opcode = ws.ABNF.OPCODE_TEXT if i == 0 else ws.ABNF.OPCODE_CONT
+            fin = 0x80 if i == len(fragments) - 1 else 0
+            s.add_packet(struct.pack("!BB", fin | opcode, len(fragment)) + fragment)
+        self.assertEqual(sock.recv(), "".join("%04d" % i for i in range(1000)))
+
     def testRecvWithFragmentationAndControlFrame(self):
         sock = ws.WebSocket()
         sock.set_mask_key(create_mask_key)
@@ -549,6 +602,110 @@ class SockOptTest(unittest.TestCase):
         self.assertNotEqual(s.sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY), 0)
         s.close()
 
+def _compressed_frames(compressor, message, fragment_size):
+    data = compressor.compress(message) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    assert data.endswith(six.b("\x00\x00\xff\xff"))
+    data = data[:-4]
+    frames = []
+    for i in range(0, len(data), fragment_size):
+        first = 0x40 | ws.ABNF.OPCODE_TEXT if i == 0 else ws.ABNF.OPCODE_CONT
+        fin = 0x80 if i + fragment_size >= len(data) else 0
+        fragment = data[i:i + fragment_size]
+        frames.append(struct.pack("!BB", fin | first, len(fragment)) + fragment)
+    return frames
+
+
+class CompressionTest(unittest.TestCase):
+    def testOffer(self):
+        headers, _ = _get_handshake_headers("/", "host", 80, {"compression": True})
+        self.assertIn("Sec-WebSocket-Extensions: permessage-deflate", headers)
+
+        headers, _ = _get_handshake_headers("/", "host", 80, {"compression": {
+            "server_no_context_takeover": True, "client_max_window_bits": 10}})
+        self.assertIn("Sec-WebSocket-Extensions: permessage-deflate; "
+                      "server_no_context_takeover; client_max_window_bits=10", headers)
+
+        headers, _ = _get_handshake_headers("/", "host", 80, {})
+        self.assertFalse([h for h in headers if h.startswith("Sec-WebSocket-Extensions")])
+
+    def testAccept(self):
+        self.assertEqual(permessage_deflate.accept(None, True), None)
+
+        compression = permessage_deflate.accept(
+            "permessage-deflate; server_no_context_takeover; server_max_window_bits=10",
+            {"client_no_context_takeover": True})
+        self.assertTrue(compression.client_no_context_takeover)
+        self.assertTrue(compression.server_no_context_takeover)
+        self.assertEqual(compression.client_max_window_bits, 15)
+        self.assertEqual(compression.server_max_window_bits, 10)
+
+        for response, options in [
+                ("permessage-deflate", None),
+                ("x-webkit-deflate-frame", True),
+                ("permessage-deflate, permessage-deflate", True),
+                ("permessage-deflate; foo", True),
+                ("permessage-deflate; server_no_context_takeover=1", True),
+                ("permessage-deflate; client_max_window_bits=10", True),
+                ("permessage-deflate; client_max_window_bits=8", {"client_max_window_bits": 10}),
+                ("permessage-deflate; server_max_window_bits=16", True),
+                ("permessage-deflate", {"server_no_context_takeover": True})]:
+            self.assertRaises(ws.WebSocketException, permessage_deflate.accept, response, options)
+
+    def testSend(self):
+        sock = ws.WebSocket()
+        sock.set_mask_key(create_mask_key)
+        s = sock.sock = SockMock()
+        sock._set_compression(permessage_deflate())
+
+        decompressor = zlib.decompressobj(-15)
+        for message in ["Hello", "Hello"]:
+            sock.send(message)
+            frame = s.sent.pop()
+            self.assertEqual(six.byte2int(frame[0:1]), 0x80 | 0x40 | ws.ABNF.OPCODE_TEXT)
+            payload = ws.ABNF.mask(frame[2:6], frame[6:])
+            self.assertEqual(decompressor.decompress(payload + six.b("\x00\x00\xff\xff")), six.b(message))
+
+        # control frames aren't compressed
+        sock.ping("x")
+        self.assertEqual(six.byte2int(s.sent.pop()[0:1]), 0x80 | ws.ABNF.OPCODE_PING)
+
+    def testRecv(self):
+        sock = ws.WebSocket()
+        s = sock.sock = SockMock()
+        sock._set_compression(permessage_deflate())
+
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        messages = [six.u("h\u00e9llo ") * 100, six.u("h\u00e9llo ") * 100]
+        for message in messages:
+            for frame in _compressed_frames(compressor, message.encode("utf-8"), 7):
+                s.add_packet(frame)
+        # an uncompressed message
+        s.add_packet(six.b("\x81\x02hi"))
+
+        expected = messages + [six.u("hi")]
+        if six.PY2:
+            expected = [message.encode("utf-8") for message in expected]
+        self.assertEqual([sock.recv() for _ in range(3)], expected)
+
+    def testRecvNoContextTakeover(self):
+        sock = ws.WebSocket()
+        s = sock.sock = SockMock()
+        sock._set_compression(permessage_deflate(server_no_context_takeover=True))
+
+        for _ in range(2):
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            for frame in _compressed_frames(compressor, six.b("hello"), 100):
+                s.add_packet(frame)
+        self.assertEqual(sock.recv(), "hello")
+        self.assertEqual(sock.recv(), "hello")
+
+    def testRsv1NotNegotiated(self):
+        sock = ws.WebSocket()
+        s = sock.sock = SockMock()
+        s.add_packet(six.b("\xc1\x02hi"))
+        self.assertRaises(ws.WebSocketProtocolException, sock.recv)
+
+
 class UtilsTest(unittest.TestCase):
     def testUtf8Validator(self):
         state = validate_utf8(six.b('\xf0\x90\x80\x80'))
@@ -558,6 +715,24 @@ class UtilsTest(unittest.TestCase):
         state = validate_utf8(six.b(''))
         self.assertEqual(state, True)
 
+    def testDecodeUtf8(self):
+        self.assertEqual(decode_utf8(six.b('\xf0\x90\x80\x80')), six.u('\U00010000'))
+        self.assertEqual(decode_utf8(six.b('\xce\xba\xe1\xbd\xb9\xcf\x83\xce\xbc\xce\xb5\xed\xa0\x80edited')), None)
+        self.assertEqual(decode_utf8(six.b('\xce')), None)
+        self.assertEqual(decode_utf8(six.b('')), six.u(''))
+
+    def testMask(self):
+        key = six.b("abcd")
+        for length in [0, 1, 3, 4, 5, 127, 128, 65537]:
+            data = bytearray(os.urandom(length))
+            expected = bytearray(data)
+            for i in range(length):
+                expected[i] ^= bytearray(key)[i % 4]
+            masked = ws.ABNF.mask(key, six.binary_type(data))
+            self.assertEqual(masked, six.binary_type(expected))
+            self.assertEqual(ws.ABNF.mask(key, masked), six.binary_type(data))
+        self.assertEqual(ws.ABNF.mask("abcd", "Hello"), six.b(")\x07\x0f\x08\x0e"))
+
 class ProxyInfoTest(unittest.TestCase):
     def setUp(self):
         self.http_proxy = os.environ.get("http_proxy", None)
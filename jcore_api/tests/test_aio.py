@@ -0,0 +1,232 @@
+"""
+tests for _aio subpackage
+"""
+
+import sys
+import unittest
+import warnings
+
+if sys.version_info < (3, 5):
+    raise unittest.SkipTest("asyncio connections require Python 3.5+")
+
+import asyncio
+import base64
+import hashlib
+import json
+import socket
+from unittest import TestCase
+
+from jcore_api._protocol import CONNECT, CONNECTED, FAILED, METHOD, RESULT, GET_METADATA
+from jcore_api._aio import AsyncJCoreAPIConnection
+from jcore_api._aio._api import connect_async
+from jcore_api._aio._unix_socket import AsyncJCoreUnixSocket
+from jcore_api._aio._web_socket import AsyncJCoreWebSocket
+from jcore_api._unix_sockets._message_codec import encode_message
+from jcore_api._websocket_client.websocket._abnf import ABNF
+from jcore_api.exceptions import JCoreAPIAuthException, JCoreAPITimeoutException, \
+    JCoreAPIConnectionClosedException, JCoreAPIErrorResponseException
+
+token = "this is a test"
+
+class MockSock:
+    def __init__(self):
+        self.sent_queue = asyncio.Queue()
+        self.recv_queue = asyncio.Queue()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    async def send(self, message):
+        self.sent_queue.put_nowait(json.loads(message))
+
+    async def recv(self):
+        message = await self.recv_queue.get()
+        if isinstance(message, Exception):
+            raise message
+        return json.dumps(message)
+
+class MockWriter:
+    def __init__(self):
+        self.written = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.written += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+def _server_frame(data, opcode=ABNF.OPCODE_TEXT, fin=1):
+    frame = ABNF.create_frame(data.encode("utf-8"), opcode, fin)
+    frame.mask = 0
+    return frame.format()
+
+class TestAsyncAPI(TestCase):
+    def test_authenticate(self):
+        async def run():
+            sock = MockSock()
+            conn = AsyncJCoreAPIConnection(sock, timeout=0.5)
+            auth = asyncio.ensure_future(conn.authenticate(token))
+            sent = await sock.sent_queue.get()
+            self.assertEqual(sent, {'msg': CONNECT, 'token': token})
+            sock.recv_queue.put_nowait({'msg': CONNECTED})
+            await auth
+            self.assertTrue(conn._authenticated)
+            conn.close()
+        _run(run())
+
+    @unittest.skipIf(sys.version_info < (3, 7), "get_running_loop requires Python 3.7+")
+    def test_futures_use_running_loop(self):
+        async def run():
+            sock = MockSock()
+            conn = AsyncJCoreAPIConnection(sock, timeout=0.5)
+            auth = asyncio.ensure_future(conn.authenticate(token))
+            await sock.sent_queue.get()
+            self.assertIs(conn._auth_future.get_loop(), asyncio.get_running_loop())
+            sock.recv_queue.put_nowait({'msg': CONNECTED})
+            await auth
+
+            call = asyncio.ensure_future(conn.get_metadata())
+            message = await sock.sent_queue.get()
+            self.assertIs(conn._method_calls[message['id']].get_loop(), asyncio.get_running_loop())
+            sock.recv_queue.put_nowait({'msg': RESULT, 'id': message['id'], 'result': 'metadata'})
+            self.assertEqual((await call), 'metadata')
+            conn.close()
+        # newer Pythons deprecate getting the event loop when it isn't clear which one
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', DeprecationWarning)
+            _run(run())
+
+    def test_auth_failure(self):
+        async def run():
+            sock = MockSock()
+            conn = AsyncJCoreAPIConnection(sock, timeout=0.5)
+            auth = asyncio.ensure_future(conn.authenticate(token))
+            await sock.sent_queue.get()
+            sock.recv_queue.put_nowait({'msg': FAILED, 'error': 'bad token'})
+            with self.assertRaises(JCoreAPIAuthException):
+                await auth
+            self.assertFalse(conn._authenticated)
+            conn.close()
+        _run(run())
+
+    def test_pipelined_calls(self):
+        async def run():
+            sock = MockSock()
+            conn = AsyncJCoreAPIConnection(sock, auth_required=False, timeout=0.5)
+            calls = [asyncio.ensure_future(conn.get_metadata()) for _ in range(3)]
+            for i in range(3):
+                sent = await sock.sent_queue.get()
+                self.assertEqual(sent, {'msg': METHOD, 'id': str(i), 'method': GET_METADATA, 'params': []})
+            sock.recv_queue.put_nowait({'msg': RESULT, 'id': '2', 'result': 2})
+            sock.recv_queue.put_nowait({'msg': RESULT, 'id': '1', 'error': 'test error'})
+            sock.recv_queue.put_nowait({'msg': RESULT, 'id': '0', 'result': 0})
+            self.assertEqual((await calls[0]), 0)
+            self.assertEqual((await calls[2]), 2)
+            with self.assertRaises(JCoreAPIErrorResponseException):
+                await calls[1]
+            self.assertEqual(conn._method_calls, {})
+            conn.close()
+        _run(run())
+
+    def test_call_timeout(self):
+        async def run():
+            conn = AsyncJCoreAPIConnection(MockSock(), auth_required=False, timeout=0.01)
+            with self.assertRaises(JCoreAPITimeoutException):
+                await conn.get_metadata()
+            conn.close()
+        _run(run())
+
+    def test_connection_closed(self):
+        async def run():
+            sock = MockSock()
+            conn = AsyncJCoreAPIConnection(sock, auth_required=False, timeout=0.5)
+            call = asyncio.ensure_future(conn.get_metadata())
+            await sock.sent_queue.get()
+            sock.recv_queue.put_nowait(JCoreAPIConnectionClosedException('test'))
+            with self.assertRaises(JCoreAPIConnectionClosedException):
+                await call
+            self.assertTrue(conn._closed)
+            with self.assertRaises(JCoreAPIConnectionClosedException):
+                await conn.get_metadata()
+        _run(run())
+
+class TestAsyncSockets(TestCase):
+    def test_unix_socket(self):
+        async def run():
+            a, b = socket.socketpair()
+            reader, writer = await asyncio.open_unix_connection(sock=a)
+            sock = AsyncJCoreUnixSocket(reader, writer)
+            messages = ['hello', 'world' * 1000, '']
+            b.sendall(b''.join(encode_message(message) for message in messages))
+            for message in messages:
+                self.assertEqual((await sock.recv()), message)
+            await sock.send('test')
+            self.assertEqual(b.recv(100), encode_message('test'))
+            b.close()
+            with self.assertRaises(JCoreAPIConnectionClosedException):
+                await sock.recv()
+            sock.close()
+        _run(run())
+
+    def test_web_socket(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            writer = MockWriter()
+            sock = AsyncJCoreWebSocket(reader, writer)
+            reader.feed_data(_server_frame('hello'))
+            reader.feed_data(_server_frame('x' * 70000))
+            reader.feed_data(_server_frame('fragm', fin=0))
+            reader.feed_data(_server_frame('ented', ABNF.OPCODE_CONT))
+            self.assertEqual((await sock.recv()), 'hello')
+            self.assertEqual((await sock.recv()), 'x' * 70000)
+            self.assertEqual((await sock.recv()), 'fragmented')
+
+            await sock.send('test')
+            self.assertEqual(writer.written[0], 0x80 | ABNF.OPCODE_TEXT)
+            self.assertEqual(writer.written[1], 0x80 | 4)
+            mask = bytes(writer.written[2:6])
+            self.assertEqual(ABNF.mask(mask, bytes(writer.written[6:])), b'test')
+
+            reader.feed_eof()
+            with self.assertRaises(JCoreAPIConnectionClosedException):
+                await sock.recv()
+        _run(run())
+
+    def test_connect_auth_failure_closes(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            writer = MockWriter()
+            write = writer.write
+            def respond(data):
+                # accept the handshake, then reject the token
+                if not writer.written:
+                    key = data.decode('utf-8').split('Sec-WebSocket-Key: ')[1].split('\r\n')[0]
+                    accept = base64.b64encode(hashlib.sha1(
+                        (key + '258EAFA5-E914-47DA-95CA-C5AB0DC85B11').encode('utf-8')).digest())
+                    reader.feed_data(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                                     b'Connection: Upgrade\r\nSec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+                else:
+                    reader.feed_data(_server_frame(json.dumps({'msg': FAILED, 'error': 'bad token'})))
+                write(data)
+            writer.write = respond
+
+            async def create_socket(url):
+                return reader, writer
+            api_token = base64.b64encode(json.dumps({'url': 'ws://localhost:8080', 'token': token})
+                                         .encode('utf-8')).decode('utf-8')
+            with self.assertRaises(JCoreAPIAuthException):
+                await connect_async(api_token, create_socket, timeout=0.5)
+            self.assertTrue(writer.closed)
+        _run(run())
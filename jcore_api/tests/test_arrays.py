@@ -0,0 +1,39 @@
+"""
+tests for conversion of historical data to NumPy arrays
+"""
+
+import json
+import math
+from unittest import TestCase, skipIf
+
+from jcore_api import _arrays
+from jcore_api.exceptions import JCoreAPIInvalidMessageException
+
+@skipIf(_arrays.numpy is None, "numpy is not installed")
+class TestArrays(TestCase):
+    def check(self, text, t, v):
+        actual_t, actual_v = _arrays.parse_channel(text)
+        self.assertEqual(actual_t.dtype, _arrays.numpy.int64)
+        self.assertEqual(actual_v.dtype, _arrays.numpy.float64)
+        self.assertEqual(actual_t.tolist(), t)
+        self.assertEqual([None if math.isnan(x) else x for x in actual_v.tolist()], v)
+
+    def test_parse_channel(self):
+        t = [1462290600329, 1462290610506, 1462290620691]
+        v = [2.57063566, None, -4.5e-10]
+        self.check(json.dumps({'t': t, 'v': v}), t, v)
+        self.check(json.dumps({'v': v, 't': t}, indent=2), t, v)
+        self.check('{"t": [], "v": []}', [], [])
+        self.check('{"t":[1,2],"v":[true,false]}', [1, 2], [1.0, 0.0])
+        self.check('{"t":[1],"v":[1],"extra":"x"}', [1], [1.0])
+
+    def test_parse_channel_invalid(self):
+        self.assertRaises(ValueError, _arrays.parse_channel, '{"t":[1],"v":["hello"]}')
+        for text in ['{"t":[1,,2],"v":[1,2,3]}', '{"t":[1,2],"v":[1,,2]}', '{"t":[1,2],"v":[1,2,]}']:
+            self.assertRaises(JCoreAPIInvalidMessageException, _arrays.parse_channel, text)
+
+    def test_to_arrays(self):
+        t, v = _arrays.to_arrays([1, 2], [None, 3])
+        self.assertEqual(t.tolist(), [1, 2])
+        self.assertTrue(math.isnan(v[0]))
+        self.assertEqual(v[1], 3.0)
@@ -0,0 +1,49 @@
+"""
+tests for splitting historical data requests and merging their results
+"""
+
+from unittest import TestCase, skipIf
+
+from jcore_api import _arrays
+from jcore_api._historical import split_request, HistoricalDataMerger
+
+class TestHistorical(TestCase):
+    def test_split_request(self):
+        self.assertEqual(split_request(['a', 'b'], 0, 100), [(['a', 'b'], 0, 100)])
+        self.assertEqual(split_request(['a'], 0, 25, chunk_duration=10),
+                         [(['a'], 0, 10), (['a'], 10, 20), (['a'], 20, 25)])
+        self.assertEqual(split_request(['a'], 5, 5, chunk_duration=10), [(['a'], 5, 5)])
+        self.assertEqual(split_request(['a', 'b', 'c'], 0, 10, channels_per_request=2),
+                         [(['a', 'b'], 0, 10), (['c'], 0, 10)])
+
+    def test_split_request_iso_dates(self):
+        self.assertRaises(AssertionError, split_request, ['a'],
+                          '2016-05-03T15:50:00.000Z', '2016-05-03T16:10:00.000Z', chunk_duration=1000)
+        self.assertEqual(split_request(['a', 'b'], 'begin', 'end', channels_per_request=1),
+                         [(['a'], 'begin', 'end'), (['b'], 'begin', 'end')])
+
+    def test_merge(self):
+        merger = HistoricalDataMerger(0, 20)
+        merger.add({'data': {'a': {'t': [0, 5, 10], 'v': [1, 2, 3]}}})
+        merger.add({'data': {'b': {'t': [], 'v': []}}})
+        merger.add({'data': {'a': {'t': [10, 15], 'v': [3, 4]}, 'b': {'t': [12], 'v': [None]}}})
+        self.assertEqual(merger.result(), {
+            'beginTime': 0,
+            'endTime': 20,
+            'data': {
+                'a': {'t': [0, 5, 10, 15], 'v': [1, 2, 3, 4]},
+                'b': {'t': [12], 'v': [None]},
+            },
+        })
+
+    @skipIf(_arrays.numpy is None, "numpy is not installed")
+    def test_merge_arrays(self):
+        merger = HistoricalDataMerger(0, 20, as_arrays=True)
+        merger.add({'data': {'a': {'t': [0, 5, 10], 'v': [1, 2, 3]}, 'b': {'t': [], 'v': []}}})
+        merger.add({'data': {'a': {'t': [10, 15], 'v': [3, None]}}})
+        data = merger.result()['data']
+        self.assertEqual(data['a']['t'].tolist(), [0, 5, 10, 15])
+        self.assertEqual(data['a']['v'][:3].tolist(), [1.0, 2.0, 3.0])
+        self.assertTrue(_arrays.numpy.isnan(data['a']['v'][3]))
+        self.assertEqual(data['b']['t'].dtype, _arrays.numpy.int64)
+        self.assertEqual(len(data['b']['v']), 0)
@@ -0,0 +1,87 @@
+"""
+tests for the client-side historical data cache
+"""
+
+from unittest import TestCase
+
+from jcore_api import HistoricalDataCache
+
+class MockSource:
+    """
+    has a point every 10 ms for each channel, with the time as the value
+    """
+    def __init__(self):
+        self.requests = []
+
+    def get_historical_data(self, channelids, begintime, endtime, **kwargs):
+        self.requests.append((channelids, begintime, endtime))
+        t = [time for time in range(0, 1000, 10) if begintime <= time <= endtime]
+        return {
+            'beginTime': begintime,
+            'endTime': endtime,
+            'data': dict((channelid, {'t': t, 'v': list(t)}) for channelid in channelids),
+        }
+
+def expected(begintime, endtime):
+    t = [time for time in range(0, 1000, 10) if begintime <= time <= endtime]
+    return {'t': t, 'v': t}
+
+class TestHistoricalDataCache(TestCase):
+    def test_fetches_gaps(self):
+        source = MockSource()
+        cache = HistoricalDataCache(source)
+
+        result = cache.get_historical_data(['a', 'b'], 100, 200)
+        self.assertEqual(result['data'], {'a': expected(100, 200), 'b': expected(100, 200)})
+        self.assertEqual(source.requests, [(['a', 'b'], 100, 200)])
+
+        del source.requests[:]
+        result = cache.get_historical_data(['a', 'b'], 120, 180)
+        self.assertEqual(result['data'], {'a': expected(120, 180), 'b': expected(120, 180)})
+        self.assertEqual(source.requests, [])
+
+        result = cache.get_historical_data('a', 50, 250)
+        self.assertEqual(result, {'beginTime': 50, 'endTime': 250, 'data': {'a': expected(50, 250)}})
+        self.assertEqual(source.requests, [(['a'], 50, 100), (['a'], 200, 250)])
+
+        del source.requests[:]
+        cache.get_historical_data('a', 300, 400)
+        result = cache.get_historical_data(['a', 'b'], 0, 500)
+        self.assertEqual(result['data'], {'a': expected(0, 500), 'b': expected(0, 500)})
+        self.assertEqual(source.requests, [
+            (['a'], 300, 400),
+            (['a'], 0, 50),
+            (['a'], 250, 300),
+            (['a'], 400, 500),
+            (['b'], 0, 100),
+            (['b'], 200, 500),
+        ])
+        self.assertEqual(cache._channels['a'].intervals, [[0, 500]])
+
+        del source.requests[:]
+        self.assertEqual(cache.get_historical_data('a', 500, 500)['data'], {'a': expected(500, 500)})
+        self.assertEqual(source.requests, [])
+
+    def test_iso_dates_not_cached(self):
+        source = MockSource()
+        cache = HistoricalDataCache(source)
+        source.get_historical_data = lambda *args, **kwargs: args
+        self.assertEqual(cache.get_historical_data('a', 'begin', 'end'), ('a', 'begin', 'end'))
+        self.assertEqual(len(cache._channels), 0)
+
+    def test_evicts_least_recently_used(self):
+        source = MockSource()
+        cache = HistoricalDataCache(source, max_points=25)
+
+        cache.get_historical_data('a', 0, 90)
+        cache.get_historical_data('b', 0, 90)
+        cache.get_historical_data('a', 0, 90)
+        cache.get_historical_data('c', 0, 90)
+        self.assertEqual(list(cache._channels.keys()), ['a', 'c'])
+        self.assertEqual(cache._num_points, 20)
+
+        cache.invalidate('a')
+        self.assertEqual(list(cache._channels.keys()), ['c'])
+        self.assertEqual(cache._num_points, 10)
+        cache.invalidate()
+        self.assertEqual(cache._num_points, 0)
@@ -0,0 +1,73 @@
+"""
+tests for the on-disk historical data store
+"""
+
+import os
+import shutil
+import tempfile
+from unittest import TestCase, skipIf
+
+from jcore_api import HistoricalDataStore, _arrays
+from jcore_api.tests.test_historical_cache import MockSource, expected
+
+@skipIf(_arrays.numpy is None, "numpy is not installed")
+class TestHistoricalDataStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_fetches_gaps(self):
+        source = MockSource()
+        store = HistoricalDataStore(self.directory, source)
+
+        result = store.get_historical_data(['a', 'b^c'], 100, 200)
+        self.assertEqual(result, {'beginTime': 100, 'endTime': 200,
+                                  'data': {'a': expected(100, 200), 'b^c': expected(100, 200)}})
+        store.get_historical_data('a', 300, 400)
+
+        del source.requests[:]
+        result = store.get_historical_data('a', 0, 500, as_arrays=True)
+        self.assertEqual(result['data']['a']['t'].tolist(), expected(0, 500)['t'])
+        self.assertEqual(result['data']['a']['v'].tolist(), expected(0, 500)['v'])
+        self.assertEqual(source.requests, [(['a'], 0, 100), (['a'], 200, 300), (['a'], 400, 500)])
+
+        # a new store in the same directory doesn't need to fetch anything
+        del source.requests[:]
+        store = HistoricalDataStore(self.directory, source)
+        self.assertEqual(store.get_historical_data(['a', 'b^c'], 150, 200)['data'],
+                         {'a': expected(150, 200), 'b^c': expected(150, 200)})
+        self.assertEqual(source.requests, [])
+
+    def test_compact(self):
+        source = MockSource()
+        store = HistoricalDataStore(self.directory, source, max_segments=3)
+
+        for begin in [300, 100, 0]:
+            store.get_historical_data('a', begin, begin + 100)
+        self.assertEqual(len(store._index['a']['segments']), 3)
+
+        store.compact()
+        # 0 to 200 and 300 to 400, without the duplicate points at 100
+        self.assertEqual(store._index['a']['segments'], [[0, 400, 0, 32]])
+        t_path, v_path = store._paths('a')
+        self.assertEqual(os.path.getsize(t_path), 32 * 8)
+        self.assertEqual(store.get_historical_data('a', 0, 500)['data'], {'a': expected(0, 500)})
+        self.assertEqual(len(store._index['a']['segments']), 3)
+
+        # compacts automatically when there are more than max_segments
+        store.get_historical_data('a', 600, 700)
+        self.assertEqual(len(store._index['a']['segments']), 1)
+        self.assertEqual(store.get_historical_data('a', 0, 999)['data'], {'a': expected(0, 999)})
+
+    def test_invalidate(self):
+        source = MockSource()
+        store = HistoricalDataStore(self.directory, source)
+        store.get_historical_data('a', 0, 100)
+        t_path, v_path = store._paths('a')
+        self.assertTrue(os.path.exists(t_path))
+
+        store.invalidate('a')
+        self.assertFalse(os.path.exists(t_path))
+        self.assertEqual(HistoricalDataStore(self.directory, source)._index, {})
@@ -2,7 +2,7 @@ import json
 import threading
 import traceback
 import time
-from unittest import TestCase
+from unittest import TestCase, skipIf
 
 import six
 
@@ -11,9 +11,10 @@ if six.PY3:
 else:
     from Queue import Queue, Empty
 
-from jcore_api._protocol import CONNECT, CONNECTED, FAILED, METHOD, RESULT, \
-    GET_METADATA, SET_METADATA, GET_REAL_TIME_DATA, SET_REAL_TIME_DATA, GET_HISTORICAL_DATA
-from jcore_api import JCoreAPIConnection
+from jcore_api._protocol import CONNECT, CONNECTED, FAILED, METHOD, RESULT, REAL_TIME_DATA, \
+    GET_METADATA, SET_METADATA, GET_REAL_TIME_DATA, SET_REAL_TIME_DATA, GET_HISTORICAL_DATA, \
+    SUBSCRIBE_REAL_TIME_DATA, UNSUBSCRIBE_REAL_TIME_DATA
+from jcore_api import JCoreAPIConnection, _arrays
 from jcore_api.exceptions import JCoreAPIAuthException, JCoreAPITimeoutException, \
     JCoreAPIConnectionClosedException, JCoreAPIErrorResponseException, \
     JCoreAPIInvalidMessageException
@@ -54,6 +55,22 @@ class MockSock:
             raise message
         return json.dumps(message)
 
+class ChunkedMockSock(MockSock):
+    """
+    delivers each message in pieces of chunk_size, like JCoreUnixSocket.recv_chunk
+    """
+    def __init__(self, chunk_size):
+        MockSock.__init__(self)
+        self.chunk_size = chunk_size
+        self.chunks = []
+
+    def recv_chunk(self):
+        if not self.chunks:
+            text = self.recv()
+            self.chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or ['']
+        chunk = self.chunks.pop(0)
+        return chunk, not self.chunks
+
 class TestAPI(TestCase):
     def test_authenticate(self):
         sock = MockSock()
@@ -531,3 +548,491 @@ class TestAPI(TestCase):
         self.assertTrue(sock.closed)
         self.assertFalse(conn._authenticating)
         self.assertFalse(conn._authenticated)
+
+    def test_call_async(self):
+        sock = MockSock()
+        conn = JCoreAPIConnection(sock)
+
+        conn._authenticated = True
+
+        futures = [conn.get_metadata_async() for _ in range(3)]
+        for i in range(3):
+            self.assertEqual(sock.sent_queue.get(timeout=sock.timeout), {
+                             'msg': METHOD, 'id': str(i), 'method': GET_METADATA, 'params': []})
+
+        # respond out of order
+        sock.recv_queue.put_nowait({"msg": RESULT, 'id': '2', 'result': 2})
+        sock.recv_queue.put_nowait({"msg": RESULT, 'id': '0', 'result': 0})
+        sock.recv_queue.put_nowait({"msg": RESULT, 'id': '1', 'error': 'test_call_async'})
+
+        self.assertEqual(futures[0].result(sock.timeout), 0)
+        self.assertEqual(futures[2].result(sock.timeout), 2)
+        try:
+            futures[1].result(sock.timeout)
+            self.fail("future should have raised an exception")
+        except JCoreAPIErrorResponseException as e:
+            self.assertTrue('test_call_async' in e.args[0])
+
+        self.assertEqual(conn._method_calls, {})
+
+    def test_call_async_connection_closed(self):
+        sock = MockSock()
+        conn = JCoreAPIConnection(sock)
+
+        conn._authenticated = True
+
+        future = conn.get_historical_data_async('channel1', 10000, 20000)
+        conn.close()
+
+        try:
+            future.result(sock.timeout)
+            self.fail("future should have raised an exception")
+        except JCoreAPIConnectionClosedException:
+            pass
+
+    def test_close_before_call_registered(self):
+        sock = MockSock()
+        conn = JCoreAPIConnection(sock)
+        conn._authenticated = True
+
+        # close() finishes failing method calls after this call has checked the
+        # connection, but before it is registered
+        require_auth = conn._require_auth
+        def require_auth_then_close():
+            require_auth()
+            conn.close()
+        conn._require_auth = require_auth_then_close
+
+        self.assertRaises(JCoreAPIConnectionClosedException, conn.get_metadata_async)
+        self.assertEqual(conn._method_calls, {})
+        self.assertTrue(sock.sent_queue.empty())
+
+    def test_close_while_sending(self):
+        sock = MockSock()
+        conn = JCoreAPIConnection(sock)
+        conn._authenticated = True
+
+        # the call is registered, then the connection closes while it is being sent
+        send = sock.send
+        def close_then_send(message):
+            conn.close()
+            send(message)
+        sock.send = close_then_send
+
+        future = conn.get_metadata_async()
+        self.assertRaises(JCoreAPIConnectionClosedException, future.result, 0)
+        self.assertEqual(conn._method_calls, {})
+
+    def test_send_failure(self):
+        sock = MockSock()
+        conn = JCoreAPIConnection(sock)
+        conn._authenticated = True
+
+        def fail(message):
+            raise IOError("send failed")
+        sock.send = fail
+
+        streamed = []
+        self.assertRaises(IOError, conn._call_many_async,
+                          [(GET_METADATA, []), (GET_HISTORICAL_DATA, [])], [None, streamed.append])
+        self.assertEqual(conn._method_calls, {})
+        self.assertEqual(conn._streams, {})
+        self.assertFalse(conn._closed)
+
+        # the connection can still be used
+        del sock.send
+        future = conn.get_metadata_async()
+        message = sock.sent_queue.get(timeout=sock.timeout)
+        sock.recv_queue.put_nowait({'msg': RESULT, 'id': message['id'], 'result': 'metadata'})
+        self.assertEqual(future.result(sock.timeout), 'metadata')
+
+    def test_result_before_call_returns(self):
+        sock = MockSock()
+        conn = JCoreAPIConnection(sock)
+        conn._authenticated = True
+
+        # the receive thread resolves the call before call_async returns it
+        send = sock.send
+        def send_and_respond(message):
+            send(message)
+            _id = sock.sent_queue.get_nowait()['id']
+            sock.recv_queue.put_nowait({'msg': RESULT, 'id': _id, 'result': 'metadata'})
+            for _ in range(100):
+                if _id not in conn._method_calls:
+                    break
+                time.sleep(0.01)
+            self.assertFalse(_id in conn._method_calls)
+        sock.send = send_and_respond
+
+        future = conn.get_metadata_async()
+        self.assertTrue(future.done())
+        self.assertEqual(future.result(0), 'metadata')
+        self.assertEqual(conn._method_calls, {})
+        conn.close()
+
+    def test_batch(self):
+        sock = MockSock()
+        sent_batches = []
+        def send_many(messages):
+            sent_batches.append(len(messages))
+            for message in messages:
+                sock.send(message)
+        sock.send_many = send_many
+        conn = JCoreAPIConnection(sock)
+
+        conn._authenticated = True
+
+        def runsock():
+            for i in range(4):
+                message = sock.sent_queue.get(timeout=sock.timeout)
+                self.assertEqual(message['id'], str(i))
+                if message['method'] == GET_HISTORICAL_DATA:
+                    sock.recv_queue.put_nowait({"msg": RESULT, 'id': message['id'], 'error': 'test_batch'})
+                else:
+                    sock.recv_queue.put_nowait({"msg": RESULT, 'id': message['id'], 'result': message['method']})
+
+        thread = threading.Thread(target=runsock)
+        thread.daemon = True
+        thread.start()
+
+        results = conn.batch() \
+            .get_metadata() \
+            .get_real_time_data('channel1') \
+            .set_real_time_data({'channel1': 1}) \
+            .get_historical_data('channel1', 10000, 20000) \
+            .execute()
+        thread.join(1)
+
+        self.assertEqual(sent_batches, [4])
+        self.assertEqual(results[:3], [GET_METADATA, GET_REAL_TIME_DATA, None])
+        self.assertTrue(isinstance(results[3], JCoreAPIErrorResponseException))
+        self.assertEqual(conn._method_calls, {})
+
+    def test_batch_timeout(self):
+        sock = MockSock()
+        sock.timeout = 0.01
+        conn = JCoreAPIConnection(sock)
+
+        conn._authenticated = True
+
+        try:
+            conn.batch().get_metadata().get_real_time_data().execute()
+            self.fail("execute should have timed out")
+        except JCoreAPITimeoutException:
+            pass
+        self.assertEqual(conn._method_calls, {})
+
+    def test_get_historical_data_stream(self):
+        data = {
+            'channel1': {'t': [1, 2], 'v': [1.5, None]},
+            'channel2': {'t': [3], 'v': ['hello']},
+        }
+        expected = sorted((channelid, d['t'], d['v']) for channelid, d in data.items())
+
+        for sock in [MockSock(), ChunkedMockSock(1), ChunkedMockSock(10)]:
+            conn = JCoreAPIConnection(sock)
+            conn._authenticated = True
+
+            def runsock():
+                message = sock.sent_queue.get(timeout=sock.timeout)
+                # an unrelated message in between shouldn't be affected
+                sock.recv_queue.put_nowait({"msg": RESULT, 'id': '100', 'result': {'data': data}})
+                sock.recv_queue.put_nowait({"msg": RESULT, 'id': message['id'],
+                                            'result': {'beginTime': 1, 'endTime': 3, 'data': data}})
+
+            conn._on_unexpected_exception = swallow_exception
+            thread = threading.Thread(target=runsock)
+            thread.daemon = True
+            thread.start()
+
+            stream = conn.get_historical_data_stream(['channel1', 'channel2'], 1, 3)
+            self.assertEqual(sorted(stream), expected)
+            thread.join(1)
+
+            self.assertEqual(conn._method_calls, {})
+            self.assertEqual(conn._streams, {})
+            conn.close()
+
+    def test_get_historical_data_stream_error(self):
+        sock = ChunkedMockSock(3)
+        conn = JCoreAPIConnection(sock)
+        conn._authenticated = True
+
+        stream = conn.get_historical_data_stream('channel1', 1, 3)
+        sock.recv_queue.put_nowait({"msg": RESULT, 'id': '0', 'error': 'test_stream_error'})
+        try:
+            list(stream)
+            self.fail("stream should have raised an exception")
+        except JCoreAPIErrorResponseException as e:
+            self.assertTrue('test_stream_error' in e.args[0])
+
+    @skipIf(_arrays.numpy is None, "numpy is not installed")
+    def test_get_historical_data_as_arrays(self):
+        for sock in [MockSock(), ChunkedMockSock(5)]:
+            conn = JCoreAPIConnection(sock)
+            conn._authenticated = True
+
+            def runsock():
+                message = sock.sent_queue.get(timeout=sock.timeout)
+                sock.recv_queue.put_nowait({"msg": RESULT, 'id': message['id'], 'result': {
+                    'beginTime': 1, 'endTime': 3, 'data': {'channel1': {'t': [1, 2], 'v': [1.5, None]}}}})
+
+            thread = threading.Thread(target=runsock)
+            thread.daemon = True
+            thread.start()
+
+            result = conn.get_historical_data('channel1', 1, 3, as_arrays=True)
+            thread.join(1)
+
+            self.assertEqual((result['beginTime'], result['endTime']), (1, 3))
+            self.assertEqual(list(result['data'].keys()), ['channel1'])
+            self.assertEqual(result['data']['channel1']['t'].tolist(), [1, 2])
+            self.assertEqual(result['data']['channel1']['v'][0], 1.5)
+            self.assertTrue(_arrays.numpy.isnan(result['data']['channel1']['v'][1]))
+            conn.close()
+
+    def test_get_historical_data_chunked(self):
+        sock = MockSock()
+        conn = JCoreAPIConnection(sock)
+        conn._authenticated = True
+
+        requests = []
+        def runsock():
+            for i in range(6):
+                message = sock.sent_queue.get(timeout=sock.timeout)
+                params = message['params'][0]
+                requests.append((params['channelIds'], params['beginTime'], params['endTime']))
+                # each piece includes the points at both ends of its time range
+                data = dict((channelid, {
+                    't': list(range(params['beginTime'], params['endTime'] + 1, 5)),
+                    'v': [channelid] * (len(range(params['beginTime'], params['endTime'] + 1, 5))),
+                }) for channelid in params['channelIds'])
+                sock.recv_queue.put_nowait({"msg": RESULT, 'id': message['id'], 'result': {
+                    'beginTime': params['beginTime'], 'endTime': params['endTime'], 'data': data}})
+
+        thread = threading.Thread(target=runsock)
+        thread.daemon = True
+        thread.start()
+
+        result = conn.get_historical_data(['channel1', 'channel2', 'channel3'], 0, 25,
+                                          chunk_duration=10, channels_per_request=2, max_in_flight=2)
+        thread.join(1)
+
+        self.assertEqual(requests, [
+            (['channel1', 'channel2'], 0, 10),
+            (['channel3'], 0, 10),
+            (['channel1', 'channel2'], 10, 20),
+            (['channel3'], 10, 20),
+            (['channel1', 'channel2'], 20, 25),
+            (['channel3'], 20, 25),
+        ])
+        self.assertEqual((result['beginTime'], result['endTime']), (0, 25))
+        self.assertEqual(sorted(result['data'].keys()), ['channel1', 'channel2', 'channel3'])
+        for channelid, data in result['data'].items():
+            self.assertEqual(data['t'], [0, 5, 10, 15, 20, 25])
+            self.assertEqual(data['v'], [channelid] * 6)
+        self.assertEqual(conn._method_calls, {})
+        conn.close()
+
+    def test_get_historical_data_chunked_timeout(self):
+        sock = MockSock()
+        sock.timeout = 0.01
+        conn = JCoreAPIConnection(sock)
+        conn._authenticated = True
+
+        try:
+            conn.get_historical_data('channel1', 0, 100, chunk_duration=10)
+            self.fail("get_historical_data should have timed out")
+        except JCoreAPITimeoutException:
+            pass
+        self.assertEqual(sock.sent_queue.qsize(), 4)
+        self.assertEqual(conn._method_calls, {})
+        conn.close()
+
+    def test_subscribe_real_time_data(self):
+        sock = MockSock(autorespond=True)
+        conn = JCoreAPIConnection(sock)
+        conn._authenticated = True
+
+        def sent():
+            message = sock.sent_queue.get(timeout=sock.timeout)
+            return message['method'], message['params']
+
+        callback_updates = []
+        channel1 = conn.subscribe_real_time_data('channel1')
+        self.assertEqual(sent(), (SUBSCRIBE_REAL_TIME_DATA, [{'channelIds': ['channel1']}]))
+        channels12 = conn.subscribe_real_time_data(['channel1', 'channel2'])
+        self.assertEqual(sent(), (SUBSCRIBE_REAL_TIME_DATA, [{'channelIds': ['channel2']}]))
+        all_channels = conn.subscribe_real_time_data(callback=callback_updates.append)
+        self.assertEqual(sent(), (SUBSCRIBE_REAL_TIME_DATA, []))
+        # covered by the all-channels subscription
+        channel3 = conn.subscribe_real_time_data('channel3')
+        self.assertTrue(sock.sent_queue.empty())
+
+        sock.recv_queue.put_nowait({'msg': REAL_TIME_DATA, 'data': {'channel1': 1, 'channel3': 3}, 'timestamp': 't1'})
+        sock.recv_queue.put_nowait({'msg': REAL_TIME_DATA, 'data': {'channel2': 2}, 'timestamp': 't2'})
+
+        self.assertEqual(channel1.get(sock.timeout), {'data': {'channel1': 1}, 'timestamp': 't1'})
+        self.assertEqual(channels12.get(sock.timeout), {'data': {'channel1': 1}, 'timestamp': 't1'})
+        self.assertEqual(channels12.get(sock.timeout), {'data': {'channel2': 2}, 'timestamp': 't2'})
+        self.assertEqual(channel3.get(sock.timeout), {'data': {'channel3': 3}, 'timestamp': 't1'})
+        self.assertEqual(callback_updates, [
+            {'data': {'channel1': 1, 'channel3': 3}, 'timestamp': 't1'},
+            {'data': {'channel2': 2}, 'timestamp': 't2'},
+        ])
+        try:
+            channel1.get(0.01)
+            self.fail("get should have timed out")
+        except JCoreAPITimeoutException:
+            pass
+
+        # the all-channels subscription still needs channel2
+        channels12.close()
+        self.assertTrue(sock.sent_queue.empty())
+        self.assertEqual(list(channels12), [])
+        # unsubscribing from all channels ends the specific ones too, so they are resubscribed
+        all_channels.close()
+        self.assertEqual(sent(), (UNSUBSCRIBE_REAL_TIME_DATA, []))
+        self.assertEqual(sent(), (SUBSCRIBE_REAL_TIME_DATA, [{'channelIds': ['channel1', 'channel3']}]))
+        channel1.close()
+        self.assertEqual(sent(), (UNSUBSCRIBE_REAL_TIME_DATA, [{'channelIds': ['channel1']}]))
+        channel3.close()
+        self.assertEqual(sent(), (UNSUBSCRIBE_REAL_TIME_DATA, [{'channelIds': ['channel3']}]))
+        self.assertEqual(conn._subscriptions, ())
+        self.assertEqual(conn._subscription_counts, {})
+        conn.close()
+
+    def test_close_subscription_from_callback(self):
+        errors = []
+        sock = MockSock(autorespond=True)
+        conn = JCoreAPIConnection(sock, on_async_error=errors.append)
+        conn._authenticated = True
+
+        closed = threading.Event()
+        def callback(update):
+            subscription.close()
+            closed.set()
+        subscription = conn.subscribe_real_time_data('channel1', callback=callback)
+        sock.sent_queue.get(timeout=sock.timeout)
+
+        sock.autorespond = False
+        sock.recv_queue.put_nowait({'msg': REAL_TIME_DATA, 'data': {'channel1': 1}, 'timestamp': 't1'})
+        # close returns without waiting for the server to respond
+        self.assertTrue(closed.wait(sock.timeout / 2))
+        message = sock.sent_queue.get(timeout=sock.timeout)
+        self.assertEqual(message['method'], UNSUBSCRIBE_REAL_TIME_DATA)
+
+        sock.recv_queue.put_nowait({'msg': RESULT, 'id': message['id'], 'error': {'message': 'failed'}})
+        for _ in range(100):
+            if errors:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], JCoreAPIErrorResponseException)
+        conn.close()
+
+    def test_subscription_connection_closed(self):
+        sock = MockSock(autorespond=True)
+        conn = JCoreAPIConnection(sock)
+        conn._authenticated = True
+
+        subscription = conn.subscribe_real_time_data('channel1')
+        sock.recv_queue.put_nowait({'msg': REAL_TIME_DATA, 'data': {'channel1': 1}, 'timestamp': 't1'})
+        updates = []
+        try:
+            for update in subscription:
+                updates.append(update)
+                conn.close()
+            self.fail("iteration should have raised an exception")
+        except JCoreAPIConnectionClosedException:
+            pass
+        self.assertEqual(updates, [{'data': {'channel1': 1}, 'timestamp': 't1'}])
+        subscription.close()
+
+    def test_set_without_waiting(self):
+        errors = []
+        sock = MockSock()
+        conn = JCoreAPIConnection(sock, on_async_error=errors.append)
+        conn._authenticated = True
+
+        conn.set_real_time_data({'channel1': 1}, wait=False)
+        conn.set_metadata({'channel1': {'name': 'Channel 1'}}, wait=False)
+        self.assertEqual(sock.sent_queue.get(timeout=sock.timeout)['method'], SET_REAL_TIME_DATA)
+        self.assertEqual(sock.sent_queue.get(timeout=sock.timeout)['method'], SET_METADATA)
+
+        sock.recv_queue.put_nowait({"msg": RESULT, 'id': '1', 'error': 'test_set_without_waiting'})
+        sock.recv_queue.put_nowait({"msg": RESULT, 'id': '0'})
+        for i in range(50):
+            if errors and not conn._method_calls:
+                break
+            time.sleep(0.01)
+        self.assertEqual(conn._method_calls, {})
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(isinstance(errors[0], JCoreAPIErrorResponseException))
+        self.assertTrue('test_set_without_waiting' in errors[0].args[0])
+        conn.close()
+
+    def test_metadata_cache(self):
+        sock = MockSock()
+        conn = JCoreAPIConnection(sock, metadata_cache=True)
+        conn._authenticated = True
+
+        metadata = {'channel1': {'name': 'Channel 1'}, 'channel2': {'name': 'Channel 2'}}
+        requests = []
+        def runsock():
+            while True:
+                try:
+                    message = sock.sent_queue.get(timeout=sock.timeout)
+                except Empty:
+                    return
+                params = message['params']
+                requests.append((message['method'], params))
+                if message['method'] == GET_METADATA:
+                    channelids = params[0]['channelIds'] if params else list(metadata.keys())
+                    result = dict((c, metadata[c]) for c in channelids if c in metadata)
+                else:
+                    result = None
+                sock.recv_queue.put_nowait({"msg": RESULT, 'id': message['id'], 'result': result})
+
+        thread = threading.Thread(target=runsock)
+        thread.daemon = True
+        thread.start()
+
+        self.assertEqual(conn.get_metadata('channel1'), {'channel1': {'name': 'Channel 1'}})
+        self.assertEqual(conn.get_metadata(['channel1', 'channel2']), metadata)
+        self.assertEqual(conn.get_metadata('channel2'), {'channel2': {'name': 'Channel 2'}})
+        self.assertEqual(requests, [
+            (GET_METADATA, [{'channelIds': ['channel1']}]),
+            (GET_METADATA, [{'channelIds': ['channel2']}]),
+        ])
+
+        del requests[:]
+        self.assertEqual(conn.get_metadata(), metadata)
+        self.assertEqual(conn.get_metadata(), metadata)
+        # all channels are cached, so channel3 must not exist
+        self.assertEqual(conn.get_metadata(['channel1', 'channel3']), {'channel1': {'name': 'Channel 1'}})
+        self.assertEqual(requests, [(GET_METADATA, [])])
+
+        del requests[:]
+        conn.set_metadata({'channel1': {'units': 'V'}})
+        self.assertEqual(conn.get_metadata('channel1'), {'channel1': {'name': 'Channel 1', 'units': 'V'}})
+        self.assertEqual(requests, [(SET_METADATA, [{'channel1': {'units': 'V'}}])])
+
+        # setting metadata for a new channel means the cache no longer has all channels
+        del requests[:]
+        metadata['channel3'] = {'name': 'Channel 3'}
+        conn.set_metadata({'channel3': {'name': 'Channel 3'}})
+        self.assertEqual(conn.get_metadata(['channel1', 'channel3']),
+                         {'channel1': {'name': 'Channel 1', 'units': 'V'}, 'channel3': {'name': 'Channel 3'}})
+        self.assertEqual(requests[1:], [(GET_METADATA, [{'channelIds': ['channel3']}])])
+
+        del requests[:]
+        conn.invalidate_metadata('channel1')
+        self.assertEqual(conn.get_metadata('channel1'), {'channel1': {'name': 'Channel 1'}})
+        self.assertEqual(requests, [(GET_METADATA, [{'channelIds': ['channel1']}])])
+
+        del requests[:]
+        conn._metadata_cache._ttl = 0
+        conn.get_metadata('channel1')
+        self.assertEqual(requests, [(GET_METADATA, [{'channelIds': ['channel1']}])])
+        conn.close()
@@ -0,0 +1,145 @@
+"""
+tests for the connection pool
+"""
+
+import threading
+
+from unittest import TestCase
+
+from jcore_api import JCoreAPIConnection, JCoreAPIConnectionPool
+from jcore_api._protocol import GET_METADATA, RESULT
+from jcore_api.exceptions import JCoreAPIConnectionClosedException
+from jcore_api.tests.test_jcore_api import MockSock
+
+class TestPool(TestCase):
+    def setUp(self):
+        self.socks = []
+
+    def create_connection(self):
+        sock = MockSock()
+        self.socks.append(sock)
+        connection = JCoreAPIConnection(sock, auth_required=False)
+        return connection
+
+    def test_dispatches_to_least_busy(self):
+        pool = JCoreAPIConnectionPool(self.create_connection, size=3)
+        self.assertEqual(len(pool), 3)
+
+        futures = [pool.get_metadata_async() for _ in range(6)]
+        self.assertFalse(any(future.done() for future in futures))
+        self.assertEqual([len(c._method_calls) for c in pool._connections], [2, 2, 2])
+        for connection in pool._connections:
+            self.assertEqual(sum(future in connection._method_calls.values() for future in futures), 2)
+        for sock in self.socks:
+            self.assertEqual(sock.sent_queue.qsize(), 2)
+            self.assertEqual(sock.sent_queue.get_nowait()['method'], GET_METADATA)
+
+        pool._connections[0]._method_calls.clear()
+        pool._connections[2]._method_calls.clear()
+        pool.get_metadata_async()
+        pool.get_metadata_async()
+        self.assertEqual([len(c._method_calls) for c in pool._connections], [1, 2, 1])
+        pool.close()
+        self.assertTrue(all(sock.closed for sock in self.socks))
+        self.assertRaises(JCoreAPIConnectionClosedException, pool.get_metadata_async)
+
+    def test_replaces_closed_connections(self):
+        pool = JCoreAPIConnectionPool(self.create_connection, size=2)
+        dead = pool._connections[0]
+        dead.close()
+
+        pool.get_metadata_async()
+        self.assertEqual(len(self.socks), 3)
+        self.assertFalse(dead in pool._connections)
+        self.assertEqual(sum(len(c._method_calls) for c in pool._connections), 1)
+
+        # if a replacement can't be created, the other connections are still used
+        def fail():
+            raise JCoreAPIConnectionClosedException("can't connect")
+        pool._create_connection = fail
+        pool._connections[0].close()
+        pool.get_metadata_async()
+        pool._connections[1].close()
+        self.assertRaises(JCoreAPIConnectionClosedException, pool.get_metadata_async)
+        pool.close()
+
+    def test_backs_off_replacing(self):
+        pool = JCoreAPIConnectionPool(self.create_connection, size=2, initial_delay=60)
+        attempts = []
+        def fail():
+            attempts.append(1)
+            raise JCoreAPIConnectionClosedException("can't connect")
+        pool._create_connection = fail
+        pool._connections[0].close()
+
+        pool.get_metadata_async()
+        pool.get_metadata_async()
+        # the second call doesn't try again until the delay has passed
+        self.assertEqual(len(attempts), 1)
+        self.assertEqual(len(pool._connections[1]._method_calls), 2)
+
+        pool._retry_times[0] = 0
+        pool._create_connection = self.create_connection
+        pool.get_metadata_async()
+        self.assertEqual(pool._failures, [0, 0])
+        self.assertFalse(pool._connections[0]._closed)
+        pool.close()
+
+    def test_one_thread_replaces_each_connection(self):
+        pool = JCoreAPIConnectionPool(self.create_connection, size=2)
+        started = threading.Event()
+        proceed = threading.Event()
+        def create_slowly():
+            started.set()
+            proceed.wait(5)
+            return self.create_connection()
+        pool._create_connection = create_slowly
+        pool._connections[0].close()
+
+        thread = threading.Thread(target=pool.get_metadata_async)
+        thread.start()
+        self.assertTrue(started.wait(5))
+        # meanwhile, other calls skip the connection being replaced
+        started.clear()
+        pool.get_metadata_async()
+        self.assertFalse(started.is_set())
+        self.assertEqual(len(pool._connections[1]._method_calls), 1)
+
+        proceed.set()
+        thread.join(5)
+        self.assertEqual(len(self.socks), 3)
+        self.assertFalse(pool._connections[0]._closed)
+        pool.close()
+
+    def test_set_metadata_invalidates_other_caches(self):
+        def create_connection():
+            sock = MockSock(autorespond=True)
+            self.socks.append(sock)
+            return JCoreAPIConnection(sock, auth_required=False, metadata_cache=True)
+        pool = JCoreAPIConnectionPool(create_connection, size=2)
+        for connection in pool._connections:
+            connection._metadata_cache.put({'channel1': {'name': 'old'}, 'channel2': {'name': 'old'}})
+
+        pool.set_metadata({'channel1': {'name': 'new'}})
+        setter, other = pool._connections
+        self.assertTrue(self.socks[1].sent_queue.empty())
+        self.assertEqual(setter._metadata_cache.get(['channel1']), ({'channel1': {'name': 'new'}}, []))
+
+        # the other connection fetches the channel again rather than returning the old metadata
+        sock = self.socks[1]
+        sock.autorespond = False
+        send = sock.send
+        def respond(message):
+            send(message)
+            sock.recv_queue.put_nowait({'msg': RESULT, 'id': sock.sent_queue.get_nowait()['id'],
+                                        'result': {'channel1': {'name': 'new'}}})
+        sock.send = respond
+        self.assertEqual(other.get_metadata(['channel1', 'channel2']),
+                         {'channel1': {'name': 'new'}, 'channel2': {'name': 'old'}})
+
+        sock.send = send
+        sock.autorespond = True
+        pool.set_metadata_async({'channel2': {'name': 'new'}}).result(1)
+        for connection in pool._connections:
+            self.assertEqual(connection._metadata_cache.get(['channel2']), ({}, ['channel2']))
+        pool.close()
@@ -0,0 +1,60 @@
+"""
+tests for the client-side real-time data mirror
+"""
+
+from unittest import TestCase
+
+from jcore_api import RealTimeDataMirror
+
+class MockConnection:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.subscriptions = []
+
+    def get_real_time_data(self, channelids=None):
+        return self.responses.pop(0)
+
+    def subscribe_real_time_data(self, channelids=None, callback=None):
+        self.subscriptions.append((channelids, callback))
+        return 'subscription'
+
+class TestRealTimeDataMirror(TestCase):
+    def test_changed_since(self):
+        mirror = RealTimeDataMirror()
+        self.assertEqual(mirror.changed_since(0), (0, {}))
+
+        v1 = mirror.apply({'data': {'a': 1, 'b': 2, 'c': float('nan')}, 'timestamp': 't1'})
+        self.assertEqual(v1, 1)
+        self.assertEqual(mirror.timestamp, 't1')
+        self.assertEqual(mirror.changed_since(0)[1].keys(), set(['a', 'b', 'c']))
+
+        v2 = mirror.apply({'data': {'a': 1, 'b': 3, 'c': float('nan')}, 'timestamp': 't2'})
+        self.assertEqual(v2, 2)
+        self.assertEqual(mirror.changed_since(v1), (2, {'b': 3}))
+
+        # nothing changed, so the version stays the same
+        self.assertEqual(mirror.apply({'data': {'a': 1}, 'timestamp': 't3'}), 2)
+        self.assertEqual(mirror.timestamp, 't3')
+        self.assertEqual(mirror.changed_since(v2), (2, {}))
+
+        mirror.apply({'data': {'a': 4, 'd': None}})
+        self.assertEqual(mirror.changed_since(v1), (3, {'a': 4, 'b': 3, 'd': None}))
+        self.assertEqual(mirror.get('a'), 4)
+        self.assertEqual(mirror.get('e', 'default'), 'default')
+        self.assertEqual(mirror.values()['b'], 3)
+
+    def test_refresh_and_subscribe(self):
+        connection = MockConnection([
+            {'data': {'a': 1, 'b': 2}, 'timestamp': 't1'},
+            {'data': {'a': 1, 'b': 5}, 'timestamp': 't2'},
+        ])
+        mirror = RealTimeDataMirror()
+        version = mirror.refresh(connection)
+        self.assertEqual(mirror.refresh(connection, ['a', 'b']), version + 1)
+        self.assertEqual(mirror.changed_since(version), (version + 1, {'b': 5}))
+
+        self.assertEqual(mirror.subscribe(connection, 'a'), 'subscription')
+        channelids, callback = connection.subscriptions[0]
+        self.assertEqual(channelids, 'a')
+        callback({'data': {'a': 2}, 'timestamp': 't3'})
+        self.assertEqual(mirror.get('a'), 2)
@@ -0,0 +1,100 @@
+"""
+tests for the real-time data write buffer
+"""
+
+import threading
+import time
+from unittest import TestCase
+
+from jcore_api import JCoreAPIConnection, JCoreAPIConnectionPool, RealTimeDataWriter
+from jcore_api._protocol import METHOD, RESULT, SET_REAL_TIME_DATA
+from jcore_api.exceptions import JCoreAPIErrorResponseException, JCoreAPIConnectionClosedException
+from jcore_api.tests.test_jcore_api import MockSock
+
+class TestRealTimeDataWriter(TestCase):
+    def setUp(self):
+        self.sock = MockSock(autorespond=True)
+        self.conn = JCoreAPIConnection(self.sock)
+        self.conn._authenticated = True
+
+    def tearDown(self):
+        self.conn.close()
+
+    def sent(self):
+        sent = []
+        while not self.sock.sent_queue.empty():
+            message = self.sock.sent_queue.get_nowait()
+            self.assertEqual((message['msg'], message['method']), (METHOD, SET_REAL_TIME_DATA))
+            sent.append(message['params'][0])
+        return sent
+
+    def test_coalesces(self):
+        writer = RealTimeDataWriter(self.conn, flush_interval=10)
+        for i in range(100):
+            writer.set({'channel1': i})
+            writer.set({'channel2': -i})
+        self.assertEqual(self.sent(), [])
+        writer.flush()
+        self.assertEqual(self.sent(), [{'channel1': 99, 'channel2': -99}])
+        writer.close()
+        self.assertEqual(self.sent(), [])
+        self.assertRaises(JCoreAPIConnectionClosedException, writer.set, {'channel1': 0})
+
+    def test_flushes_on_interval(self):
+        writer = RealTimeDataWriter(self.conn, flush_interval=0.02)
+        writer.set({'channel1': 1})
+        message = self.sock.sent_queue.get(timeout=self.sock.timeout)
+        self.assertEqual(message['params'], [{'channel1': 1}])
+        writer.close()
+
+    def test_flushes_when_full(self):
+        writer = RealTimeDataWriter(self.conn, flush_interval=10, max_pending=2)
+        writer.set({'channel1': 1})
+        writer.set({'channel1': 2})
+        self.assertEqual(self.sent(), [])
+        writer.set({'channel2': 3})
+        self.assertEqual(self.sent(), [{'channel1': 2, 'channel2': 3}])
+        writer.close()
+
+    def test_back_pressure(self):
+        self.sock.autorespond = False
+        writer = RealTimeDataWriter(self.conn, flush_interval=10, max_pending=1, max_in_flight=2)
+        writer.set({'channel1': 1})
+        writer.set({'channel1': 2})
+        self.assertEqual(len(self.sent()), 2)
+
+        def respond():
+            time.sleep(0.05)
+            self.sock.recv_queue.put_nowait({'msg': RESULT, 'id': '0'})
+        thread = threading.Thread(target=respond)
+        thread.start()
+        writer.set({'channel1': 3})
+        thread.join()
+        self.assertEqual(self.sent(), [{'channel1': 3}])
+        self.assertEqual(writer._in_flight, 2)
+
+    def test_error(self):
+        self.sock.autorespond = False
+        writer = RealTimeDataWriter(self.conn, flush_interval=10)
+        writer.set({'channel1': 1})
+        writer._flush()
+        self.sock.recv_queue.put_nowait({'msg': RESULT, 'id': '0', 'error': 'test_error'})
+        self.assertRaises(JCoreAPIErrorResponseException, writer.flush)
+        writer.close()
+
+    def test_pool(self):
+        socks = []
+        def create_connection():
+            socks.append(MockSock(autorespond=True))
+            return JCoreAPIConnection(socks[-1], auth_required=False)
+        pool = JCoreAPIConnectionPool(create_connection, size=2)
+        writer = RealTimeDataWriter(pool, flush_interval=10, max_pending=2)
+        writer.set({'channel1': 1, 'channel2': 2})
+        writer.set({'channel3': 3})
+        writer.close()
+        sent = []
+        for sock in socks:
+            while not sock.sent_queue.empty():
+                sent.append(sock.sent_queue.get_nowait()['params'][0])
+        self.assertEqual(sorted(sent, key=len), [{'channel3': 3}, {'channel1': 1, 'channel2': 2}])
+        pool.close()
@@ -0,0 +1,142 @@
+"""
+tests for the reconnecting connection wrapper
+"""
+
+import threading
+
+from unittest import TestCase
+
+from jcore_api import JCoreAPIConnection, ReconnectingJCoreAPIConnection
+from jcore_api._protocol import RESULT
+from jcore_api.exceptions import JCoreAPIConnectionClosedException
+from jcore_api.tests.test_jcore_api import MockSock
+
+class TestReconnecting(TestCase):
+    def setUp(self):
+        self.socks = []
+        self.failures = 0
+        # if set, new connections respond to each call with (result,)
+        self.response = None
+
+    def create_connection(self):
+        if self.failures:
+            self.failures -= 1
+            raise JCoreAPIConnectionClosedException("can't connect")
+        sock = MockSock()
+        self.socks.append(sock)
+        if self.response:
+            self.respond_on_send(sock, self.response[0])
+        return JCoreAPIConnection(sock, auth_required=False)
+
+    def drop_on_send(self, sock):
+        """
+        closes the connection as soon as a message is sent on it, like a dropped socket
+        """
+        def send(message):
+            sock.recv_queue.put_nowait(JCoreAPIConnectionClosedException("connection dropped"))
+        sock.send = send
+
+    def respond_on_send(self, sock, result):
+        send = sock.send
+        def respond(message):
+            send(message)
+            message = sock.sent_queue.get_nowait()
+            sock.recv_queue.put_nowait({'msg': RESULT, 'id': message['id'], 'result': result})
+        sock.send = respond
+
+    def test_retries_gets(self):
+        conn = ReconnectingJCoreAPIConnection(self.create_connection, initial_delay=0.001)
+        dropped = conn._connection
+        self.drop_on_send(self.socks[0])
+        self.failures = 2
+
+        self.response = ('metadata',)
+
+        self.assertEqual(conn.get_metadata(), 'metadata')
+        self.assertEqual(len(self.socks), 2)
+        self.assertTrue(dropped._closed)
+        conn.close()
+        self.assertTrue(self.socks[1].closed)
+        self.assertRaises(JCoreAPIConnectionClosedException, conn.get_metadata)
+
+    def test_retries_gets_async(self):
+        conn = ReconnectingJCoreAPIConnection(self.create_connection, initial_delay=0.001)
+        self.drop_on_send(self.socks[0])
+
+        self.response = ('data',)
+
+        self.assertEqual(conn.get_real_time_data_async().result(1), 'data')
+        conn.close()
+
+    def test_resubmits_from_one_thread(self):
+        conn = ReconnectingJCoreAPIConnection(self.create_connection, initial_delay=0.001)
+        self.failures = 2
+
+        futures = [conn.get_real_time_data_async() for _ in range(50)]
+        threads = threading.active_count()
+        self.response = ('data',)
+        conn._connection.close()
+
+        self.assertEqual([future.result(1) for future in futures], ['data'] * 50)
+        self.assertLessEqual(threading.active_count(), threads + 1)
+        self.assertEqual(len(self.socks), 2)
+        self.assertFalse(conn._resubmitting)
+        conn.close()
+
+    def test_resubmit_gives_up(self):
+        conn = ReconnectingJCoreAPIConnection(self.create_connection, max_attempts=2, initial_delay=0.001)
+        futures = [conn.get_metadata_async() for _ in range(10)]
+        self.failures = 10
+        # all of the calls fail before the reconnect thread can connect
+        conn._lock.acquire()
+        conn._connection.close()
+        conn._lock.release()
+
+        for future in futures:
+            self.assertRaises(JCoreAPIConnectionClosedException, future.result, 1)
+        # only one thread tried to reconnect, for all of the calls
+        self.assertEqual(self.failures, 8)
+        conn.close()
+
+    def test_limits_retries(self):
+        # every connection drops as soon as a call is sent on it
+        def create_connection():
+            connection = self.create_connection()
+            self.drop_on_send(self.socks[-1])
+            return connection
+        conn = ReconnectingJCoreAPIConnection(create_connection, max_attempts=3, initial_delay=0.001)
+        self.assertRaises(JCoreAPIConnectionClosedException, conn.get_metadata)
+        self.assertEqual(len(self.socks), 3)
+
+        future = conn.get_real_time_data_async()
+        self.assertRaises(JCoreAPIConnectionClosedException, future.result, 1)
+        self.assertEqual(len(self.socks), 6)
+        conn.close()
+
+    def test_fails_sets(self):
+        conn = ReconnectingJCoreAPIConnection(self.create_connection, initial_delay=0.001)
+        self.drop_on_send(self.socks[0])
+        self.assertRaises(JCoreAPIConnectionClosedException, conn.set_real_time_data, {'channel1': 1})
+
+        # the next call reconnects
+        self.response = (None,)
+        conn.set_real_time_data({'channel1': 1})
+        self.assertEqual(len(self.socks), 2)
+        conn.close()
+
+    def test_retries_sets(self):
+        conn = ReconnectingJCoreAPIConnection(self.create_connection, retry_sets=True, initial_delay=0.001)
+        self.drop_on_send(self.socks[0])
+
+        self.response = (None,)
+
+        conn.set_real_time_data({'channel1': 1})
+        self.assertEqual(len(self.socks), 2)
+        conn.close()
+
+    def test_gives_up(self):
+        conn = ReconnectingJCoreAPIConnection(self.create_connection, max_attempts=3, initial_delay=0.001)
+        conn._connection.close()
+        self.failures = 3
+        self.assertRaises(JCoreAPIConnectionClosedException, conn.get_metadata)
+        self.assertEqual(self.failures, 0)
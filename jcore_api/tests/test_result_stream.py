@@ -0,0 +1,68 @@
+"""
+tests for incremental parsing of result messages
+"""
+
+import json
+from unittest import TestCase
+
+import six
+
+from jcore_api._result_stream import ResultStreamParser
+from jcore_api.exceptions import JCoreAPIInvalidMessageException
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+data = {
+    six.u('channel1'): {six.u('t'): [1, 2, 3], six.u('v'): [1.5, None, -2e10]},
+    six.u('chan "2"\\ é'): {six.u('t'): [4], six.u('v'): [six.u('{[str}]"')]},
+    six.u('channel3'): {six.u('t'): [], six.u('v'): []},
+}
+
+message = {
+    six.u('msg'): six.u('result'),
+    six.u('id'): six.u('1'),
+    six.u('result'): {six.u('beginTime'): 1, six.u('data'): data, six.u('endTime'): 4},
+}
+
+class TestResultStreamParser(TestCase):
+    def parse(self, text, size, streamed_ids=(six.u('1'),)):
+        channels = {}
+        def on_channel(channelid, text):
+            channels[channelid] = json.loads(text)
+        parser = ResultStreamParser(lambda _id: on_channel if _id in streamed_ids else None)
+        for chunk in _chunks(text, size):
+            parser.feed(chunk)
+        return parser.close(), channels
+
+    def test_streams_channels(self):
+        text = json.dumps(message, indent=1)
+        for size in [1, 2, 7, 100, len(text)]:
+            parsed, channels = self.parse(text, size)
+            self.assertEqual(channels, data)
+            self.assertEqual(parsed, {
+                six.u('msg'): six.u('result'),
+                six.u('id'): six.u('1'),
+                six.u('result'): {six.u('beginTime'): 1, six.u('endTime'): 4},
+            })
+
+    def test_other_ids_are_not_streamed(self):
+        text = json.dumps(message, separators=(',', ':'))
+        for size in [1, 3, len(text)]:
+            parsed, channels = self.parse(text, size, streamed_ids=())
+            self.assertEqual(channels, {})
+            self.assertEqual(parsed, message)
+
+    def test_error_result(self):
+        error = {six.u('msg'): six.u('result'), six.u('id'): six.u('1'), six.u('error'): six.u('oops')}
+        parsed, channels = self.parse(json.dumps(error), 5)
+        self.assertEqual(parsed, error)
+        self.assertEqual(channels, {})
+
+    def test_invalid(self):
+        for text in ['[1, 2]', '{"msg": "result", "id" "1"}', '{"msg": "result", "id": tru}', '{"msg": "res']:
+            try:
+                self.parse(text, 4)
+                self.fail("parse should have raised an exception for " + text)
+            except JCoreAPIInvalidMessageException:
+                pass
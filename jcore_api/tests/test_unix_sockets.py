@@ -9,10 +9,12 @@ from unittest import TestCase
 import six
 
 from collections import deque
-from threading import Lock, Condition
+from threading import Lock, Condition, Event
 
-from jcore_api._unix_sockets._message_codec import encode_message, MessageDecoder
+from jcore_api._unix_sockets._message_codec import encode_message, MessageDecoder, HEADER_LEN
 from jcore_api._unix_sockets._jcore_unix_socket import JCoreUnixSocket
+from jcore_api._connection import JCoreAPIConnection
+from jcore_api.exceptions import JCoreAPIConnectionClosedException
 
 def _random_string(length):
     return six.u(''.join(random.choice(string.ascii_uppercase) for
@@ -48,6 +50,7 @@ class MockSock:
         self.lock = Lock()
         self.cond = Condition(self.lock)
         self.timeout = 0.5
+        self.reads = []
 
     def gettimeout(self):
         return self.timeout
@@ -87,6 +90,12 @@ class MockSock:
         finally:
             self.lock.release()
 
+    def recv_into(self, buffer, nbytes=0):
+        self.reads.append(nbytes or len(buffer))
+        message = self.recv(nbytes or len(buffer))
+        buffer[:len(message)] = message
+        return len(message)
+
     def recv(self, max_len):
         self.lock.acquire()
         try:
@@ -138,6 +147,85 @@ class TestMessageCodec(TestCase):
         test_chunk_size(496)
         test_chunk_size(10000)
 
+    def test_decode_chunks(self):
+        messages = [six.u('h\u00e9llo w\u00f6rld \u2603') * 20, six.u(''), _random_string(100)]
+        all_bytes = _join_bytearrays([encode_message(message) for message in messages])
+
+        for size in [1, 2, 7, 1000]:
+            pieces = []
+            actual_messages = []
+            def on_chunk(chunk, final):
+                pieces.append(chunk)
+                if final:
+                    actual_messages.append(six.u('').join(pieces))
+                    del pieces[:]
+
+            decoder = MessageDecoder(on_chunk=on_chunk)
+            for chunk in _chunk_bytearray(all_bytes, size):
+                decoder.decode(six.binary_type(chunk))
+
+            self.assertEqual(messages, actual_messages)
+
+    def test_decode_reused_buffer(self):
+        messages = [_random_string(random.randint(1, 30)) for _ in range(20)]
+        all_bytes = _join_bytearrays([encode_message(message) for message in messages])
+        actual_messages = []
+        decoder = MessageDecoder(actual_messages.append)
+
+        # decode from one buffer that is overwritten for each chunk, like JCoreUnixSocket does
+        buffer = bytearray(7)
+        view = memoryview(buffer)
+        for chunk in _chunk_bytearray(all_bytes, len(buffer)):
+            buffer[:len(chunk)] = chunk
+            decoder.decode(view[:len(chunk)])
+
+        self.assertEqual(messages, actual_messages)
+
+    def test_decode_several_frames(self):
+        messages = [six.u('first'), six.u(''), six.u('th\u00efrd')]
+        for chunk_mode in [False, True]:
+            actual_messages = []
+            decoder = MessageDecoder(on_chunk=lambda chunk, final: actual_messages.append((chunk, final))) \
+                if chunk_mode else MessageDecoder(lambda message: actual_messages.append((message, True)))
+            decoder.decode(_join_bytearrays([encode_message(message) for message in messages]))
+            self.assertEqual(actual_messages, [(message, True) for message in messages])
+            self.assertEqual(decoder.bytes_needed(), HEADER_LEN)
+
+    def test_decode_partial_frame_at_end(self):
+        first, second = encode_message(six.u('first')), encode_message(six.u('second message'))
+        for chunk_mode in [False, True]:
+            actual_messages = []
+            decoder = MessageDecoder(on_chunk=lambda chunk, final: actual_messages.append((chunk, final))) \
+                if chunk_mode else MessageDecoder(lambda message: actual_messages.append((message, True)))
+
+            # the header and part of the second frame's data are left over from the scan
+            decoder.decode(first + second[:HEADER_LEN + 6])
+            self.assertEqual(decoder.bytes_needed(), len(second) - HEADER_LEN - 6)
+            decoder.decode(second[HEADER_LEN + 6:])
+            self.assertEqual(decoder.bytes_needed(), HEADER_LEN)
+
+            if chunk_mode:
+                self.assertEqual(actual_messages, [(six.u('first'), True), (six.u('second'), False),
+                                                   (six.u(' message'), True)])
+            else:
+                self.assertEqual(actual_messages, [(six.u('first'), True), (six.u('second message'), True)])
+
+    def test_decode_split_header(self):
+        first, second = encode_message(six.u('first')), encode_message(six.u('second'))
+        actual_messages = []
+        decoder = MessageDecoder(actual_messages.append)
+
+        # the preamble and 2 bytes of the second frame's length
+        decoder.decode(first + second[:3])
+        self.assertEqual(actual_messages, [six.u('first')])
+        self.assertEqual(decoder.bytes_needed(), 2)
+        decoder.decode(second[3:4])
+        self.assertEqual(decoder.bytes_needed(), 1)
+        # the rest of the header, the data, and the next frame
+        decoder.decode(second[4:] + first)
+        self.assertEqual(actual_messages, [six.u('first'), six.u('second'), six.u('first')])
+        self.assertEqual(decoder.bytes_needed(), HEADER_LEN)
+
 class TestUnixSocket(TestCase):
     def test_receive(self):
         sock = MockSock()
@@ -178,6 +266,76 @@ class TestUnixSocket(TestCase):
         test_chunk_size(496)
         test_chunk_size(10000)
 
+    def test_receive_large_message(self):
+        sock = MockSock()
+        unixSock = JCoreUnixSocket(sock)
+
+        message = _random_string(100000)
+        sock.queue_recv(encode_message(message))
+
+        self.assertEqual(unixSock.recv(), message)
+        # after the header, the rest of the message is read at once
+        self.assertEqual(sock.reads[:2], [2048, 100000 + 5 - 2048])
+
+    def test_chunk_size_limits(self):
+        sock = MockSock()
+        unixSock = JCoreUnixSocket(sock, min_chunk_size=100, max_chunk_size=1000)
+
+        messages = [_random_string(5000), _random_string(10)]
+        for message in messages:
+            sock.queue_recv(encode_message(message))
+
+        self.assertEqual([unixSock.recv(), unixSock.recv()], messages)
+        self.assertEqual(sock.reads[:7], [100] + [1000] * 4 + [905, 100])
+        self.assertEqual(len(unixSock._buffer), 1000)
+
+    def test_start_receiving(self):
+        sock = MockSock()
+        unixSock = JCoreUnixSocket(sock, min_chunk_size=10, max_chunk_size=10)
+
+        messages = [_random_string(25), _random_string(5)]
+        pieces = []
+        actual_messages = []
+        closed = []
+        done = Event()
+        def on_chunk(chunk, final):
+            pieces.append(chunk)
+            if final:
+                actual_messages.append(six.u('').join(pieces))
+                del pieces[:]
+        def on_close(error):
+            closed.append(error)
+            done.set()
+
+        unixSock.start_receiving(on_chunk, on_close)
+        for message in messages:
+            sock.queue_recv(encode_message(message))
+        sock.queue_recv(six.b(''))
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(actual_messages, messages)
+        self.assertEqual(len(closed), 1)
+        self.assertIsInstance(closed[0], JCoreAPIConnectionClosedException)
+        self.assertTrue(unixSock._recv_queue.empty())
+
+    def test_connection_dispatches_on_socket_thread(self):
+        sock = MockSock()
+        sock.queue_send(1000000)
+        unixSock = JCoreUnixSocket(sock)
+        connection = JCoreAPIConnection(unixSock, auth_required=False)
+
+        future = connection.call_async('getRealTimeData', [{'channelIds': ['a']}])
+        sock.queue_recv(encode_message(six.u(
+            '{"msg": "result", "id": "0", "result": {"data": {"a": 1}}}')))
+        self.assertEqual(future.result(5), {'data': {'a': 1}})
+        # the connection doesn't start a receive thread of its own
+        self.assertFalse(connection._recv_thread.is_alive())
+        self.assertTrue(connection._recv_thread.ident is None)
+
+        sock.queue_recv(six.b(''))
+        unixSock._thread.join(5)
+        self.assertTrue(connection._closed)
+
     def test_send(self):
         sock = MockSock()
         unixSock = JCoreUnixSocket(sock)
@@ -202,3 +360,15 @@ class TestUnixSocket(TestCase):
         test_chunk_size(100)
         test_chunk_size(496)
         test_chunk_size(10000)
+
+    def test_send_many(self):
+        sock = MockSock()
+        unixSock = JCoreUnixSocket(sock)
+
+        messages = [_random_string(random.randint(10, 100)) for _ in range(10)]
+        encoded = _join_bytearrays([encode_message(message) for message in messages])
+        sock.queue_send(len(encoded))
+
+        unixSock.send_many(messages)
+
+        self.assertEqual(encoded, sock.sent)
@@ -7,11 +7,15 @@ setup(name='jcore_api',
       author='Andy Edwards',
       author_email='andy@jcore.io',
       license='MIT',
-      packages=['jcore_api', 'jcore_api._unix_sockets'],
+      packages=['jcore_api', 'jcore_api._unix_sockets', 'jcore_api._aio'],
       install_requires=[
         'six',
-        'websocket-client'
+        'websocket-client',
+        'futures; python_version < "3.2"'
       ],
+      extras_require={
+        'numpy': ['numpy']
+      },
       test_suite='nose2.collector.collector',
       tests_require=['nose2'],
       zip_safe=False)